@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# TMA Magic Black Box - Headless HTTP API
+"""
+Async HTTP front door for systems that can't drive the browser UI.
+Jobs go through the same fair-share queue and backend_processor workers
+as the Streamlit app; this process only accepts uploads and reports status.
+
+Endpoints:
+    POST /v1/jobs                  multipart "file" (or JSON {"path": ...}) -> {"job_id"}
+                                   optional: mode, company, deadline_s, budget
+    GET  /v1/jobs/{id}             status; ?wait=30&version=<v> long-polls for a change
+    GET  /v1/jobs/{id}/events      server-sent events until the job finishes
+    GET  /v1/jobs/{id}/result      200 with the result, 202 while running, 422 on failure
+    GET  /metrics                  Prometheus text, totals across every worker process
+    GET  /healthz
+
+Usage:
+    python api_server.py --port 8780
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import get_config, get_temp_dir
+from utils.job_queue import JobQueue, create_job
+from utils.upload_store import UploadSpool, CHUNK_SIZE
+from utils.metrics import render_prometheus
+
+try:
+    from aiohttp import web
+except ImportError:
+    raise ImportError("aiohttp not installed. Run: pip install aiohttp")
+
+MODES = {"regex_only", "ai_only", "hybrid"}
+WATCH_INTERVAL = 0.25    # how often the shared watcher stats status files
+MAX_WAIT = 60.0          # longest long-poll a client may ask for
+SSE_HEARTBEAT = 15.0     # keep proxies from closing idle event streams
+QUEUE_CACHE_SECONDS = 1.0
+
+
+class StatusWatcher:
+    """
+    One background task stats the status files of jobs someone is waiting on
+    and wakes their waiters on change, so a thousand long-polls cost one
+    stat per job per tick rather than a thousand polling loops.
+    """
+
+    def __init__(self, interval: float = WATCH_INTERVAL):
+        self.interval = interval
+        self.watched: Dict[str, Tuple[Optional[int], asyncio.Event, int]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def wait_change(self, job_id: str, version: Optional[int], timeout: float) -> None:
+        """Return once the job's status version differs from `version` (or on timeout)."""
+        if status_version(job_id) != version:
+            return
+        mtime, event, waiters = self.watched.get(job_id, (version, asyncio.Event(), 0))
+        self.watched[job_id] = (mtime, event, waiters + 1)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            mtime, event, waiters = self.watched[job_id]
+            if waiters <= 1:
+                del self.watched[job_id]
+            else:
+                self.watched[job_id] = (mtime, event, waiters - 1)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for job_id, (mtime, event, waiters) in list(self.watched.items()):
+                current = status_version(job_id)
+                if current != mtime:
+                    event.set()  # wake everyone waiting on the old version
+                    self.watched[job_id] = (current, asyncio.Event(), waiters)
+
+
+def status_version(job_id: str) -> Optional[int]:
+    try:
+        return (get_temp_dir() / f"tma_status_{job_id}.json").stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def job_exists(job_id: str) -> bool:
+    return job_id.isalnum() and (get_temp_dir() / f"tma_job_{job_id}.json").exists()
+
+
+class ApiServer:
+    def __init__(self):
+        self.watcher = StatusWatcher()
+        self._queue_snapshot: Tuple[float, Dict] = (0.0, {})
+
+    # --- Helpers ---
+
+    def queue_position(self, job_id: str) -> Optional[Dict]:
+        """Queue snapshot shared across requests for a second (it takes the queue lock)."""
+        taken_at, snapshot = self._queue_snapshot
+        if time.time() - taken_at > QUEUE_CACHE_SECONDS:
+            snapshot = JobQueue().snapshot()
+            self._queue_snapshot = (time.time(), snapshot)
+        return snapshot.get(job_id)
+
+    def read_status(self, job_id: str) -> Dict:
+        version = status_version(job_id)
+        if version is None:
+            queued = self.queue_position(job_id)
+            status = {"state": "queued" if queued else "starting", "progress": 0, "message": "Waiting for a worker"}
+            if queued:
+                status.update(queued)
+        else:
+            try:
+                status = json.loads((get_temp_dir() / f"tma_status_{job_id}.json").read_text())
+            except (OSError, json.JSONDecodeError):
+                status = {"state": "processing", "progress": 0, "message": "Reading status..."}
+        status["job_id"] = job_id
+        status["version"] = version
+        status.pop("data", None)  # the result has its own endpoint
+        return status
+
+    def authorize(self, request: web.Request):
+        token = get_config().get("api_token", "")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            raise web.HTTPUnauthorized(text=json.dumps({"error": "invalid or missing token"}),
+                                       content_type="application/json")
+
+    def require_job(self, request: web.Request) -> str:
+        self.authorize(request)
+        job_id = request.match_info["job_id"]
+        if not job_exists(job_id):
+            raise web.HTTPNotFound(text=json.dumps({"error": f"unknown job {job_id}"}),
+                                   content_type="application/json")
+        return job_id
+
+    def resolve_path(self, raw: str) -> Path:
+        """Path submissions are limited to configured roots (the API must not read arbitrary files)."""
+        roots = [Path(r).resolve() for r in get_config().get("api_path_roots", [])]
+        path = Path(raw).resolve()
+        if not any(path.is_relative_to(root) for root in roots):
+            raise web.HTTPForbidden(text=json.dumps({"error": "path is outside api_path_roots"}),
+                                    content_type="application/json")
+        if not path.is_file():
+            raise web.HTTPBadRequest(text=json.dumps({"error": f"file not found: {raw}"}),
+                                     content_type="application/json")
+        return path
+
+    # --- Handlers ---
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"ok": True})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        self.authorize(request)
+        text = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: render_prometheus(queue_depth=JobQueue().depth())
+        )
+        return web.Response(text=text, content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def submit(self, request: web.Request) -> web.Response:
+        self.authorize(request)
+        fields: Dict[str, str] = {}
+        file_path, file_hash = None, ""
+
+        if request.content_type.startswith("multipart/"):
+            # Streamed, so client_max_size doesn't apply: count the bytes ourselves.
+            # Disk writes go to the default executor to keep the event loop free.
+            loop = asyncio.get_running_loop()
+            max_bytes = get_config().get("api_max_upload_mb", 200) * 1024 * 1024
+            received = 0
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == "file" and part.filename:
+                    spool = await loop.run_in_executor(None, UploadSpool, part.filename)
+                    try:
+                        while chunk := await part.read_chunk(CHUNK_SIZE):
+                            received += len(chunk)
+                            if received > max_bytes:
+                                error = f"upload is over api_max_upload_mb ({max_bytes // (1024 * 1024)} MB)"
+                                raise web.HTTPRequestEntityTooLarge(max_bytes, received, text=json.dumps({"error": error}),
+                                                                    content_type="application/json")
+                            await loop.run_in_executor(None, spool.write, chunk)
+                        file_path, file_hash = await loop.run_in_executor(None, spool.commit)
+                    except BaseException:
+                        await loop.run_in_executor(None, spool.abort)
+                        raise
+                elif part.name:
+                    fields[part.name] = await part.text()
+        else:
+            try:
+                fields = {k: str(v) for k, v in (await request.json()).items()}
+            except (json.JSONDecodeError, AttributeError):
+                raise web.HTTPBadRequest(text=json.dumps({"error": "expected multipart or a JSON object"}),
+                                         content_type="application/json")
+            if fields.get("path"):
+                file_path = self.resolve_path(fields["path"])
+
+        if file_path is None:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "no file or path given"}),
+                                     content_type="application/json")
+        config = get_config()
+        mode = fields.get("mode") or config.get("extraction_mode", "hybrid")
+        if mode not in MODES:
+            raise web.HTTPBadRequest(text=json.dumps({"error": f"mode must be one of {sorted(MODES)}"}),
+                                     content_type="application/json")
+        user = request.headers.get("X-TMA-User") or fields.get("user") or "api"
+        limits = {}
+        for name in ("deadline_s", "budget"):
+            if fields.get(name):
+                try:
+                    limits[name] = float(fields[name])
+                except ValueError:
+                    raise web.HTTPBadRequest(text=json.dumps({"error": f"{name} must be a number"}),
+                                             content_type="application/json")
+
+        # create_job takes the queue lock and may spawn a worker: keep it off the event loop
+        job_id = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: create_job(file_path, mode, user, api_key=config.openai_api_key,
+                               file_hash=file_hash, company=fields.get("company", ""), **limits)
+        )
+        return web.json_response({
+            "job_id": job_id,
+            "status_url": f"/v1/jobs/{job_id}",
+            "events_url": f"/v1/jobs/{job_id}/events",
+            "result_url": f"/v1/jobs/{job_id}/result",
+        }, status=202)
+
+    async def status(self, request: web.Request) -> web.Response:
+        job_id = self.require_job(request)
+        try:
+            wait = min(float(request.query.get("wait", 0) or 0), MAX_WAIT)
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "wait must be a number of seconds"}),
+                                     content_type="application/json")
+        if wait > 0:
+            raw = request.query.get("version")
+            version = int(raw) if raw and raw.isdigit() else None
+            await self.watcher.wait_change(job_id, version, wait)
+        return web.json_response(self.read_status(job_id))
+
+    async def events(self, request: web.Request) -> web.StreamResponse:
+        job_id = self.require_job(request)
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await response.prepare(request)
+
+        version = -1  # always send the current state first
+        while True:
+            await self.watcher.wait_change(job_id, version, SSE_HEARTBEAT)
+            current = status_version(job_id)
+            if current == version:
+                await response.write(b": heartbeat\n\n")
+                continue
+            version = current
+            status = self.read_status(job_id)
+            await response.write(f"event: status\ndata: {json.dumps(status)}\n\n".encode())
+            if status["state"] in ("complete", "error"):
+                break
+        await response.write_eof()
+        return response
+
+    async def result(self, request: web.Request) -> web.Response:
+        job_id = self.require_job(request)
+        status_file = get_temp_dir() / f"tma_status_{job_id}.json"
+        try:
+            status = json.loads(status_file.read_text())
+        except (OSError, json.JSONDecodeError):
+            return web.json_response(self.read_status(job_id), status=202)
+        if status.get("state") == "complete":
+            return web.json_response(status.get("data") or {})
+        if status.get("state") == "error":
+            return web.json_response({"job_id": job_id, "error": status.get("message", "")}, status=422)
+        return web.json_response(self.read_status(job_id), status=202)
+
+    # --- App ---
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=get_config().get("api_max_upload_mb", 200) * 1024 * 1024)
+        app.router.add_get("/healthz", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_post("/v1/jobs", self.submit)
+        app.router.add_get("/v1/jobs/{job_id}", self.status)
+        app.router.add_get("/v1/jobs/{job_id}/events", self.events)
+        app.router.add_get("/v1/jobs/{job_id}/result", self.result)
+
+        async def on_startup(app):
+            self.watcher.start()
+
+        async def on_cleanup(app):
+            await self.watcher.stop()
+
+        app.on_startup.append(on_startup)
+        app.on_cleanup.append(on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TMA Magic Black Box - HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    args = parser.parse_args()
+
+    if args.host not in ("127.0.0.1", "localhost") and not get_config().get("api_token"):
+        print("⚠️ Listening beyond localhost without api_token set: anyone who can reach this port can submit jobs.")
+    web.run_app(ApiServer().make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
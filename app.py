@@ -7,7 +7,6 @@ Non-blocking design using subprocess workers.
 
 import html
 import json
-import subprocess
 import sys
 import time
 import uuid
@@ -24,6 +23,8 @@ import pandas as pd
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config import get_config, get_temp_dir
+from utils.upload_store import spool_upload
+from utils.job_queue import JobQueue, create_job
 
 # Page configuration
 st.set_page_config(
@@ -256,11 +257,12 @@ def inject_css():
     st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
-def render_header():
-    # Use local TMA Icon.png file
+@st.cache_data(show_spinner=False)
+def header_html() -> str:
+    """Header markup with the icon inlined; built once per server, not per rerun."""
     import base64
-    from pathlib import Path
     
+    # Use local TMA Icon.png file
     icon_path = Path(__file__).parent / "TMA Icon.png"
     if icon_path.exists():
         with open(icon_path, "rb") as f:
@@ -270,7 +272,7 @@ def render_header():
         # Fallback to external URL if local file not found
         icon_src = "https://i.ibb.co/ZMqYxNy/tma-magic-logo.png"
     
-    st.markdown(f"""
+    return f"""
     <div style="display: flex; align-items: center; justify-content: center; padding: 1rem 0; gap: 1.5rem;">
         <img src="{icon_src}" alt="TMA Magic" style="width: 80px; height: auto;" />
         <div style="text-align: left;">
@@ -288,7 +290,11 @@ def render_header():
             </p>
         </div>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+
+def render_header():
+    st.markdown(header_html(), unsafe_allow_html=True)
 
 
 def check_job_status(job_id: str) -> dict:
@@ -312,34 +318,106 @@ def check_job_status(job_id: str) -> dict:
     return {"state": "pending", "progress": 0, "message": "Initializing...", "cost": 0.0, "eta": 0}
 
 
-def submit_job(file_path: Path, mode: str, api_key: str = "") -> str:
-    """Submit extraction job to subprocess."""
-    job_id = str(uuid.uuid4())[:8]
-    job_file = get_temp_dir() / f"tma_job_{job_id}.json"
-    
-    job_data = {
-        "job_id": job_id,
-        "file_path": str(file_path),
-        "mode": mode,
-        "api_key": api_key
-    }
-    
-    job_file.write_text(json.dumps(job_data))
-    
-    
-    # Spawn detached subprocess with logging
-    backend_script = Path(__file__).parent / "backend_processor.py"
-    log_file = get_temp_dir() / f"tma_log_{job_id}.txt"
-    
-    with open(log_file, "w") as log:
-        subprocess.Popen(
-            [sys.executable, str(backend_script), str(job_file)],
-            start_new_session=True,
-            stdout=log,
-            stderr=subprocess.STDOUT
-        )
-    
-    return job_id
+def jobs_pending() -> bool:
+    return any(j["status"] not in ["complete", "error"] for j in st.session_state.jobs.values())
+
+
+def poll_jobs() -> bool:
+    """
+    Refresh pending jobs from their status files.
+    A status file is only parsed when its mtime changed since the last tick.
+    Returns True if any job changed.
+    """
+    mtimes = st.session_state.setdefault("status_mtimes", {})
+    changed = False
+    queue = None
+    for jid, job in st.session_state.jobs.items():
+        if job["status"] in ["complete", "error"]:
+            continue
+        try:
+            mtime = (get_temp_dir() / f"tma_status_{jid}.json").stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is None and job["status"] == "pending":
+            # Worker not started yet: show where the job stands in the shared queue
+            if queue is None:
+                job_queue = JobQueue()
+                now = time.time()
+                if now - st.session_state.get("last_dispatch", 0) >= QUEUE_DISPATCH_S:
+                    st.session_state.last_dispatch = now
+                    job_queue.dispatch()  # in case a worker died without handing off
+                queue = job_queue.snapshot()
+            waiting = queue.get(jid)
+            if waiting != job.get("queue"):
+                job["queue"] = waiting
+                st.session_state.minions[job["minion_id"]] = {
+                    "status": "pending", "file": job["file_name"], "progress": 0, "eta": 0,
+                    "cost": 0.0, "job_id": jid, "queue": waiting
+                }
+                changed = True
+            continue
+        if jid in mtimes and mtimes[jid] == mtime:
+            continue  # nothing new from this worker
+        mtimes[jid] = mtime
+        changed = True
+        status = check_job_status(jid)
+        
+        # Update minion state on every change so cost and ETA stay live
+        st.session_state.minions[job["minion_id"]] = {
+            "status": status["state"],
+            "file": job["file_name"],
+            "progress": status.get("progress", 0),
+            "eta": status.get("eta", 0),
+            "cost": status.get("cost", 0.0),
+            "job_id": jid
+        }
+        
+        # If state changed, update job status
+        if status["state"] != job["status"]:
+            job["status"] = status["state"]
+            job["message"] = status["message"]
+            if status["state"] == "complete":
+                job["results"] = status.get("data")
+                order = list(st.session_state.jobs).index(jid)
+                fold_result(st.session_state.batch_view, jid, job["results"], order)
+    return changed
+
+
+def reattach_jobs():
+    """
+    After a browser refresh, pick the batch back up from ?jobs=<id>,<id>.
+    Job files hold the API key and results: a logged-in user only gets their own jobs back.
+    """
+    job_ids = [j for j in st.query_params.get("jobs", "").split(",") if j.isalnum()]
+    for idx, job_id in enumerate(job_ids):
+        job_file = get_temp_dir() / f"tma_job_{job_id}.json"
+        if not job_file.exists():
+            continue
+        job = json.loads(job_file.read_text())
+        if st.session_state.get("username") and job.get("user") != current_user():
+            continue
+        st.session_state.jobs[job_id] = {
+            "file_name": job.get("file_name") or Path(job["file_path"]).name,
+            "status": "pending",
+            "results": None,
+            "start_time": datetime.now(),
+            "message": "Reattached...",
+            "minion_id": idx % 4
+        }
+
+
+def current_user() -> str:
+    """Fair-share identity: the login name when authenticated, else this browser session."""
+    if st.session_state.get("username"):
+        return st.session_state["username"]
+    if "session_user" not in st.session_state:
+        st.session_state.session_user = f"session-{uuid.uuid4().hex[:8]}"
+    return st.session_state.session_user
+
+
+def submit_job(file_path: Path, mode: str, api_key: str = "", file_hash: str = "") -> str:
+    """Queue an extraction job; the shared queue starts it when it's this user's turn."""
+    return create_job(file_path, mode, current_user(), api_key=api_key, file_hash=file_hash)
 
 
 def format_excel_value(val):
@@ -416,49 +494,95 @@ def generate_excel_string(years_data, pad=False):
 
 
 
-def merge_results(all_results):
-    """Merge results from multiple files, combining data for the same years."""
-    if not all_results:
-        return {"years": []}
+MERGE_FIELDS = ["revenue", "net_income", "depreciation", "assets", "liabilities", "total_cpltd"]
+
+
+def new_batch_view() -> dict:
+    """Empty per-batch aggregate; completed jobs are folded in one at a time."""
+    return {"id": uuid.uuid4().hex[:8], "version": 0, "years": {}, "sources": {}, "ai_docs": [], "folded": set()}
+
+
+def fold_result(view: dict, job_key, result: dict, order: int = 0):
+    """
+    Fold one completed job into the batch view (once per job).
+    Values from later-submitted files win, as if all results were merged
+    in submission order, no matter which job finished first.
+    """
+    if job_key in view["folded"] or not result:
+        return
+    view["folded"].add(job_key)
+    year_data, sources = view["years"], view["sources"]
     
-    # Group data by year
-    year_data = {}
-    
-    for result in all_results:
-        for year_entry in result.get("years", []):
-            year = year_entry.get("year")
-            if year not in year_data:
-                year_data[year] = {
-                    "year": year,
-                    "revenue": None,
-                    "net_income": None,
-                    "depreciation": None,
-                    "assets": None,
-                    "liabilities": None,
-                    "total_cpltd": None,
-                    "confidence": 0
-                }
-            
-            # Merge: prefer non-None values
-            for field in ["revenue", "net_income", "depreciation", "assets", "liabilities", "total_cpltd"]:
-                if year_entry.get(field) is not None:
-                    year_data[year][field] = year_entry.get(field)
-            
-            # Take highest confidence
-            year_data[year]["confidence"] = max(
-                year_data[year]["confidence"],
-                year_entry.get("confidence", 0)
-            )
+    for year_entry in result.get("years", []):
+        year = year_entry.get("year")
+        if year not in year_data:
+            year_data[year] = {
+                "year": year,
+                "revenue": None,
+                "net_income": None,
+                "depreciation": None,
+                "assets": None,
+                "liabilities": None,
+                "total_cpltd": None,
+                "confidence": 0
+            }
+        
+        # Merge: prefer non-None values
+        for field in MERGE_FIELDS:
+            if year_entry.get(field) is not None and order >= sources.get((year, field), -1):
+                year_data[year][field] = year_entry.get(field)
+                sources[(year, field)] = order
+        
+        # Take highest confidence
+        year_data[year]["confidence"] = max(
+            year_data[year]["confidence"],
+            year_entry.get("confidence", 0)
+        )
+    
+    if result.get("ai_usage"):
+        view["ai_docs"].append(result["ai_usage"])
+    view["version"] += 1
+
+
+def merged_view(view: dict) -> dict:
+    """The batch view in merge_results' shape (computed once per version)."""
+    if view.get("merged_version") == view["version"]:
+        return view["merged"]
     
-    # Convert back to list and sort by year descending
-    merged_years = sorted(year_data.values(), key=lambda x: x["year"], reverse=True)
+    # Sort by year descending
+    merged_years = sorted(view["years"].values(), key=lambda x: x["year"], reverse=True)
+    
+    # Average AI usage per completed document (documents that needed AI)
+    ai_docs = view["ai_docs"]
+    ai_usage_per_doc = None
+    if ai_docs:
+        ai_usage_per_doc = {
+            key: sum(u.get(key, 0) for u in ai_docs) / len(ai_docs)
+            for key in ["calls", "followup_calls", "prompt_tokens", "completion_tokens"]
+        }
     
-    return {
+    view["merged"] = {
         "success": True,
-        "years": merged_years,
+        "years": [dict(y) for y in merged_years],
         "extraction_method": "merged",
-        "file_count": len(all_results)
+        "file_count": len(view["folded"]),
+        "ai_usage_per_doc": ai_usage_per_doc,
+        "version": f"{view['id']}:{view['version']}"  # unique across batches
     }
+    view["merged_version"] = view["version"]
+    return view["merged"]
+
+
+def merge_results(all_results):
+    """Merge results from multiple files, combining data for the same years."""
+    if not all_results:
+        return {"years": []}
+    view = new_batch_view()
+    for order, result in enumerate(all_results):
+        fold_result(view, order, result, order)
+    return merged_view(view)
+
+
 def render_results(data: dict, unique_key: str):
     """Display extraction results - simple and clean."""
     if not data or not data.get("years"):
@@ -469,6 +593,34 @@ def render_results(data: dict, unique_key: str):
     if not years_data:
         return
 
+    # Check if all jobs are finished to ensure data is final
+    all_done = all(j.get("status") == "complete" for j in st.session_state.jobs.values())
+    
+    # Preview text and copy widget only change when the batch version does
+    memo_key = (unique_key, data.get("version"), all_done)
+    memo = st.session_state.get("results_render")
+    if data.get("version") is None or not memo or memo["key"] != memo_key:
+        display_text, copy_html = build_results_output(years_data, all_done)
+        memo = {"key": memo_key, "display_text": display_text, "copy_html": copy_html}
+        st.session_state.results_render = memo
+    
+    st.success("**✅ EXTRACTION COMPLETE & DATA COPIED TO CLIPBOARD**")
+    st.components.v1.html(memo["copy_html"], height=100)
+    st.markdown("**👀 Preview:**")
+    # Display formatted preview
+    st.code(memo["display_text"], language="text")
+    
+    usage = data.get("ai_usage_per_doc")
+    if usage:
+        st.caption(
+            f"🧠 AI per document: {usage['calls']:.1f} calls "
+            f"({usage['followup_calls']:.1f} follow-ups), "
+            f"{usage['prompt_tokens'] + usage['completion_tokens']:,.0f} tokens"
+        )
+
+
+def build_results_output(years_data, all_done: bool):
+    """(padded preview text, copy-to-clipboard HTML) for the merged years."""
     # Generate both versions: padded for display, tab-separated for Excel
     display_text = generate_excel_string(years_data, pad=True)
     excel_tsv = generate_excel_string(years_data, pad=False)
@@ -477,11 +629,6 @@ def render_results(data: dict, unique_key: str):
     import base64
     b64_data = base64.b64encode(excel_tsv.encode('utf-8')).decode('utf-8')
     
-    st.success("**✅ EXTRACTION COMPLETE & DATA COPIED TO CLIPBOARD**")
-    
-    # Check if all jobs are finished to ensure data is final
-    all_done = all(j.get("status") == "complete" for j in st.session_state.jobs.values())
-    
     copy_html = f"""
     <div style="margin: 1rem 0; font-family: -apple-system, system-ui, sans-serif;">
         <button id="copyBtn" onclick="doCopy()" style="
@@ -559,11 +706,8 @@ def render_results(data: dict, unique_key: str):
     window.addEventListener('focus', triggerAuto);
     </script>
     """
-    
-    st.components.v1.html(copy_html, height=100)
-    st.markdown("**👀 Preview:**")
-    # Display formatted preview
-    st.code(display_text, language="text")
+    return display_text, copy_html
+
 
 def get_funny_status(progress: float):
     """Return a funny status message based on progress."""
@@ -689,7 +833,9 @@ def render_worker_panel():
         st.warning("⚠️ **API Key Missing**: AI Extraction is disabled. Go to **Settings** (top left) to enter your key.", icon="🔑")
 
     # Fun boss status messages - based on ACTUAL progress
+    # (seeded per batch so a refresh doesn't reshuffle the text when nothing changed)
     import random
+    picker = random.Random(len(assigned_minions))
     error_minions = [m for m in minions.values() if m["status"] == "error"]
     
     if error_minions:
@@ -699,13 +845,13 @@ def render_worker_panel():
     elif len(completed_minions) == len(assigned_minions) and len(assigned_minions) > 0:
         boss_status = "✅ All Done!"
     elif total_progress < 0.25:
-        boss_status = random.choice(["🏃 Cracking Whip!", "👀 Supervising...", "📋 Checking Work"])
+        boss_status = picker.choice(["🏃 Cracking Whip!", "👀 Supervising...", "📋 Checking Work"])
     elif total_progress < 0.5:
-        boss_status = random.choice(["💪 Keep It Moving!", "🔥 On Fire!", "⚡ Full Steam!"])
+        boss_status = picker.choice(["💪 Keep It Moving!", "🔥 On Fire!", "⚡ Full Steam!"])
     elif total_progress < 0.75:
-        boss_status = random.choice(["🎯 Almost There!", "👊 Push Through!", "🚀 Turbo Mode!"])
+        boss_status = picker.choice(["🎯 Almost There!", "👊 Push Through!", "🚀 Turbo Mode!"])
     else:
-        boss_status = random.choice(["🏁 Final Stretch!", "🎉 Wrapping Up!", "✨ Polishing!"])
+        boss_status = picker.choice(["🏁 Final Stretch!", "🎉 Wrapping Up!", "✨ Polishing!"])
     
     pct = int(total_progress * 100)
     
@@ -730,6 +876,7 @@ def render_worker_panel():
         pct = int(progress * 100)  # Calculate pct first for display
         
         # Derive status from PROGRESS percentage, not stale status field
+        queued = m.get("queue") if m.get("status") == "pending" else None
         if m.get("status") == "error":
             status = "error"
             minion_class = "minion-idle"
@@ -777,6 +924,10 @@ def render_worker_panel():
                 msg = jobs[jid].get("message", "")
                 if "API KEY" in msg.upper():
                     display_status = "🔑 Key Required"
+        elif queued:
+            display_status = f"⏳ Queued #{queued['position']}"
+            status_color = "#fbbf24"
+            eta = int(queued["expected_wait"])
         elif status in ["reading", "chewing", "processing", "thinking"]:
             dots = '<span class="blink-dot">.</span><span class="blink-dot">.</span><span class="blink-dot">.</span>'
         
@@ -854,6 +1005,47 @@ def render_first_launch_setup():
     return False  # Not configured, show setup
 
 
+WORKER_REFRESH_S = 1.0
+RESULTS_REFRESH_S = 2.0
+QUEUE_DISPATCH_S = 30.0  # workers hand off on exit; this only rescues a dead one
+
+
+def results_stale() -> bool:
+    """A job was folded in since the results pane last drew, and it last drew over RESULTS_REFRESH_S ago."""
+    drawn = st.session_state.get("results_drawn", (None, 0.0))
+    view = st.session_state.batch_view
+    return (view["id"], view["version"]) != drawn[0] and time.time() - drawn[1] >= RESULTS_REFRESH_S
+
+
+def mark_results_drawn():
+    view = st.session_state.batch_view
+    st.session_state.results_drawn = ((view["id"], view["version"]), time.time())
+
+
+def live_worker_panel():
+    """Worker panel fragment: polls status files, redraws the minions."""
+    was_pending = jobs_pending()
+    poll_jobs()
+    render_worker_panel()
+    if was_pending and not jobs_pending():
+        # Batch finished: one full rerun so the fragment stops its timer
+        st.rerun()
+    elif results_stale():
+        # A job completed: the results pane has no timer, so redraw the page once
+        mark_results_drawn()
+        st.rerun()
+
+
+def live_results():
+    """Results pane fragment: merged output of every completed job, redrawn only when one is added."""
+    st.markdown("### 📊 Extraction Results") # Reverting title to something more descriptive
+    view = st.session_state.batch_view
+    mark_results_drawn()
+    if view["folded"]:
+        # Jobs are folded in as they complete; this is only a lookup
+        render_results(merged_view(view), unique_key="merged_results")
+
+
 def main():
     inject_css()
     render_header()
@@ -867,6 +1059,12 @@ def main():
         st.session_state.uploader_key = 0
     if "active_file_list" not in st.session_state:
         st.session_state.active_file_list = []
+    if "minions" not in st.session_state:
+        st.session_state.minions = {i: {"status": "idle", "file": None, "progress": 0, "eta": 0, "cost": 0.0, "job_id": None} for i in range(4)}
+    if "batch_view" not in st.session_state:
+        st.session_state.batch_view = new_batch_view()
+    if not st.session_state.jobs and "jobs" in st.query_params:
+        reattach_jobs()
 
     # --- ROW 1: Settings & Drop Files (TOP) ---
     col_row1_left, col_row1_right = st.columns([1, 1], gap="large")
@@ -883,9 +1081,12 @@ def main():
             with col_u2:
                 if st.button("🔄 Clear All", key="clear_btn", type="primary", use_container_width=True):
                     st.session_state.jobs = {}
+                    st.session_state.batch_view = new_batch_view()
                     st.session_state.minions = {i: {"status": "idle", "file": None, "progress": 0, "eta": 0, "cost": 0.0, "job_id": None} for i in range(4)}
                     st.session_state.total_cost = 0.0
                     st.session_state.uploader_key += 1
+                    JobQueue().cancel_user(current_user())
+                    st.query_params.clear()
                     st.rerun()
 
             uploaded_files = st.file_uploader(
@@ -910,14 +1111,14 @@ def main():
         else:
             # Reset jobs and minions for new batch
             st.session_state.jobs = {}
+            st.session_state.batch_view = new_batch_view()
             st.session_state.total_cost = 0.0
             st.session_state.minions = {i: {"status": "idle", "file": None, "progress": 0, "eta": 0, "cost": 0.0, "job_id": None} for i in range(4)}
             
-            temp_dir = get_temp_dir()
             for idx, up_file in enumerate(uploaded_files):
-                file_path = temp_dir / up_file.name
-                file_path.write_bytes(up_file.read())
-                job_id = submit_job(file_path, mode, api_key)
+                # Streamed to content-addressed storage in 1MB chunks, hashed on the way
+                file_path, file_hash = spool_upload(up_file, up_file.name)
+                job_id = submit_job(file_path, mode, api_key, file_hash)
                 st.session_state.jobs[job_id] = {
                     "file_name": up_file.name,
                     "status": "pending",
@@ -927,58 +1128,26 @@ def main():
                     "minion_id": idx % 4
                 }
             
+            # Lets a browser refresh reattach to this batch
+            st.query_params["jobs"] = ",".join(st.session_state.jobs)
+            st.session_state.status_mtimes = {}
+            
             # IMPORTANT: Increment key to clear uploader and avoid ingestion loop
             st.session_state.uploader_key += 1
             st.rerun()
 
-    # Status Polling Logic
-    polling_needed = False
-    for jid, job in st.session_state.jobs.items():
-        if job["status"] not in ["complete", "error"]:
-            polling_needed = True
-            status = check_job_status(jid)
-            
-            # Update minion state on EVERY poll (not just when state changes)
-            # This ensures cost and ETA are updated in real-time
-            minion_id = job["minion_id"]
-            st.session_state.minions[minion_id] = {
-                "status": status["state"],
-                "file": job["file_name"],
-                "progress": status.get("progress", 0),
-                "eta": status.get("eta", 0),
-                "cost": status.get("cost", 0.0),
-                "job_id": jid
-            }
-            
-            # If state changed, update job status
-            if status["state"] != job["status"]:
-                job["status"] = status["state"]
-                job["message"] = status["message"]
-                
-                if status["state"] == "complete":
-                    job["results"] = status.get("data")
-                    st.rerun()
-
     # --- ROW 2: BossMan/Gremlins (Left) & Output (Right) ---
+    # Both panes are fragments. While jobs run, only the worker panel ticks;
+    # it redraws the page when a completed job changes the results.
     st.markdown("---")
     col_dash, col_output = st.columns([1, 1], gap="large")
     
+    pending = jobs_pending()
     with col_dash:
-        render_worker_panel()
+        st.fragment(live_worker_panel, run_every=WORKER_REFRESH_S if pending else None)()
         
     with col_output:
-        st.markdown("### 📊 Extraction Results") # Reverting title to something more descriptive
-        completed_jobs = [j for j in st.session_state.jobs.values() if j.get("results")]
-        if completed_jobs:
-            # Merge results from all completed jobs
-            all_results = [j["results"] for j in completed_jobs]
-            merged_data = merge_results(all_results)
-            render_results(merged_data, unique_key="merged_results")
-    
-    # Auto-refresh if jobs are still processing
-    if polling_needed:
-        time.sleep(1)
-        st.rerun()
+        st.fragment(live_results)()
 
 
 if __name__ == "__main__":
@@ -8,28 +8,47 @@ Completely decoupled from the Streamlit UI.
 Usage:
     python backend_processor.py <job_file.json>
     python backend_processor.py --test <file_path>
+    python backend_processor.py --rescore <text_dir> [--workers N]
 """
 
 import argparse
 import json
 import sys
+import time
 import traceback
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 # Add parent to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config import get_config, get_temp_dir
-from engines.regex_engine import RegexEngine, FinancialData
+from engines.regex_engine import RegexEngine, FinancialData, BatchStats
 from engines.ai_engine import AIEngine
+from engines.ai_backends import get_backend
+from engines.ai_bulk import BulkJob
+from engines.planner import plan_extraction, plan_report
+from engines.ai_cache import AIResponseCache
+from engines.near_duplicate import NearDuplicateIndex, fingerprint_text, match_document
+from engines.page_cache import PageCache
+from engines.tax_form_engine import TaxFormEngine, looks_like_tax_return
+from engines.rate_limiter import TokenBucketLimiter
 from utils.pdf_parser import (
     extract_text_from_pdf,
+    extract_page_texts,
+    page_content_hashes,
+    has_text_layer,
+    count_pdf_pages,
     convert_pdf_to_images,
     extract_text_from_excel,
     detect_file_type
 )
+from utils.upload_store import hash_file
+from utils.result_store import ResultStore
+from utils.job_queue import JobQueue
+from utils.metrics import get_metrics, render_prometheus
+from utils.profiler import OutlierProfiler, list_profiles
 
 
 def update_status(
@@ -61,12 +80,87 @@ def update_status(
     status_file.write_text(json.dumps(status, indent=2))
 
 
+def build_ai_engine(api_key: str, ai_model: str, confidence_threshold: int) -> AIEngine:
+    """AIEngine wired to the shared cache and rate limiter from config."""
+    config = get_config()
+    cache = None
+    if config.get("ai_cache_enabled", True):
+        cache = AIResponseCache(max_bytes=int(config.get("ai_cache_max_mb", 200)) * 1024 * 1024)
+    return AIEngine(
+        api_key,
+        max_concurrency=config.ai_max_concurrency,
+        pages_per_request=config.ai_pages_per_request,
+        cache=cache,
+        rate_limiter=TokenBucketLimiter(
+            requests_per_min=int(config.get("ai_requests_per_min", 500)),
+            tokens_per_min=int(config.get("ai_tokens_per_min", 30000))
+        ),
+        max_retries=int(config.get("ai_max_retries", 5)),
+        model=ai_model,
+        cascade=config.get("ai_cascade", []),
+        confidence_target=confidence_threshold,
+        max_followups=int(config.get("ai_max_followups", 2)),
+        backend=get_backend(config.get("ai_backend", "openai"), api_key, config.get("ai_base_url", "")),
+        early_stop=bool(config.get("ai_early_stop", True)),
+        required_fields=config.get("ai_required_fields") or None,
+        required_years=int(config.get("ai_required_years", 3))
+    )
+
+
+def build_near_duplicate_index() -> Optional[NearDuplicateIndex]:
+    """The shared near-duplicate index, or None when disabled."""
+    config = get_config()
+    if not config.get("near_dup_enabled", True):
+        return None
+    return NearDuplicateIndex(max_entries=int(config.get("near_dup_max_entries", 5000)))
+
+
+def build_page_cache() -> Optional[PageCache]:
+    """The shared per-page cache, or None when disabled."""
+    config = get_config()
+    if not config.get("page_cache_enabled", True):
+        return None
+    return PageCache(max_bytes=int(config.get("page_cache_max_mb", 200)) * 1024 * 1024)
+
+
+def read_pdf_pages(file_path: Path, page_cache: PageCache, page_hashes: List[str]) -> Tuple[List[str], int]:
+    """Page texts, reading only pages the cache hasn't seen. Returns (texts, pages reused)."""
+    cached = page_cache.get_texts(page_hashes)
+    missing = [i for i, h in enumerate(page_hashes) if h not in cached]
+    if missing:
+        fresh = extract_page_texts(file_path, pages=[i + 1 for i in missing])
+        if len(fresh) != len(missing):
+            raise ValueError("could not read the PDF's text layer")
+        new = {page_hashes[i]: page_text for i, page_text in zip(missing, fresh)}
+        page_cache.put_texts(new)
+        cached.update(new)
+    return [cached[h] for h in page_hashes], len(page_hashes) - len(missing)
+
+
+def summarize_ai_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """AIEngine counters, shaped for the job output."""
+    return {
+        "ai_cache": {k: stats[k] for k in ("cache_hits", "cache_misses", "saved_cost", "saved_seconds")},
+        "ai_usage": {k: stats[k] for k in ("calls", "followup_calls", "prompt_tokens", "completion_tokens")},
+        "ai_tiers": dict(stats["tiers"]),  # pages answered per model tier
+        "ai_models": {model: dict(usage) for model, usage in stats["models"].items()},
+        "ai_retries": stats["retries"],
+        "failed_pages": sorted(stats["failed_pages"]),
+        "pages_avoided": stats["pages_avoided"],  # skipped by early stop (or a deadline/budget)
+        "limit_hit": stats["limit_hit"],
+    }
+
+
 def process_file(
     file_path: Path,
     mode: str = "hybrid",
     confidence_threshold: int = 85,
     api_key: Optional[str] = None,
-    status_file: Optional[Path] = None
+    status_file: Optional[Path] = None,
+    ai_model: str = "gpt-4o",
+    file_hash: Optional[str] = None,
+    deadline_s: Optional[float] = None,
+    budget: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Main extraction logic.
@@ -77,13 +171,26 @@ def process_file(
         confidence_threshold: Threshold for falling back to AI
         api_key: OpenAI API key (required for AI mode)
         status_file: Optional path to write status updates
+        ai_model: Strongest model tier (cheaper "ai_cascade" tiers run first)
+        file_hash: SHA-256 of the file if already known (computed otherwise)
+        deadline_s: Seconds the whole job may take; AI work is planned to fit (best effort)
+        budget: Dollars of AI spend allowed for this file; a hard cap
     
     Returns:
         Dict with extraction results
     """
     # Track cost and timing
     start_time = datetime.now()
+    started = time.monotonic()
     total_cost = 0.0
+    metrics = get_metrics()
+    plan = None
+    fingerprint = None
+    near_dup = None
+    page_cache = None
+    page_hashes: List[str] = []
+    page_texts = None
+    pages_reused = {"text": 0, "ai": 0, "saved_cost": 0.0}
     
     def log(msg: str, progress: float = 0, cost: float = 0.0):
         nonlocal total_cost
@@ -118,7 +225,22 @@ def process_file(
     # Extract text/Prepare
     if file_type == "pdf":
         log("Reading PDF structure...", 0.15)
-        text, is_digital = extract_text_from_pdf(file_path)
+        with metrics.timer("read_text"):
+            # Per-page content hashes: pages seen before (in any file) skip text extraction and AI
+            page_cache = build_page_cache()
+            page_hashes = page_content_hashes(file_path) if page_cache is not None else []
+            if page_hashes:
+                try:
+                    page_texts, pages_reused["text"] = read_pdf_pages(file_path, page_cache, page_hashes)
+                    text = "\n".join(page_texts)
+                    is_digital = has_text_layer(text)
+                except Exception as e:
+                    print(f"Page cache skipped: {e}")
+                    page_cache, page_hashes, page_texts = None, [], None
+            if not page_hashes:
+                text, is_digital = extract_text_from_pdf(file_path)
+        if pages_reused["text"]:
+            log(f"Reused the text of {pages_reused['text']} of {len(page_hashes)} page(s) seen before.", 0.18)
         if is_digital:
             log("Digital text extracted successfully.", 0.20)
         else:
@@ -126,7 +248,8 @@ def process_file(
             
     elif file_type == "excel":
         log("Parsing Excel workbook...", 0.15)
-        text = extract_text_from_excel(file_path)
+        with metrics.timer("read_text"):
+            text = extract_text_from_excel(file_path)
         is_digital = True
     else:
         text = ""
@@ -135,12 +258,32 @@ def process_file(
     results = []
     confidence = 0
     extraction_method = "none"
+    ai_report = None
+    tax_form = None
+    
+    # 2a. IRS business returns: read by line number from the form's own layout
+    if (file_type == "pdf" and mode != "ai_only" and is_digital and text
+            and get_config().get("tax_forms_enabled", True) and looks_like_tax_return(text)):
+        log("Reading tax return lines...", 0.25)
+        try:
+            with metrics.timer("tax_form"):
+                if page_texts is None:
+                    page_texts = extract_page_texts(file_path)
+                found = TaxFormEngine().extract(file_path, page_texts)
+        except Exception as e:
+            found = None
+            print(f"Tax form template skipped: {e}")
+        if found is not None:
+            results, confidence, tax_form = found
+            extraction_method = "tax_form"
+            log(f"Form {tax_form['form']} ({tax_form['year']}) read by line number. Confidence: {confidence}%", 0.35)
     
-    # 2. Regex Extraction
-    if mode != "ai_only" and is_digital and text:
+    # 2b. Regex Extraction
+    if mode != "ai_only" and is_digital and text and tax_form is None:
         log("Running pattern matching algorithms...", 0.25)
         regex_engine = RegexEngine()
-        results, confidence = regex_engine.extract(text, file_path.name)
+        with metrics.timer("regex"):
+            results, confidence = regex_engine.extract(text, file_path.name)
         extraction_method = "regex"
         log(f"Pattern matching complete. Confidence: {confidence}%", 0.35)
     
@@ -151,28 +294,149 @@ def process_file(
     )
     
     # Log if regex was sufficient (no AI cost)
-    if not use_ai and mode == "hybrid":
+    if not use_ai and mode == "hybrid" and extraction_method == "regex":
         log(f"Regex extraction successful (confidence: {confidence}%) - No AI cost!", 0.40)
     
+    # 3a. Near-duplicate: a re-export of a document we've already extracted reuses that answer
+    index = build_near_duplicate_index() if use_ai and is_digital and text else None
+    if index is not None:
+        config = get_config()
+        try:
+            fingerprint = fingerprint_text(text)
+            near_dup = match_document(
+                index, fingerprint,
+                min_similarity=float(config.get("near_dup_min_similarity", 0.85)),
+                reuse_threshold=float(config.get("near_dup_reuse_threshold", 1.0)),
+                min_confidence=confidence_threshold,
+                years=RegexEngine().extract_years(text)
+            )
+        except Exception as e:
+            index = None
+            print(f"Near-duplicate lookup skipped: {e}")
+        if near_dup is not None:
+            log(f"Near-duplicate of {near_dup.file} (line overlap {near_dup.jaccard:.0%}): {near_dup.action}", 0.38)
+            if near_dup.action in ("reused", "validated"):
+                results = near_dup.results()
+                confidence = near_dup.confidence
+                extraction_method = "near_duplicate"
+                use_ai = False
+    
     # 4. AI Extraction
     if use_ai:
-        if not api_key:
+        # Only the real OpenAI endpoint insists on a key
+        if not api_key and get_config().get("ai_backend", "openai") == "openai":
             log("⚠️ AI Analysis Required But API Key Missing.", 0.40)
             if not results:
                 raise ValueError("API KEY REQUIRED: Visual analysis is needed for this document but no key was provided.")
         else:
-            log("Starting AI visual analysis...", 0.40)
-            if file_type == "pdf":
+            ai_engine = build_ai_engine(api_key, ai_model, confidence_threshold)
+            needs_vision = file_type == "pdf"
+            has_text = mode == "hybrid" and is_digital and bool(text)
+            if not is_digital:
+                page_texts = None
+            elif page_texts is None and needs_vision:
+                page_texts = extract_page_texts(file_path)
+            
+            # Pages answered in an earlier run (same content, same prompt and tiers) aren't sent again
+            total_pages = len(page_hashes) if page_hashes else (count_pdf_pages(file_path) if needs_vision else 0)
+            known = {}
+            if needs_vision and page_cache is not None and page_hashes:
+                answers = page_cache.get_answers(page_hashes, ai_engine.page_variant)
+                known = {i: answers[h] for i, h in enumerate(page_hashes) if h in answers}
+            todo = [i for i in range(total_pages) if i not in known]
+            
+            # Deadline / budget: choose pages, DPI, tiers and concurrency to fit, then hold the engine to it
+            if deadline_s or budget:
+                config = get_config()
+                plan = plan_extraction(
+                    len(todo) if needs_vision else 0,
+                    deadline_s=deadline_s or None,
+                    budget=budget or None,
+                    elapsed_s=time.monotonic() - started,
+                    model=ai_model,
+                    cascade=config.get("ai_cascade", []),
+                    max_concurrency=config.ai_max_concurrency,
+                    page_texts=[page_texts[i] for i in todo] if page_texts else None,
+                    has_text=has_text,
+                    needs_vision=needs_vision
+                )
+                plan.pages = [todo[i] for i in plan.pages]  # planned over new pages only
+                plan.apply(ai_engine, started)
+                has_text = has_text and plan.text_first
+                needs_vision = needs_vision and bool(plan.pages or known)
+                limits = " / ".join(x for x in (deadline_s and f"{deadline_s:g}s", budget and f"${budget:g}") if x)
+                log(f"Plan for {limits}: {len(plan.pages)} page(s) at {plan.dpi} DPI on {' → '.join(plan.tiers)}, "
+                    f"est. {plan.est_seconds:.0f}s / ${plan.est_cost:.3f}"
+                    + (f" ({'; '.join(plan.notes)})" if plan.notes else ""), 0.38)
+            
+            # 4a. Text-first: digital documents already have their text, so try a
+            # (much cheaper, faster) text prompt before rasterizing anything
+            if has_text:
+                log("Asking AI to read the extracted text...", 0.40)
+                try:
+                    with metrics.timer("ai_text"):
+                        text_results, text_confidence, text_cost = ai_engine.extract_from_text(text)
+                    log(f"Text analysis complete. Confidence: {text_confidence}%", 0.45, cost=text_cost)
+                except Exception as e:
+                    # Optional cheap pass: fall through to vision (or keep the regex results)
+                    text_results, text_confidence = [], 0
+                    log(f"⚠️ Text analysis failed ({e}); continuing without it.", 0.45)
+                
+                if text_results and text_confidence > confidence:
+                    results = text_results
+                    confidence = text_confidence
+                    extraction_method = "ai_text"
+                if text_confidence >= confidence_threshold:
+                    needs_vision = False
+            
+            # 4b. Vision: scanned documents, or text that left the model unsure
+            if needs_vision:
+                log("Starting AI visual analysis...", 0.45)
                 log("converting PDF pages to high-res images...", 0.45)
-                image_paths = convert_pdf_to_images(file_path)
+                # Only new pages (or the plan's pick of them) are rendered, kept in page order
+                # so merging is deterministic
+                pages = sorted(plan.pages) if plan is not None else todo
+                image_paths = []
+                if pages == list(range(total_pages)) and plan is None:
+                    with metrics.timer("rasterize"):
+                        image_paths = convert_pdf_to_images(file_path)
+                elif pages:
+                    with metrics.timer("rasterize"):
+                        image_paths = convert_pdf_to_images(
+                            file_path, dpi=plan.dpi if plan is not None else 150, pages=[i + 1 for i in pages]
+                        )
+                metrics.inc("tma_pages_rasterized_total", len(image_paths))
                 
-                total_pages = len(image_paths)
-                log(f"Analyzing {total_pages} page(s) with AI models...", 0.50)
+                pages_reused["ai"] = len(known)
+                pages_reused["saved_cost"] = round(sum((answer[2] for answer in known.values()), 0.0), 6)
+                metrics.inc("tma_pages_reused_total", len(known))
+                log(f"Analyzing {len(image_paths)} page(s) with AI models"
+                    + (f", reusing {len(known)} answered before..." if known else "..."), 0.50)
                 
-                # Note: We could iterate here for granular page progress if AIEngine supported it
-                # For now, we jump to 80% after AI is done since it's the longest step
-                ai_engine = AIEngine(api_key)
-                ai_results, ai_confidence, ai_cost = ai_engine.extract_from_pdf_pages(image_paths)
+                # Digital PDFs: page texts rank pages and the text layer names the target years
+                target_years = None
+                vision_texts = None
+                if is_digital:
+                    vision_texts = [page_texts[i] for i in pages] if page_texts else None
+                    target_years = RegexEngine().extract_years(text) or None
+                
+                def remember(index: int, output):
+                    # Only cascade-final answers get here; after a deadline/budget stop, cache nothing
+                    if page_cache is not None and page_hashes and not ai_engine.stats["limit_hit"]:
+                        page_results, page_confidence, page_cost = output
+                        page_cache.put_answer(page_hashes[pages[index]], ai_engine.page_variant,
+                                              page_results, page_confidence, page_cost)
+                
+                # Pages are sent concurrently; we jump to 85% once the slowest page returns
+                with metrics.timer("ai_vision"):
+                    ai_results, ai_confidence, ai_cost = ai_engine.extract_from_pdf_pages(
+                        image_paths,
+                        text=text if is_digital else None,
+                        page_texts=vision_texts,
+                        target_years=target_years,
+                        prior_outputs=[(known[i][0], known[i][1], 0.0) for i in sorted(known)],
+                        on_page=remember
+                    )
                 
                 log("AI analysis complete. Consolidating data...", 0.85, cost=ai_cost)
                 
@@ -184,8 +448,38 @@ def process_file(
                     extraction_method = "hybrid"
                 
                 log(f"Final Confidence: {ai_confidence}%", 0.90)
+            
+            ai_report = summarize_ai_stats(ai_engine.stats)
+            metrics.record_ai_stats(ai_engine.stats)
+            if ai_engine.stats["limit_hit"]:
+                log(f"⏱️ Stopped at the {ai_engine.stats['limit_hit']}: returning best-effort results.", 0.90)
+            elif ai_report["pages_avoided"]:
+                log(f"All target years complete early: skipped {ai_report['pages_avoided']} page(s).", 0.90)
+            if ai_report["failed_pages"]:
+                log(f"⚠️ {len(ai_report['failed_pages'])} page(s) failed after retries: {ai_report['failed_pages']}", 0.90)
+            if ai_report["ai_cache"]["cache_hits"]:
+                log(
+                    f"Reused {ai_report['ai_cache']['cache_hits']} cached page(s): saved "
+                    f"${ai_report['ai_cache']['saved_cost']:.4f} and {ai_report['ai_cache']['saved_seconds']:.1f}s",
+                    0.90
+                )
+    
+    file_hash = file_hash or hash_file(file_path)
+    
+    # Remember AI-assisted answers for the next re-export of this document, unless
+    # a limit, the plan or a failed page left this one incomplete
+    incomplete = (plan is not None and plan.degraded) or (
+        ai_report is not None and bool(ai_report["limit_hit"] or ai_report["failed_pages"])
+    )
+    if index is not None and extraction_method in ("ai", "ai_text", "hybrid") and confidence > 0 and not incomplete:
+        try:
+            index.add(file_hash, file_path.name, fingerprint, results,
+                      confidence, extraction_method, total_cost)
+        except Exception as e:
+            print(f"Near-duplicate index skipped: {e}")
     
     log("Formatting final report...", 0.95)
+    metrics.inc("tma_resolved_total", method=extraction_method)
     
     # Format output
     output = {
@@ -195,23 +489,173 @@ def process_file(
         "confidence": confidence,
         "years": [r.to_dict() for r in results],
         "processed_at": datetime.now().isoformat(),
-        "total_cost": total_cost
+        "total_cost": total_cost,
+        "file_hash": file_hash
     }
+    if ai_report is not None:
+        output.update(ai_report)
+    if tax_form is not None:
+        output["tax_form"] = tax_form
+    if near_dup is not None:
+        output["near_duplicate"] = near_dup.to_dict()
+    if page_hashes:
+        output["pages_total"] = len(page_hashes)
+        output["pages_reused"] = dict(pages_reused)
+    if plan is not None:
+        output.update(plan_report(plan, time.monotonic() - started, total_cost, ai_report))
     
     log("Extraction complete!", 1.0)
     return output
 
 
+def finish_profile(profiler: OutlierProfiler, job_id: str, file_name: str, stages: Dict[str, float]) -> Optional[Dict]:
+    """Stop sampling and keep the profile if the job was slow; never fails the job itself."""
+    try:
+        return profiler.finish(job_id, file_name, stages)
+    except Exception as e:
+        print(f"Profile skipped: {e}")
+        return None
+
+
+def store_result(result: Dict[str, Any], company: str = "", job_id: str = ""):
+    """Append to the columnar result store; never fails the extraction itself."""
+    if not get_config().get("result_store_enabled", True):
+        return
+    try:
+        ResultStore().append_result(result, company=company, job_id=job_id)
+    except Exception as e:
+        print(f"Result store skipped: {e}")
+
+
+def rescore_texts(text_dir: Path, workers: Optional[int] = None) -> BatchStats:
+    """
+    Re-run regex extraction over archived statement texts (*.txt).
+    Streams one JSON line per document to stdout, throughput to stderr.
+    """
+    def docs():
+        for path in sorted(text_dir.rglob("*.txt")):
+            # Archived texts are named after the source file, e.g. "2024 YE BS.pdf.txt"
+            yield path.read_text(errors="replace"), path.stem
+    
+    stats = BatchStats()
+    engine = RegexEngine()
+    for filename, results, confidence in engine.extract_many(docs(), processes=workers, stats=stats):
+        print(json.dumps({
+            "file": filename,
+            "confidence": confidence,
+            "years": [r.to_dict() for r in results]
+        }))
+    
+    print(
+        f"Rescored {stats.docs} docs in {stats.elapsed:.2f}s "
+        f"({stats.docs_per_sec:.1f} docs/sec, {stats.mb_per_sec:.2f} MB/s)",
+        file=sys.stderr
+    )
+    return stats
+
+
+def run_bulk(
+    inputs: Optional[list] = None,
+    job_id: Optional[str] = None,
+    poll_interval: float = 60.0,
+    wait: bool = True
+) -> BulkJob:
+    """
+    Overnight mode: start a Batch API job over files/directories, or resume one.
+    Results land in the job's results.jsonl (one process_file-style line per file).
+    """
+    config = get_config()
+    if job_id:
+        job = BulkJob.load(job_id)
+        print(f"Resuming bulk job {job.job_id} ({job.state['status']})", file=sys.stderr)
+    else:
+        files = []
+        for item in inputs or []:
+            path = Path(item)
+            if path.is_dir():
+                files.extend(sorted(p for p in path.rglob("*") if detect_file_type(p) in ("pdf", "excel")))
+            elif path.exists():
+                files.append(path)
+            else:
+                print(f"Skipping missing path: {path}", file=sys.stderr)
+        job = BulkJob.create(
+            files,
+            model=config.get("ai_model", "gpt-4o"),
+            mode=config.get("extraction_mode", "hybrid"),
+            confidence_threshold=config.confidence_threshold
+        )
+        print(f"Created bulk job {job.job_id} with {len(files)} file(s)", file=sys.stderr)
+    
+    engine = build_ai_engine(config.openai_api_key, job.state["model"], job.state["confidence_threshold"])
+    metrics = get_metrics()
+    finished = job.run(engine, poll_interval=poll_interval, wait=wait)
+    metrics.record_ai_stats(engine.stats)
+    metrics.flush()
+    if finished:
+        results = job.results()
+        if not job.state.get("stored"):
+            for result in results:
+                store_result(result, job_id=job.job_id)
+            job.state["stored"] = True
+            job.save()
+        cost = sum(r.get("total_cost", 0.0) for r in results)
+        print(f"Bulk job {job.job_id} complete: {len(results)} file(s), ${cost:.4f} "
+              f"-> {job.job_dir / 'results.jsonl'}", file=sys.stderr)
+    else:
+        print(f"Bulk job {job.job_id} still running; resume with --bulk-resume {job.job_id}", file=sys.stderr)
+    return job
+
+
 def main():
     parser = argparse.ArgumentParser(description="TMA Magic Black Box - Backend Processor")
     parser.add_argument("job_file", nargs="?", help="Path to job JSON file")
     parser.add_argument("--test", help="Test mode: process a single file")
     parser.add_argument("--mode", default="hybrid", choices=["regex_only", "ai_only", "hybrid"])
+    parser.add_argument("--deadline", type=float, help="Test mode: seconds the job may take (AI work is planned to fit)")
+    parser.add_argument("--budget", type=float, help="Test mode: max AI dollars for the file")
+    parser.add_argument("--rescore", help="Batch mode: regex re-score every *.txt under a directory")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --rescore (default: all cores)")
+    parser.add_argument("--bulk", nargs="+", help="Overnight mode: Batch API job over these files/directories")
+    parser.add_argument("--bulk-resume", metavar="JOB_ID", help="Resume (or check on) a bulk job")
+    parser.add_argument("--bulk-list", action="store_true", help="List bulk jobs")
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="Seconds between bulk status checks")
+    parser.add_argument("--no-wait", action="store_true", help="Submit/check once and exit instead of polling")
+    parser.add_argument("--metrics", action="store_true", help="Print metrics from all workers (Prometheus text)")
+    parser.add_argument("--profiles", action="store_true", help="List saved profiles of slow outlier jobs")
     args = parser.parse_args()
     
     config = get_config()
     
-    if args.test:
+    if args.rescore:
+        text_dir = Path(args.rescore)
+        if not text_dir.is_dir():
+            print(f"Error: Directory not found: {text_dir}")
+            sys.exit(1)
+        rescore_texts(text_dir, args.workers)
+    
+    elif args.metrics:
+        print(render_prometheus(queue_depth=JobQueue().depth()), end="")
+    
+    elif args.profiles:
+        for report in list_profiles():
+            slow = [stage for stage, info in report["stages"].items() if info.get("slow") and stage != "total"]
+            print(f"{report['captured_at'][:19]}  {report['job_id']}  {report['total_seconds']:>7.1f}s "
+                  f"(> {report['percentile']} {report['threshold_seconds']:.1f}s)  slow: {', '.join(slow) or '-'}  "
+                  f"{report['file']}\n    {report['profile_path']}")
+    
+    elif args.bulk_list:
+        for job in BulkJob.list_jobs():
+            print(f"{job['job_id']}  {job['status']:<11} {job['files']} file(s)")
+    
+    elif args.bulk or args.bulk_resume:
+        try:
+            run_bulk(args.bulk, args.bulk_resume, args.poll_interval, wait=not args.no_wait)
+        except Exception as e:
+            print(f"Error: {e}")
+            traceback.print_exc()
+            sys.exit(1)
+    
+    elif args.test:
         # Test mode: direct file processing
         file_path = Path(args.test)
         if not file_path.exists():
@@ -223,7 +667,10 @@ def main():
                 file_path,
                 mode=args.mode,
                 confidence_threshold=config.confidence_threshold,
-                api_key=config.openai_api_key
+                api_key=config.openai_api_key,
+                ai_model=config.get("ai_model", "gpt-4o"),
+                deadline_s=args.deadline or config.get("default_deadline_s", 0) or None,
+                budget=args.budget or config.get("default_budget", 0) or None
             )
             print(json.dumps(result, indent=2))
         except Exception as e:
@@ -241,21 +688,51 @@ def main():
         job = json.loads(job_file.read_text())
         job_id = job.get("job_id", "unknown")
         status_file = get_temp_dir() / f"tma_status_{job_id}.json"
+        if job.get("ai_budget_exhausted"):
+            print("Daily AI budget reached for this user: running regex-only.")
         
+        cost = 0.0
+        state = "error"
+        metrics = get_metrics()
+        started = datetime.now()
+        profiler = OutlierProfiler().start()
         try:
             result = process_file(
                 Path(job["file_path"]),
                 mode=job.get("mode", "hybrid"),
                 confidence_threshold=job.get("confidence_threshold", config.confidence_threshold),
                 api_key=job.get("api_key") or config.openai_api_key,
-                status_file=status_file
+                status_file=status_file,
+                ai_model=job.get("ai_model") or config.get("ai_model", "gpt-4o"),
+                file_hash=job.get("file_hash"),
+                deadline_s=job.get("deadline_s") or config.get("default_deadline_s", 0) or None,
+                budget=job.get("budget") or config.get("default_budget", 0) or None
             )
-            update_status(status_file, "complete", 1.0, "Done", result, cost=result.get("total_cost", 0.0))
+            cost = result.get("total_cost", 0.0)
+            profile = finish_profile(profiler, job_id, result["file"], metrics.stages)
+            if profile:
+                result["profile"] = profile
+                print(f"Slow job ({profile['total_seconds']:.1f}s > {profile['percentile']} "
+                      f"{profile['threshold_seconds']:.1f}s): profile saved to {profile['profile_path']}")
+            store_result(result, company=job.get("company", ""), job_id=job_id)
+            update_status(status_file, "complete", 1.0, "Done", result, cost=cost)
+            state = "complete"
         
         except Exception as e:
             update_status(status_file, "error", 0, str(e))
+            profile = finish_profile(profiler, job_id, Path(job["file_path"]).name, metrics.stages)
+            if profile:
+                print(f"Slow failed job: profile saved to {profile['profile_path']}")
             traceback.print_exc()
             sys.exit(1)
+        
+        finally:
+            metrics.inc("tma_jobs_total", state=state)
+            metrics.observe("tma_stage_seconds", (datetime.now() - started).total_seconds(), stage="total")
+            metrics.flush()
+            # Frees this user's slot and starts the next fair-share job
+            if job.get("queued"):
+                JobQueue().finish(job_id, cost)
     
     else:
         parser.print_help()
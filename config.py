@@ -81,6 +81,47 @@ class Config:
             "openai_api_key": "",
             "extraction_mode": "hybrid",  # regex_only, ai_only, hybrid
             "confidence_threshold": 85,
+            "ai_max_concurrency": 4,  # parallel page requests per job
+            "ai_pages_per_request": 1,  # >1 packs pages into one vision request
+            "ai_cache_enabled": True,
+            "ai_cache_max_mb": 200,
+            "ai_requests_per_min": 500,  # shared by all workers on this machine
+            "ai_tokens_per_min": 30000,
+            "ai_max_retries": 5,
+            "page_cache_enabled": True,  # per-page text and AI answers, keyed by page content
+            "page_cache_max_mb": 200,
+            "ai_model": "gpt-4o",
+            "ai_cascade": [],  # cheaper models tried first, e.g. ["gpt-4o-mini"]
+            "ai_max_followups": 2,  # targeted re-queries for fields still missing
+            "ai_early_stop": True,  # skip remaining pages once every target year is complete
+            "ai_required_fields": ["revenue", "net_income", "depreciation", "assets", "liabilities", "total_cpltd"],
+            "ai_required_years": 3,  # complete years needed to stop early when the years are unknown
+            "default_deadline_s": 0,  # per-file latency target for AI planning; 0 = none
+            "default_budget": 0.0,  # per-file AI dollar cap; 0 = none
+            "tax_forms_enabled": True,  # read IRS 1120/1120-S/1065 returns by line number (no AI)
+            "near_dup_enabled": True,  # reuse the extraction of a re-exported (near-identical) document
+            "near_dup_min_similarity": 0.85,  # label/amount line overlap to consider a match (validated)
+            "near_dup_reuse_threshold": 1.0,  # overlap at which the prior answer is reused unchecked
+            "near_dup_max_entries": 5000,
+            "ai_backend": "openai",  # openai, openai_compatible, fake (local load testing)
+            "ai_base_url": "",  # for openai_compatible / a non-default fake server
+            "queue_max_concurrent": 4,  # workers running at once across all users
+            "queue_max_jobs_per_user": 2,
+            "queue_user_weights": {},  # e.g. {"alice": 2} for twice the share
+            "queue_user_budgets": {},  # per-user $/day, overrides queue_daily_ai_budget
+            "queue_daily_ai_budget": 0.0,  # $/day per user; 0 = unlimited. Over it, jobs run regex-only
+            "queue_job_ai_reserve": 1.0,  # $ held per running job against that budget (and the job's AI cap)
+            "api_token": "",  # HTTP API bearer token; empty = no auth (localhost only!)
+            "api_path_roots": [],  # directories the HTTP API may read {"path": ...} submissions from
+            "api_max_upload_mb": 200,
+            "metrics_textfile": "",  # also write Prometheus text here on every flush (node_exporter)
+            "profile_outliers": True,  # sample every job; keep the profile of slow ones
+            "profile_percentile": 95,  # a job slower than this percentile of recent jobs is an outlier
+            "profile_min_samples": 20,  # recent jobs needed before anything counts as an outlier
+            "profile_min_seconds": 5.0,  # never profile jobs faster than this
+            "profile_keep": 20,  # newest outlier profiles kept on disk
+            "profile_interval_ms": 10,
+            "result_store_enabled": True,  # append results to the Parquet store (needs pyarrow)
             "theme": "dark",
             "last_directory": str(Path.home()),
         }
@@ -117,6 +158,14 @@ class Config:
     @property
     def extraction_mode(self) -> str:
         return self.get("extraction_mode", "hybrid")
+    
+    @property
+    def ai_max_concurrency(self) -> int:
+        return int(self.get("ai_max_concurrency", 4))
+    
+    @property
+    def ai_pages_per_request(self) -> int:
+        return int(self.get("ai_pages_per_request", 1))
 
 
 # Convenience functions
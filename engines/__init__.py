@@ -1,4 +1,4 @@
 # engines package
-from .regex_engine import RegexEngine, FinancialData, ExtractionResult
+from .regex_engine import RegexEngine, FinancialData, ExtractionResult, YearIndex, BatchStats
 
-__all__ = ["RegexEngine", "FinancialData", "ExtractionResult"]
+__all__ = ["RegexEngine", "FinancialData", "ExtractionResult", "YearIndex", "BatchStats"]
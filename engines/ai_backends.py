@@ -0,0 +1,153 @@
+# Pluggable Chat-Completion Backends for AIEngine
+"""
+AIEngine talks to a backend, not to the OpenAI SDK directly. Backends:
+    openai             - api.openai.com via the official SDK
+    openai_compatible  - any server speaking the same API at `base_url`
+    fake               - the bundled stand-in (execution/fake_ai_server.py)
+                         for offline load tests; no key, no spend
+"""
+
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Protocol
+
+FAKE_SERVER_URL = "http://127.0.0.1:8765/v1"
+BACKENDS = ("openai", "openai_compatible", "fake")
+
+
+@dataclass
+class Completion:
+    """One chat completion, reduced to what AIEngine accounts for."""
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class AIBackend(Protocol):
+    """Anything that can answer a chat completion request."""
+
+    def complete(
+        self,
+        model: str,
+        messages: List[Dict],
+        max_tokens: int,
+        temperature: float = 0.1,
+        response_format: Optional[Dict] = None
+    ) -> Completion:
+        """Send one request. Raise on failure; AIEngine handles retries."""
+        ...
+
+
+class BatchBackend(Protocol):
+    """Backends that also speak the Batch API (files + batches endpoints)."""
+
+    def upload_batch_file(self, path: Path) -> str:
+        """Upload a JSONL request file; returns its file id."""
+        ...
+
+    def create_batch(self, input_file_id: str, metadata: Optional[Dict] = None) -> Dict:
+        """Start a 24h chat-completions batch; returns the batch as a dict."""
+        ...
+
+    def get_batch(self, batch_id: str) -> Dict:
+        ...
+
+    def list_batches(self, since: float = 0.0) -> Iterable[Dict]:
+        """Batches created at or after `since` (epoch seconds), newest first."""
+        ...
+
+    def file_content(self, file_id: str) -> str:
+        ...
+
+
+class OpenAIBackend:
+    """OpenAI SDK client; `base_url` points it at an OpenAI-compatible server."""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, timeout: float = 120.0):
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.timeout = timeout
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Lazy-load OpenAI client (once, even when page worker threads ask together)."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    try:
+                        from openai import OpenAI
+                        # Retries are handled by call_with_retry so they share the rate limiter
+                        self._client = OpenAI(
+                            api_key=self.api_key,
+                            base_url=self.base_url,
+                            timeout=self.timeout,
+                            max_retries=0
+                        )
+                    except ImportError:
+                        raise ImportError("openai package not installed. Run: pip install openai")
+        return self._client
+
+    def complete(
+        self,
+        model: str,
+        messages: List[Dict],
+        max_tokens: int,
+        temperature: float = 0.1,
+        response_format: Optional[Dict] = None
+    ) -> Completion:
+        extra = {"response_format": response_format} if response_format else {}
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **extra
+        )
+        usage = response.usage
+        return Completion(
+            content=response.choices[0].message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0
+        )
+
+    def upload_batch_file(self, path: Path) -> str:
+        with open(path, "rb") as f:
+            return self.client.files.create(file=f, purpose="batch").id
+
+    def create_batch(self, input_file_id: str, metadata: Optional[Dict] = None) -> Dict:
+        batch = self.client.batches.create(
+            input_file_id=input_file_id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            **({"metadata": metadata} if metadata else {})
+        )
+        return batch.model_dump()
+
+    def get_batch(self, batch_id: str) -> Dict:
+        return self.client.batches.retrieve(batch_id).model_dump()
+
+    def list_batches(self, since: float = 0.0) -> Iterable[Dict]:
+        for batch in self.client.batches.list(limit=100):  # pages on as iterated
+            if batch.created_at < since:
+                break
+            yield batch.model_dump()
+
+    def file_content(self, file_id: str) -> str:
+        return self.client.files.content(file_id).text
+
+
+def get_backend(name: str = "openai", api_key: str = "", base_url: str = "") -> AIBackend:
+    """Build a backend from config values (ai_backend / ai_base_url)."""
+    if name == "openai":
+        return OpenAIBackend(api_key)
+    if name == "openai_compatible":
+        if not base_url:
+            raise ValueError("ai_base_url is required for the openai_compatible backend")
+        return OpenAIBackend(api_key or "none", base_url)
+    if name == "fake":
+        # The stand-in ignores the key, but the SDK refuses an empty one
+        return OpenAIBackend(api_key or "fake", base_url or FAKE_SERVER_URL)
+    raise ValueError(f"Unknown AI backend: {name} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,335 @@
+# Overnight Bulk Extraction via the OpenAI Batch API
+"""
+Collects the page requests of many files into Batch API JSONL, submits
+them at half price and outside the synchronous rate limits, polls, then
+fans the answers back into per-file FinancialData merges.
+
+Every step is recorded in the job's state.json before the next one
+starts, so a job interrupted at any point resumes where it stopped.
+"""
+
+import json
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engines.regex_engine import RegexEngine
+from engines.ai_engine import AIEngine
+from utils.pdf_parser import (
+    extract_text_from_pdf,
+    convert_pdf_to_images,
+    extract_text_from_excel,
+    detect_file_type
+)
+from utils.upload_store import hash_file
+from utils.metrics import get_metrics
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+MAX_REQUESTS_PER_BATCH = 50_000          # Batch API limit
+MAX_BYTES_PER_BATCH = 190 * 1024 * 1024  # API limit is 200MB per input file
+
+
+def get_bulk_dir() -> Path:
+    """Bulk jobs live next to the config so they survive reboots (unlike temp)."""
+    from config import get_config_dir
+    bulk_dir = get_config_dir() / "bulk_jobs"
+    bulk_dir.mkdir(parents=True, exist_ok=True)
+    return bulk_dir
+
+
+class BulkJob:
+    """One persisted bulk run: files -> batches -> per-file results."""
+
+    def __init__(self, job_dir: Path, state: Dict):
+        self.job_dir = job_dir
+        self.state = state
+
+    @property
+    def job_id(self) -> str:
+        return self.state["job_id"]
+
+    @classmethod
+    def create(
+        cls,
+        files: List[Path],
+        model: str,
+        mode: str = "hybrid",
+        confidence_threshold: int = 85,
+        root: Optional[Path] = None
+    ) -> "BulkJob":
+        job_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+        job_dir = (root or get_bulk_dir()) / job_id
+        job_dir.mkdir(parents=True)
+        job = cls(job_dir, {
+            "job_id": job_id,
+            "created_at": datetime.now().isoformat(),
+            "model": model,
+            "mode": mode,
+            "confidence_threshold": confidence_threshold,
+            "status": "preparing",
+            "files": [{"path": str(Path(f).resolve()), "status": "pending"} for f in files],
+            "chunks": [],
+        })
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, job_id: str, root: Optional[Path] = None) -> "BulkJob":
+        job_dir = (root or get_bulk_dir()) / job_id
+        state_path = job_dir / "state.json"
+        if not state_path.exists():
+            raise FileNotFoundError(f"No bulk job {job_id} in {job_dir.parent}")
+        return cls(job_dir, json.loads(state_path.read_text()))
+
+    @staticmethod
+    def list_jobs(root: Optional[Path] = None) -> List[Dict]:
+        jobs = []
+        for state_path in sorted((root or get_bulk_dir()).glob("*/state.json")):
+            state = json.loads(state_path.read_text())
+            jobs.append({"job_id": state["job_id"], "status": state["status"], "files": len(state["files"])})
+        return jobs
+
+    def save(self):
+        """Atomic write: a crash mid-save never leaves a torn state file."""
+        tmp = self.job_dir / "state.json.tmp"
+        tmp.write_text(json.dumps(self.state, indent=2))
+        tmp.replace(self.job_dir / "state.json")
+
+    # --- 1. Prepare: regex first, render pages only for files that need AI ---
+
+    def prepare(self, engine: AIEngine):
+        regex_engine = RegexEngine()
+        mode = self.state["mode"]
+        threshold = self.state["confidence_threshold"]
+
+        for index, entry in enumerate(self.state["files"]):
+            if entry["status"] != "pending":
+                continue  # already prepared by an earlier run
+            path = Path(entry["path"])
+            try:
+                file_type = detect_file_type(path)
+                if file_type == "pdf":
+                    text, is_digital = extract_text_from_pdf(path)
+                elif file_type == "excel":
+                    text, is_digital = extract_text_from_excel(path), True
+                else:
+                    raise ValueError(f"Unsupported file type: {path.suffix}")
+
+                results, confidence = [], 0
+                if mode != "ai_only" and is_digital and text:
+                    results, confidence = regex_engine.extract(text, path.name)
+                entry["regex"] = {"confidence": confidence, "years": [r.to_dict() for r in results]}
+
+                needs_ai = mode == "ai_only" or (mode == "hybrid" and confidence < threshold)
+                if needs_ai and file_type == "pdf":
+                    with get_metrics().timer("rasterize"):
+                        pages = convert_pdf_to_images(path, self.job_dir / "pages" / str(index))
+                    get_metrics().inc("tma_pages_rasterized_total", len(pages))
+                    entry["pages"] = [str(p) for p in pages]
+                    entry["status"] = "queued"
+                else:
+                    # Bulk mode only batches page images; everything else settles on regex
+                    method = "regex" if results else "none"
+                    entry["result"] = self._output(path, method, confidence, entry["regex"]["years"], 0.0)
+                    get_metrics().inc("tma_resolved_total", method=method)
+                    entry["status"] = "complete"
+            except Exception as e:
+                entry["status"] = "error"
+                entry["error"] = str(e)
+            self.save()
+
+        if not self.state["chunks"]:
+            self.state["chunks"] = self._write_chunks(engine)
+            self.state["status"] = "submitting" if self.state["chunks"] else "collecting"
+            self.save()
+
+    def _write_chunks(self, engine: AIEngine) -> List[Dict]:
+        """Split every queued page request into JSONL files within the Batch API limits."""
+        chunks: List[Dict] = []
+        handle = None
+        for index, entry in enumerate(self.state["files"]):
+            if entry["status"] != "queued":
+                continue
+            for page_index, image_path in enumerate(entry["pages"]):
+                line = json.dumps(engine.batch_request(
+                    f"{index}-{page_index}", Path(image_path), self.state["model"]
+                )) + "\n"
+                size = len(line.encode("utf-8"))
+                current = chunks[-1] if chunks else None
+                if current is None or current["count"] >= MAX_REQUESTS_PER_BATCH or current["bytes"] + size > MAX_BYTES_PER_BATCH:
+                    if handle is not None:
+                        handle.close()
+                    path = self.job_dir / f"requests_{len(chunks):03d}.jsonl"
+                    handle = open(path, "w", encoding="utf-8")
+                    current = {"index": len(chunks), "requests_path": str(path), "count": 0, "bytes": 0,
+                               "input_file_id": None, "batch_id": None, "status": "written"}
+                    chunks.append(current)
+                handle.write(line)
+                current["count"] += 1
+                current["bytes"] += size
+        if handle is not None:
+            handle.close()
+        return chunks
+
+    # --- 2. Submit: upload + create, recording each id as soon as we have it ---
+
+    def submit(self, backend):
+        existing = None
+        for chunk in self.state["chunks"]:
+            if chunk["batch_id"]:
+                continue
+            if not chunk["input_file_id"]:
+                chunk["input_file_id"] = backend.upload_batch_file(Path(chunk["requests_path"]))
+                self.save()
+            else:
+                # Uploaded before an interruption: the batch may have been created without us
+                # recording it. Adopt it rather than paying for the chunk twice.
+                if existing is None:
+                    existing = self._our_batches(backend)
+                batch = existing.get((chunk["index"], chunk["input_file_id"]))
+                if batch is not None:
+                    print(f"Adopting batch {batch['id']} created for chunk {chunk['index']} before the interruption",
+                          file=sys.stderr)
+                    chunk["batch_id"] = batch["id"]
+                    chunk["status"] = batch["status"]
+                    self.save()
+                    continue
+            batch = backend.create_batch(
+                chunk["input_file_id"],
+                metadata={"tma_bulk_job": self.job_id, "chunk": str(chunk["index"])}
+            )
+            chunk["batch_id"] = batch["id"]
+            chunk["status"] = batch["status"]
+            self.save()
+        self.state["status"] = "polling"
+        self.save()
+
+    def _our_batches(self, backend) -> Dict:
+        """(chunk index, input file id) -> this job's live batches on the server."""
+        since = datetime.fromisoformat(self.state["created_at"]).timestamp() - 3600  # allow for clock skew
+        found = {}
+        for batch in backend.list_batches(since=since):
+            metadata = batch.get("metadata") or {}
+            if metadata.get("tma_bulk_job") != self.job_id or batch["status"] in ("failed", "expired", "cancelled"):
+                continue
+            key = (int(metadata.get("chunk", -1)), batch["input_file_id"])
+            found.setdefault(key, batch)  # newest first
+        return found
+
+    # --- 3. Poll until every batch is terminal ---
+
+    def poll(self, backend, interval: float = 60.0, wait: bool = True) -> bool:
+        """Refresh batch statuses. Returns True once all batches are terminal."""
+        while True:
+            for chunk in self.state["chunks"]:
+                if chunk["status"] in TERMINAL_STATUSES:
+                    continue
+                batch = backend.get_batch(chunk["batch_id"])
+                chunk["status"] = batch["status"]
+                chunk["output_file_id"] = batch.get("output_file_id")
+                chunk["error_file_id"] = batch.get("error_file_id")
+                chunk["request_counts"] = batch.get("request_counts")
+            self.save()
+
+            if all(chunk["status"] in TERMINAL_STATUSES for chunk in self.state["chunks"]):
+                self.state["status"] = "collecting"
+                self.save()
+                return True
+            if not wait:
+                return False
+            done = sum((c.get("request_counts") or {}).get("completed", 0) for c in self.state["chunks"])
+            total = sum(c["count"] for c in self.state["chunks"])
+            print(f"⏳ {done}/{total} page requests done; checking again in {interval:.0f}s", file=sys.stderr)
+            time.sleep(interval)
+
+    # --- 4. Collect: fan answers back out per file and merge in page order ---
+
+    def collect(self, engine: AIEngine):
+        lines: Dict[str, Dict] = {}
+        for chunk in self.state["chunks"]:
+            for key in ("output_file_id", "error_file_id"):
+                file_id = chunk.get(key)
+                if not file_id:
+                    continue
+                # Keep a local copy so a resumed collect doesn't download again
+                local = self.job_dir / f"{key.split('_')[0]}_{chunk['index']:03d}.jsonl"
+                if not local.exists():
+                    local.write_text(engine.backend.file_content(file_id), encoding="utf-8")
+                for raw in local.read_text(encoding="utf-8").splitlines():
+                    if raw.strip():
+                        line = json.loads(raw)
+                        lines[line["custom_id"]] = line
+
+        model = self.state["model"]
+        for index, entry in enumerate(self.state["files"]):
+            if entry["status"] != "queued":
+                continue
+            page_outputs, failed = [], []
+            for page_index, image_path in enumerate(entry["pages"]):
+                line = lines.get(f"{index}-{page_index}")
+                try:
+                    if line is None:
+                        raise RuntimeError("no answer (batch failed or expired)")
+                    page_outputs.append(engine.batch_result(line, Path(image_path), model))
+                except Exception as e:
+                    page_outputs.append(None)
+                    failed.append(page_index + 1)
+                    print(f"Page {page_index + 1} of {Path(entry['path']).name}: {e}", file=sys.stderr)
+
+            all_results, _, total_confidence, cost = engine.merge_page_outputs(page_outputs)
+            ai_confidence = total_confidence // max(len(page_outputs), 1)
+            regex = entry["regex"]
+            if all_results and ai_confidence > regex["confidence"]:
+                method, confidence, years = "ai_batch", ai_confidence, [r.to_dict() for r in all_results.values()]
+            else:
+                method = "hybrid" if regex["years"] else "none"
+                confidence, years = regex["confidence"], regex["years"]
+            entry["result"] = self._output(Path(entry["path"]), method, confidence, years, cost, failed)
+            get_metrics().inc("tma_resolved_total", method=method)
+            entry["status"] = "complete"
+            self.save()
+
+        with open(self.job_dir / "results.jsonl", "w", encoding="utf-8") as f:
+            for entry in self.state["files"]:
+                f.write(json.dumps(entry.get("result") or {
+                    "success": False, "file": Path(entry["path"]).name, "error": entry.get("error", "")
+                }) + "\n")
+        self.state["status"] = "complete"
+        self.save()
+
+    def _output(self, path: Path, method: str, confidence: int, years: List[Dict], cost: float,
+                failed_pages: Optional[List[int]] = None) -> Dict:
+        """Same shape as backend_processor.process_file output."""
+        return {
+            "success": True,
+            "file": path.name,
+            "extraction_method": method,
+            "confidence": confidence,
+            "years": years,
+            "processed_at": datetime.now().isoformat(),
+            "total_cost": cost,
+            "file_hash": hash_file(path) if path.exists() else "",
+            "failed_pages": failed_pages or [],
+        }
+
+    def run(self, engine: AIEngine, poll_interval: float = 60.0, wait: bool = True) -> bool:
+        """Advance the job as far as possible. Returns True when complete."""
+        if self.state["status"] == "preparing":
+            self.prepare(engine)
+        if self.state["status"] == "submitting":
+            self.submit(engine.backend)
+        if self.state["status"] == "polling":
+            if not self.poll(engine.backend, poll_interval, wait):
+                return False
+        if self.state["status"] == "collecting":
+            self.collect(engine)
+        return self.state["status"] == "complete"
+
+    def results(self) -> List[Dict]:
+        return [entry.get("result") for entry in self.state["files"] if entry.get("result")]
@@ -0,0 +1,84 @@
+# Persistent AI Response Cache
+"""
+Disk-backed cache of parsed AI page extractions.
+Keyed by the exact hash of the rendered page image, the prompt version and
+the model, so a page that reappears in another package (or a re-upload)
+doesn't pay for a second vision call.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from engines.regex_engine import FinancialData
+
+
+class AIResponseCache:
+    """Size-bounded LRU cache of page results, shared by all worker processes."""
+    
+    def __init__(self, db_path: Optional[Path] = None, max_bytes: int = 200 * 1024 * 1024):
+        if db_path is None:
+            from config import get_config_dir
+            db_path = get_config_dir() / "ai_cache.sqlite"
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    confidence INTEGER NOT NULL,
+                    cost REAL NOT NULL,
+                    seconds REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses (last_used)")
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Several backend subprocesses may share the file; wait on locks
+        return sqlite3.connect(str(self.db_path), timeout=30)
+    
+    @staticmethod
+    def make_key(image_path: Path, prompt_version: str, model: str) -> str:
+        """Cache key: sha256 of the page image + prompt version + model."""
+        digest = hashlib.sha256(Path(image_path).read_bytes()).hexdigest()
+        return f"{digest}:{prompt_version}:{model}"
+    
+    def get(self, key: str) -> Optional[Tuple[List[FinancialData], int, float, float]]:
+        """Return (results, confidence, original_cost, original_seconds) or None."""
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT payload, confidence, cost, seconds FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        
+        payload, confidence, cost, seconds = row
+        results = [FinancialData.from_record(r) for r in json.loads(payload)]
+        return results, confidence, cost, seconds
+    
+    def put(self, key: str, results: List[FinancialData], confidence: int, cost: float, seconds: float):
+        """Store a page result, then evict least-recently-used entries over max_bytes."""
+        payload = json.dumps([r.to_record() for r in results])
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, payload, confidence, cost, seconds, len(payload), time.time())
+            )
+            self._evict(db)
+    
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -5,15 +5,158 @@ Used when Regex confidence is below threshold.
 """
 
 import base64
+import hashlib
 import json
+import math
+import re
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import sys
 
 # Add parent to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from engines.regex_engine import FinancialData, ExtractionResult
+from engines.regex_engine import FinancialData, ExtractionResult, FINANCIAL_FIELDS
+from engines.ai_backends import AIBackend, OpenAIBackend
+from engines.ai_cache import AIResponseCache
+from engines.rate_limiter import TokenBucketLimiter, call_with_retry
+
+
+# Per-model pricing ($ per 1M tokens), typical page latency and limits.
+# Used for cost accounting, request packing and cascade tier selection.
+MODEL_TABLE = {
+    "gpt-4o-mini": {"input_per_m": 0.15, "output_per_m": 0.60, "latency_s": 4.0,
+                    "vision": True, "structured": True, "context": 128_000, "max_output": 16_384},
+    "gpt-4o": {"input_per_m": 2.50, "output_per_m": 10.00, "latency_s": 8.0,
+               "vision": True, "structured": True, "context": 128_000, "max_output": 4_096},
+    "gpt-4-turbo": {"input_per_m": 10.00, "output_per_m": 30.00, "latency_s": 15.0,
+                    "vision": True, "structured": False, "context": 128_000, "max_output": 4_096},
+    "gpt-3.5-turbo": {"input_per_m": 0.50, "output_per_m": 1.50, "latency_s": 2.0,
+                      "vision": False, "structured": False, "context": 16_385, "max_output": 4_096},
+}
+DEFAULT_VISION_MODEL = "gpt-4o"
+BATCH_DISCOUNT = 0.5  # Batch API requests are billed at half the synchronous price
+
+
+class PlanLimitReached(Exception):
+    """The next request would overrun the job's deadline or AI budget."""
+
+
+def image_tokens(width: float, height: float) -> int:
+    """High-detail vision tokens for an image of this size (OpenAI tiling rules)."""
+    # Fit within 2048x2048, then scale the shortest side down to 768
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 170 * tiles + 85
+
+
+def usage_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float:
+    """Dollar cost of one request from the model's per-1M-token pricing."""
+    spec = MODEL_TABLE.get(model, MODEL_TABLE[DEFAULT_VISION_MODEL])
+    cost = (prompt_tokens * spec["input_per_m"] + completion_tokens * spec["output_per_m"]) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+# Statement labels per field; used to pick the relevant text for text prompts
+FIELD_KEYWORDS = {
+    "revenue": ["income", "revenue", "sales", "gross profit", "gross receipts"],
+    "net_income": ["net income", "net profit", "net earnings", "ordinary business income", "net loss"],
+    "depreciation": ["depreciation", "amortization"],
+    "assets": ["total assets"],
+    "liabilities": ["total liabilities"],
+    "total_cpltd": ["long-term", "long term", "current portion", "notes payable", "debt", "cpltd"],
+}
+
+# Page titles that mark a primary statement; weigh heavier when ordering pages
+STATEMENT_TITLES = ["balance sheet", "profit and loss", "income statement", "statement of operations",
+                    "cash flow", "financial position", "statement of income"]
+
+
+def _nullable(kind: str) -> Dict:
+    return {"type": [kind, "null"]}
+
+
+def year_schema(fields=FINANCIAL_FIELDS) -> Dict:
+    """JSON schema for one year's values (strict mode: every key required)."""
+    properties = {"year": {"type": "integer"}}
+    properties.update({name: _nullable("number") for name in fields})
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def response_schema(fields=FINANCIAL_FIELDS, multi_page: bool = False) -> Dict:
+    """Structured-output schema mirroring FinancialData."""
+    page = {
+        "type": "object",
+        "properties": {
+            "years": {"type": "array", "items": year_schema(fields)},
+            "confidence": {"type": "integer"},
+            "notes": {"type": "string"},
+        },
+        "required": ["years", "confidence", "notes"],
+        "additionalProperties": False,
+    }
+    if not multi_page:
+        return page
+    page["properties"]["page"] = {"type": "integer"}
+    page["required"].append("page")
+    return {
+        "type": "object",
+        "properties": {"pages": {"type": "array", "items": page}},
+        "required": ["pages"],
+        "additionalProperties": False,
+    }
+
+
+class CompletionTracker:
+    """
+    Best confidence seen per (year, field) across pages, so page processing
+    can stop once every required field of every target year is in hand.
+    Without known target years, `min_years` fully complete years are needed.
+    """
+    
+    def __init__(
+        self,
+        fields: Iterable[str] = FINANCIAL_FIELDS,
+        years: Optional[Iterable[int]] = None,
+        min_years: int = 3,
+        confidence_target: int = 85
+    ):
+        self.fields = list(fields)
+        self.years = sorted(set(years)) if years else None
+        self.min_years = max(1, min_years)
+        self.confidence_target = confidence_target
+        self.best: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+    
+    def update(self, results: List[FinancialData]):
+        with self._lock:
+            for data in results:
+                for name in self.fields:
+                    result = getattr(data, name)
+                    if result.value is not None:
+                        key = (data.year, name)
+                        self.best[key] = max(self.best.get(key, 0), result.confidence)
+    
+    def _year_complete(self, year: int) -> bool:
+        return all(self.best.get((year, name), -1) >= self.confidence_target for name in self.fields)
+    
+    def is_complete(self) -> bool:
+        with self._lock:
+            if self.years is not None:
+                return all(self._year_complete(year) for year in self.years)
+            seen = {year for year, _ in self.best}
+            return sum(1 for year in seen if self._year_complete(year)) >= self.min_years
 
 
 class AIEngine:
@@ -57,98 +200,676 @@ Rules:
 - Confidence is your estimate 0-100 of extraction accuracy
 """
     
-    def __init__(self, api_key: str):
+    # Appended to EXTRACTION_PROMPT when several pages share one request
+    MULTI_PAGE_PROMPT = """
+You will receive {count} page images, in order. Analyze each page independently and
+return one entry per page (page numbers 1-{count}) in this exact format instead:
+{{
+    "pages": [
+        {{"page": 1, "years": [...same as above...], "confidence": 90}}
+    ]
+}}
+"""
+    
+    # Prepended to EXTRACTION_PROMPT when we send the PDF's text layer instead of images
+    TEXT_PROMPT_PREFIX = """The document below is the extracted text layer of a financial statement PDF
+(not an image). Columns may be run together; use the year headers to assign values.
+"""
+    
+    # Small follow-up when a year is missing only a few fields
+    FOLLOWUP_PROMPT = """From this financial statement, extract ONLY these values:
+{wanted}
+
+Return JSON: {{"years": [{{"year": 2024, "<field>": 123}}], "confidence": 90, "notes": ""}}
+Use null if a value is truly not shown. Raw numbers only; negative for losses.
+Field meanings: revenue = total sales/income, net_income = net profit,
+total_cpltd = current portion of long-term debt.
+"""
+    
+    # Token accounting for request packing (per OpenAI vision pricing rules)
+    PROMPT_TOKENS = 450          # EXTRACTION_PROMPT + multi-page instructions
+    OUTPUT_TOKENS_PER_PAGE = 1000
+    MAX_REQUEST_TOKENS = 16_000  # keep packed requests well inside the context window
+    
+    def __init__(
+        self,
+        api_key: str,
+        max_concurrency: int = 4,
+        pages_per_request: int = 1,
+        cache: Optional[AIResponseCache] = None,
+        rate_limiter: Optional[TokenBucketLimiter] = None,
+        max_retries: int = 5,
+        model: str = DEFAULT_VISION_MODEL,
+        cascade: Optional[List[str]] = None,
+        confidence_target: int = 85,
+        max_followups: int = 2,
+        backend: Optional[AIBackend] = None,
+        early_stop: bool = True,
+        required_fields: Optional[List[str]] = None,
+        required_years: int = 3
+    ):
         self.api_key = api_key
-        self._client = None
+        self.max_concurrency = max(1, max_concurrency)  # in-flight page requests
+        self.pages_per_request = max(1, pages_per_request)  # upper bound for packing
+        
+        # Cascade: cheaper tiers first, the selected model last. Page images need vision models.
+        if not MODEL_TABLE.get(model, {}).get("vision", True):
+            model = DEFAULT_VISION_MODEL
+        self.model = model
+        self.cascade = cascade
+        self.tiers = [
+            m for m in (cascade or [])
+            if m != model and MODEL_TABLE.get(m, {}).get("vision", True)
+        ] + [model]
+        self.confidence_target = confidence_target
+        self.max_followups = max_followups  # targeted missing-field re-queries per document
+        # Early stop: skip remaining pages once these fields are in for every target year
+        self.early_stop = early_stop
+        self.required_fields = list(required_fields or FINANCIAL_FIELDS)
+        self.required_years = required_years
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.stats = {
+            "cache_hits": 0, "cache_misses": 0, "saved_cost": 0.0, "saved_seconds": 0.0,
+            "retries": 0, "failed_pages": [], "pages_avoided": 0, "tiers": {},
+            "calls": 0, "followup_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "models": {},  # per-model calls, tokens and cost
+            "limit_hit": None  # "deadline" or "budget" once a request was refused
+        }
+        self._stats_lock = threading.Lock()
+        self._settled = threading.Condition(self._stats_lock)  # an in-flight request released its reservation
+        self._backend = backend
+        # Hard limits set by a plan (engines/planner.py): monotonic deadline, dollars
+        self.deadline: Optional[float] = None
+        self.budget: Optional[float] = None
+        self._reserved = 0.0  # worst-case cost of requests in flight
     
     @property
-    def client(self):
-        """Lazy-load OpenAI client."""
-        if self._client is None:
-            try:
-                from openai import OpenAI
-                self._client = OpenAI(api_key=self.api_key)
-            except ImportError:
-                raise ImportError("openai package not installed. Run: pip install openai")
-        return self._client
+    def spent(self) -> float:
+        return sum(usage["cost"] for usage in self.stats["models"].values())
+    
+    def _reserve(self, model: str, prompt_tokens: int, max_tokens: int) -> float:
+        """
+        Refuse a request that can't finish before the deadline or could push
+        spend past the budget. In-flight requests count at their worst case;
+        when only they stand in the way, wait for them to settle and re-check.
+        Returns the amount reserved; release it once the request settles.
+        """
+        if self.deadline is not None:
+            latency = MODEL_TABLE.get(model, MODEL_TABLE[DEFAULT_VISION_MODEL])["latency_s"]
+            if time.monotonic() + latency > self.deadline:
+                self.stats["limit_hit"] = self.stats["limit_hit"] or "deadline"
+                raise PlanLimitReached(f"{model} request can't finish before the deadline")
+        if self.budget is None:
+            return 0.0
+        worst = usage_cost(model, prompt_tokens, max_tokens)
+        with self._settled:
+            while self.spent + self._reserved + worst > self.budget:
+                if self.spent + worst > self.budget or self.stats["limit_hit"]:
+                    self.stats["limit_hit"] = self.stats["limit_hit"] or "budget"
+                    raise PlanLimitReached(f"{model} request could exceed the ${self.budget:.2f} budget")
+                self._settled.wait(timeout=1.0)
+            self._reserved += worst
+        return worst
+    
+    @property
+    def prompt_version(self) -> str:
+        """Short hash of the extraction prompt; part of every cache key."""
+        return hashlib.sha256(self.EXTRACTION_PROMPT.encode("utf-8")).hexdigest()[:12]
+    
+    @property
+    def page_variant(self) -> str:
+        """What a final page answer depends on besides the page: prompt, tiers, escalation target."""
+        return f"{self.prompt_version}/{'>'.join(self.tiers)}/{self.confidence_target}"
+    
+    @property
+    def backend(self) -> AIBackend:
+        """Chat-completion backend; defaults to the OpenAI API."""
+        if self._backend is None:
+            self._backend = OpenAIBackend(self.api_key)
+        return self._backend
     
     def encode_image(self, image_path: Path) -> str:
         """Encode image to base64 for API."""
         with open(image_path, "rb") as f:
             return base64.b64encode(f.read()).decode("utf-8")
     
+    def estimate_image_tokens(self, image_path: Path) -> int:
+        """Estimate high-detail image tokens from the PNG dimensions."""
+        try:
+            with open(image_path, "rb") as f:
+                header = f.read(24)
+            width, height = struct.unpack(">II", header[16:24])
+        except (OSError, struct.error):
+            width, height = 1275, 1650  # letter page at 150 DPI
+        return image_tokens(width, height)
+    
+    def plan_page_batches(self, image_paths: List[Path], pages_per_request: Optional[int] = None) -> List[List[int]]:
+        """
+        Pack consecutive pages into requests (e.g. a balance sheet + P&L pair).
+        A batch grows until it hits pages_per_request, the output-token limit,
+        or the input-token budget derived from the model's context window.
+        """
+        limit = pages_per_request or self.pages_per_request
+        spec = MODEL_TABLE.get(self.tiers[0], MODEL_TABLE[DEFAULT_VISION_MODEL])
+        max_output, context = spec["max_output"], spec["context"]
+        max_pages_by_output = max(1, max_output // self.OUTPUT_TOKENS_PER_PAGE)
+        input_budget = min(context - max_output, self.MAX_REQUEST_TOKENS) - self.PROMPT_TOKENS
+        
+        batches: List[List[int]] = []
+        current: List[int] = []
+        used = 0
+        for i, image_path in enumerate(image_paths):
+            tokens = self.estimate_image_tokens(image_path)
+            if current and (
+                len(current) >= min(limit, max_pages_by_output) or used + tokens > input_budget
+            ):
+                batches.append(current)
+                current, used = [], 0
+            current.append(i)
+            used += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _image_part(self, image_path: Path) -> Dict:
+        return {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/png;base64,{self.encode_image(image_path)}",
+                "detail": "high"
+            }
+        }
+    
+    def _complete(
+        self,
+        content: List[Dict],
+        max_tokens: int,
+        input_tokens: int = 0,
+        model: Optional[str] = None,
+        schema: Optional[Dict] = None
+    ) -> Tuple[str, float]:
+        """
+        Send one chat completion; returns (message content, cost).
+        Waits on the shared rate limiter and retries transient errors (429/5xx).
+        With a schema, models that support it return schema-constrained JSON;
+        others are held to JSON mode.
+        """
+        model = model or self.model
+        response_format = self._response_format(model, schema)
+        reserved = self._reserve(model, self.PROMPT_TOKENS + input_tokens, max_tokens)
+        
+        def send():
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(self.PROMPT_TOKENS + input_tokens + max_tokens)
+            return self.backend.complete(
+                model=model,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=max_tokens,
+                temperature=0.1,
+                response_format=response_format
+            )
+        
+        def on_retry(error: Exception, delay: float):
+            with self._stats_lock:
+                self.stats["retries"] += 1
+            print(f"Retrying AI request in {delay:.1f}s after: {error}")
+        
+        try:
+            response = call_with_retry(
+                send,
+                max_retries=self.max_retries,
+                limiter=self.rate_limiter,
+                on_retry=on_retry
+            )
+            # Calculate cost from the model's per-1M-token pricing
+            # (vision image tokens are already included in prompt_tokens)
+            cost = usage_cost(model, response.prompt_tokens, response.completion_tokens)
+            self._record_usage(model, response.prompt_tokens, response.completion_tokens, cost)
+        finally:
+            # Released only after the real cost is recorded, so spend is never counted as zero
+            with self._settled:
+                self._reserved -= reserved
+                self._settled.notify_all()
+        return response.content, cost
+    
+    def _record_usage(self, model: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._stats_lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            usage = self.stats["models"].setdefault(
+                model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+            )
+            usage["calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+            usage["cost"] += cost
+    
+    def _response_format(self, model: str, schema: Optional[Dict]) -> Optional[Dict]:
+        """Strict json_schema for models that support it, JSON mode otherwise."""
+        if schema is None:
+            return None
+        if MODEL_TABLE.get(model, MODEL_TABLE[DEFAULT_VISION_MODEL]).get("structured"):
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": "financial_data", "strict": True, "schema": schema}
+            }
+        return {"type": "json_object"}
+    
+    def batch_request(self, custom_id: str, image_path: Path, model: Optional[str] = None) -> Dict:
+        """One Batch API JSONL line: the same single-page request extract_from_image sends."""
+        model = model or self.model
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": [
+                {"type": "text", "text": self.EXTRACTION_PROMPT}, self._image_part(image_path)
+            ]}],
+            "max_tokens": self.OUTPUT_TOKENS_PER_PAGE,
+            "temperature": 0.1,
+        }
+        response_format = self._response_format(model, response_schema())
+        if response_format is not None:
+            body["response_format"] = response_format
+        return {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+    
+    def batch_result(self, line: Dict, image_path: Path, model: Optional[str] = None) -> Tuple[List[FinancialData], int, float]:
+        """
+        Parse one Batch API output line for a page into (results, confidence, cost).
+        Successful pages are cached exactly like synchronous ones. Raises on failure.
+        """
+        model = model or self.model
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            raise RuntimeError(f"Batch request {line.get('custom_id')} failed: {line.get('error') or response.get('body')}")
+        body = response["body"]
+        usage = body.get("usage") or {}
+        cost = usage_cost(model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), batch=True)
+        results, confidence = self._parse_response(body["choices"][0]["message"]["content"] or "", model)
+        self._record_usage(model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cost)
+        if self.cache is not None and results:
+            self.cache.put(self._cache_key(image_path, model), results, confidence, cost, 0.0)
+        return results, confidence, cost
+    
+    def extract_from_text(self, text: str) -> Tuple[List[FinancialData], int, float]:
+        """
+        Extract from a digital document's text instead of page images.
+        Sends only the label/year lines, on the cheapest tier (text-only
+        models allowed), escalating to the selected model if unsure.
+        """
+        snippet = relevant_text(text)
+        if not snippet:
+            return [], 0, 0.0
+        
+        text_tiers = self.text_tiers
+        results: List[FinancialData] = []
+        confidence = 0
+        total_cost = 0.0
+        for tier, model in enumerate(text_tiers):
+            try:
+                content, cost = self._complete(
+                    [{"type": "text", "text": self.TEXT_PROMPT_PREFIX + self.EXTRACTION_PROMPT + "\nDocument text:\n" + snippet}],
+                    max_tokens=self.OUTPUT_TOKENS_PER_PAGE,
+                    input_tokens=len(snippet) // 4,
+                    model=model,
+                    schema=response_schema()
+                )
+            except PlanLimitReached:
+                break  # best effort: keep the cheaper tier's answer
+            total_cost += cost
+            tier_results, tier_confidence = self._parse_response(content, model)
+            if tier_confidence > confidence or not results:
+                results, confidence = tier_results, tier_confidence
+            if tier_results and tier_confidence >= self.confidence_target:
+                break
+        return results, confidence, total_cost
+    
+    @property
+    def text_tiers(self) -> List[str]:
+        """Cascade for text prompts: like self.tiers, but text-only models are allowed."""
+        return [m for m in (self.cascade or []) if m != self.model] + [self.model]
+    
     def extract_from_image(self, image_path: Path) -> Tuple[List[FinancialData], int, float]:
         """Extract financial data from a single image."""
-        base64_image = self.encode_image(image_path)
-        
-        response = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": self.EXTRACTION_PROMPT},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}",
-                                "detail": "high"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000,
-            temperature=0.1
-        )
-        
-        # Calculate cost (GPT-4o pricing: $5/1M input tokens, $15/1M output tokens)
-        # Vision requests have additional image tokens
-        usage = response.usage
-        input_cost = (usage.prompt_tokens / 1_000_000) * 5.0
-        output_cost = (usage.completion_tokens / 1_000_000) * 15.0
-        total_cost = input_cost + output_cost
-        
-        results, confidence = self._parse_response(response.choices[0].message.content)
-        return results, confidence, total_cost
+        return self.extract_from_images([image_path])[0] or ([], 0, 0.0)
+    
+    def extract_from_images(
+        self,
+        image_paths: List[Path],
+        stop: Optional[threading.Event] = None,
+        final: Optional[set] = None
+    ) -> List[Optional[Tuple[List[FinancialData], int, float]]]:
+        """
+        Extract several pages in one request with a per-page result schema.
+        Returns one (results, confidence, cost) per page; cached pages cost 0.
+        
+        With a cascade, every page starts on the cheapest tier and only pages
+        below confidence_target are re-sent to the next tier.
+        Once `stop` is set no further requests are sent; pages that never got
+        an answer come back as None. Indexes of pages whose answer finished
+        the cascade (met the target, or came from the last tier) are added
+        to `final`; a page cut off on the way up is not.
+        """
+        outputs: List[Optional[Tuple[List[FinancialData], int, float]]] = [None] * len(image_paths)
+        pending = list(range(len(image_paths)))
+        
+        for tier, model in enumerate(self.tiers):
+            is_last = tier == len(self.tiers) - 1
+            tier_outputs = [self._cached_page(image_paths[i], model) for i in pending]
+            misses = [j for j, output in enumerate(tier_outputs) if output is None]
+            if misses and not (stop is not None and stop.is_set()):
+                try:
+                    fetched = self._request_pages([image_paths[pending[j]] for j in misses], model)
+                    for j, output in zip(misses, fetched):
+                        tier_outputs[j] = output
+                    misses = []
+                except PlanLimitReached:
+                    pass  # out of time or money: settle for what we have
+            if misses:
+                # Stopped: keep what earlier tiers (or the cache) already answered
+                for j, i in enumerate(pending):
+                    if tier_outputs[j] is not None:
+                        outputs[i] = tier_outputs[j] if outputs[i] is None else self._merge_page(outputs[i], tier_outputs[j])
+                break
+            
+            escalate = []
+            for i, output in zip(pending, tier_outputs):
+                outputs[i] = output if outputs[i] is None else self._merge_page(outputs[i], output)
+                results, confidence, _ = output
+                if not is_last and (not results or confidence < self.confidence_target):
+                    escalate.append(i)
+                else:
+                    if final is not None:
+                        final.add(i)
+                    with self._stats_lock:
+                        self.stats["tiers"][model] = self.stats["tiers"].get(model, 0) + 1
+            pending = escalate
+            if not pending:
+                break
+        
+        return outputs
+    
+    def _merge_page(
+        self,
+        existing: Tuple[List[FinancialData], int, float],
+        new: Tuple[List[FinancialData], int, float]
+    ) -> Tuple[List[FinancialData], int, float]:
+        """Combine two tiers' answers for one page (fields prefer higher confidence)."""
+        by_year = {data.year: data for data in existing[0]}
+        for data in new[0]:
+            if data.year in by_year:
+                self._merge_data(by_year[data.year], data)
+            else:
+                by_year[data.year] = data
+        return list(by_year.values()), max(existing[1], new[1]), existing[2] + new[2]
+    
+    def _request_pages(
+        self,
+        image_paths: List[Path],
+        model: Optional[str] = None
+    ) -> List[Tuple[List[FinancialData], int, float]]:
+        """
+        Send one request for the given pages (single- or multi-page prompt).
+        The request cost and latency are split evenly across its pages.
+        """
+        model = model or self.model
+        start = time.perf_counter()
+        image_tokens = sum(self.estimate_image_tokens(p) for p in image_paths)
+        if len(image_paths) == 1:
+            content, total_cost = self._complete(
+                [{"type": "text", "text": self.EXTRACTION_PROMPT}, self._image_part(image_paths[0])],
+                max_tokens=self.OUTPUT_TOKENS_PER_PAGE,
+                input_tokens=image_tokens,
+                model=model,
+                schema=response_schema()
+            )
+            pages = [self._parse_response(content, model)]
+        else:
+            prompt = self.EXTRACTION_PROMPT + self.MULTI_PAGE_PROMPT.format(count=len(image_paths))
+            content, total_cost = self._complete(
+                [{"type": "text", "text": prompt}] + [self._image_part(p) for p in image_paths],
+                max_tokens=self.OUTPUT_TOKENS_PER_PAGE * len(image_paths),
+                input_tokens=image_tokens,
+                model=model,
+                schema=response_schema(multi_page=True)
+            )
+            pages = self._parse_multi_page_response(content, len(image_paths), model)
+        
+        page_cost = total_cost / len(image_paths)
+        page_seconds = (time.perf_counter() - start) / len(image_paths)
+        if self.cache is not None:
+            for image_path, (results, confidence) in zip(image_paths, pages):
+                if results:  # don't pin unparseable answers in the cache
+                    self.cache.put(self._cache_key(image_path, model), results, confidence, page_cost, page_seconds)
+        return [(results, confidence, page_cost) for results, confidence in pages]
+    
+    def _cache_key(self, image_path: Path, model: str) -> str:
+        return AIResponseCache.make_key(image_path, self.prompt_version, model)
+    
+    def _cached_page(self, image_path: Path, model: str) -> Optional[Tuple[List[FinancialData], int, float]]:
+        """Cached (results, confidence, 0.0) for a page, recording savings."""
+        if self.cache is None:
+            return None
+        hit = self.cache.get(self._cache_key(image_path, model))
+        with self._stats_lock:
+            if hit is None:
+                self.stats["cache_misses"] += 1
+                return None
+            results, confidence, cost, seconds = hit
+            self.stats["cache_hits"] += 1
+            self.stats["saved_cost"] += cost
+            self.stats["saved_seconds"] += seconds
+        return results, confidence, 0.0
+    
+    def extract_from_pdf_pages(
+        self,
+        image_paths: List[Path],
+        max_concurrency: Optional[int] = None,
+        pages_per_request: Optional[int] = None,
+        text: Optional[str] = None,
+        page_texts: Optional[List[str]] = None,
+        target_years: Optional[List[int]] = None,
+        prior_outputs: Optional[List[Tuple[List[FinancialData], int, float]]] = None,
+        on_page: Optional[Callable[[int, Tuple[List[FinancialData], int, float]], None]] = None
+    ) -> Tuple[List[FinancialData], int, float]:
+        """
+        Extract from multiple PDF page images.
+        Requests (one or more pages each) run concurrently, bounded by
+        max_concurrency, and are merged in page order so results don't
+        depend on completion order. Years still missing some fields get a
+        small targeted follow-up (on `text` when available, else the page).
+        
+        With early_stop, batches go out most-likely-first (scored from
+        `page_texts` when the PDF has a text layer) and the rest are dropped
+        once every required field of every target year meets the confidence
+        target. Dropped pages are counted in stats["pages_avoided"].
+        
+        `prior_outputs` are answers for pages not in `image_paths` (e.g. from
+        the page cache): merged after the new pages and counted toward early
+        stop. `on_page(index, output)` is called for each newly answered page
+        that finished the cascade, i.e. an answer worth reusing.
+        """
+        limit = max_concurrency or self.max_concurrency
+        prior_outputs = list(prior_outputs or [])
+        batches = self.plan_page_batches(image_paths, pages_per_request)
+        page_outputs: List[Optional[Tuple[List[FinancialData], int, float]]] = [None] * len(image_paths)
+        failed: set = set()
+        
+        if self.early_stop and page_texts and len(page_texts) == len(image_paths):
+            scores = [page_priority(t) for t in page_texts]
+            batches.sort(key=lambda batch: -max(scores[i] for i in batch))  # stable: ties keep page order
+        tracker = CompletionTracker(
+            self.required_fields, target_years, self.required_years, self.confidence_target
+        ) if self.early_stop else None
+        stop = threading.Event()
+        if tracker is not None:
+            for output in prior_outputs:
+                tracker.update(output[0])
+            if prior_outputs and tracker.is_complete():
+                batches = []  # the known pages already answer everything
+        
+        if batches:
+            self.backend  # build the backend once before worker threads share it (its client locks itself)
+            pool = ThreadPoolExecutor(max_workers=min(limit, len(batches)))
+            futures = {}
+            for batch in batches:
+                final: set = set()
+                future = pool.submit(self.extract_from_images, [image_paths[i] for i in batch], stop, final)
+                futures[future] = (batch, final)
+            timeout = None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+            timed_out = False
+            try:
+                for future in as_completed(futures, timeout=timeout):
+                    batch, final = futures[future]
+                    if future.cancelled():
+                        continue
+                    try:
+                        outputs = future.result()
+                    except Exception as e:
+                        # Retries are exhausted (or the error is permanent): report, don't hide
+                        failed.update(batch)
+                        print(f"Error processing {', '.join(str(image_paths[i]) for i in batch)}: {e}")
+                        continue
+                    for j, (i, output) in enumerate(zip(batch, outputs)):
+                        page_outputs[i] = output
+                        if output is not None and tracker is not None:
+                            tracker.update(output[0])
+                        if output is not None and on_page is not None and j in final:
+                            on_page(i, output)
+                    done = tracker is not None and tracker.is_complete()
+                    if not stop.is_set() and (done or self.stats["limit_hit"]):
+                        # Everything we need is in (or no time/money left): drop queued
+                        # batches, stop in-flight escalation
+                        stop.set()
+                        for pending in futures:
+                            pending.cancel()
+            except FuturesTimeout:
+                # Deadline: answer with what we have; stragglers finish (and fill the cache) unobserved
+                self.stats["limit_hit"] = self.stats["limit_hit"] or "deadline"
+                timed_out = True
+                stop.set()
+            finally:
+                pool.shutdown(wait=not timed_out, cancel_futures=True)
+        
+        self.stats["failed_pages"].extend(sorted(i + 1 for i in failed))
+        answered = [output for output in page_outputs if output is not None]
+        self.stats["pages_avoided"] += len(image_paths) - len(answered) - len(failed)
+        
+        all_results, year_pages, total_confidence, total_cost = self.merge_page_outputs(page_outputs + prior_outputs)
+        # Image follow-ups need a rendered page; known pages have none
+        year_pages = {year: [p for p in pages if p < len(image_paths)] for year, pages in year_pages.items()}
+        total_cost += self.fill_missing_fields(all_results, image_paths, year_pages, text)
+        
+        # Average over pages actually analyzed; skipped pages aren't evidence of low confidence
+        avg_confidence = total_confidence // max(len(answered) + len(prior_outputs) + len(failed), 1)
+        return list(all_results.values()), avg_confidence, total_cost
     
-    def extract_from_pdf_pages(self, image_paths: List[Path]) -> Tuple[List[FinancialData], int, float]:
-        """Extract from multiple PDF page images."""
+    def merge_page_outputs(
+        self,
+        page_outputs: List[Optional[Tuple[List[FinancialData], int, float]]]
+    ) -> Tuple[Dict[int, FinancialData], Dict[int, List[int]], int, float]:
+        """
+        Merge per-page answers in page order.
+        Returns (results by year, pages per year, summed confidence, summed cost).
+        """
         all_results: Dict[int, FinancialData] = {}
+        year_pages: Dict[int, List[int]] = {}
         total_confidence = 0
         total_cost = 0.0
+        for page_index, output in enumerate(page_outputs):
+            if output is None:
+                continue
+            results, confidence, cost = output
+            total_confidence += confidence
+            total_cost += cost
+            
+            for data in results:
+                year_pages.setdefault(data.year, []).append(page_index)
+                if data.year not in all_results:
+                    all_results[data.year] = data
+                else:
+                    # Merge: prefer higher confidence values
+                    existing = all_results[data.year]
+                    self._merge_data(existing, data)
+        return all_results, year_pages, total_confidence, total_cost
+    
+    def fill_missing_fields(
+        self,
+        all_results: Dict[int, FinancialData],
+        image_paths: List[Path],
+        year_pages: Dict[int, List[int]],
+        text: Optional[str] = None
+    ) -> float:
+        """
+        Re-query only the (year, field) pairs that are still empty.
+        Sends the relevant text lines when we have them, otherwise the single
+        page that answered most for that year. Returns the follow-up cost.
+        """
+        missing = {
+            year: [name for name in FINANCIAL_FIELDS if getattr(data, name).value is None]
+            for year, data in all_results.items()
+        }
+        missing = {year: fields for year, fields in missing.items() if fields}
+        if not missing or self.max_followups <= 0:
+            return 0.0
+        
+        # Group years by the page that best covers them, so one call can serve several years
+        requests: Dict[Optional[int], Dict[int, List[str]]] = {}
+        for year, fields in missing.items():
+            page = None
+            if not text and year_pages.get(year):
+                page = year_pages[year][0]
+            requests.setdefault(page, {})[year] = fields
         
-        for image_path in image_paths:
+        total_cost = 0.0
+        for page, wanted in list(requests.items())[:self.max_followups]:
+            fields = sorted({f for fs in wanted.values() for f in fs}, key=FINANCIAL_FIELDS.index)
+            prompt = self.FOLLOWUP_PROMPT.format(wanted="\n".join(
+                f"- {year}: {', '.join(fs)}" for year, fs in sorted(wanted.items(), reverse=True)
+            ))
+            if page is None and text:
+                content = [{"type": "text", "text": prompt + "\nStatement text:\n" + relevant_text(text, fields)}]
+                input_tokens = 0
+            elif page is not None:
+                content = [{"type": "text", "text": prompt}, self._image_part(image_paths[page])]
+                input_tokens = self.estimate_image_tokens(image_paths[page])
+            else:
+                continue
+            
             try:
-                results, confidence, cost = self.extract_from_image(image_path)
-                total_confidence += confidence
-                total_cost += cost
-                
-                for data in results:
-                    if data.year not in all_results:
-                        all_results[data.year] = data
-                    else:
-                        # Merge: prefer higher confidence values
-                        existing = all_results[data.year]
-                        self._merge_data(existing, data)
+                response, cost = self._complete(
+                    content,
+                    max_tokens=80 * len(wanted) * len(fields) + 100,
+                    input_tokens=input_tokens,
+                    schema=response_schema(fields)
+                )
+            except PlanLimitReached:
+                break
             except Exception as e:
-                print(f"Error processing {image_path}: {e}")
+                print(f"Follow-up query failed: {e}")
                 continue
-        
-        avg_confidence = total_confidence // max(len(image_paths), 1)
-        return list(all_results.values()), avg_confidence, total_cost
+            with self._stats_lock:
+                self.stats["followup_calls"] += 1
+            total_cost += cost
+            
+            results, _ = self._parse_response(response, self.model)
+            for data in results:
+                if data.year in wanted:
+                    # The schema asks for every field missing in any year; keep only this year's gaps
+                    self._merge_data(all_results[data.year], data, fields=wanted[data.year])
+        return total_cost
     
-    def _merge_data(self, existing: FinancialData, new: FinancialData):
-        """Merge new data into existing, preferring higher confidence."""
-        for field in ["revenue", "net_income", "depreciation", "assets", "liabilities", "total_cpltd"]:
+    def _merge_data(self, existing: FinancialData, new: FinancialData, fields: Iterable[str] = FINANCIAL_FIELDS):
+        """Merge new data into existing (only `fields`), preferring higher confidence."""
+        for field in fields:
             existing_val = getattr(existing, field)
             new_val = getattr(new, field)
             if new_val.confidence > existing_val.confidence:
                 setattr(existing, field, new_val)
     
-    def _parse_response(self, content: str) -> Tuple[List[FinancialData], int]:
-        """Parse AI response into FinancialData objects."""
-        # Extract JSON from response (may be wrapped in markdown)
+    def _load_json(self, content: str) -> Optional[Dict]:
+        """Extract the JSON object from a response (may be wrapped in markdown)."""
         json_match = content
         if "```json" in content:
             json_match = content.split("```json")[1].split("```")[0]
@@ -156,10 +877,52 @@ Rules:
             json_match = content.split("```")[1].split("```")[0]
         
         try:
-            data = json.loads(json_match.strip())
+            return json.loads(json_match.strip())
         except json.JSONDecodeError:
+            pass
+        
+        # Salvage the outermost object from chatty output before giving up on a paid call
+        start, end = content.find("{"), content.rfind("}")
+        if 0 <= start < end:
+            try:
+                return json.loads(content[start:end + 1])
+            except json.JSONDecodeError:
+                pass
+        return None
+    
+    def _parse_response(self, content: str, model: str = "") -> Tuple[List[FinancialData], int]:
+        """Parse AI response into FinancialData objects."""
+        data = self._load_json(content)
+        if data is None:
             return [], 0
+        return self._parse_years(data, model)
+    
+    def _parse_multi_page_response(
+        self,
+        content: str,
+        count: int,
+        model: str = ""
+    ) -> List[Tuple[List[FinancialData], int]]:
+        """Parse a packed response into one (results, confidence) per page."""
+        pages: List[Tuple[List[FinancialData], int]] = [([], 0) for _ in range(count)]
+        data = self._load_json(content)
+        if not isinstance(data, dict) or not isinstance(data.get("pages"), list):
+            return pages
         
+        # One malformed entry costs only its own page, not the whole batch
+        for position, page in enumerate(data["pages"]):
+            if not isinstance(page, dict):
+                continue
+            try:
+                index = int(page.get("page", position + 1)) - 1
+                if 0 <= index < count:
+                    pages[index] = self._parse_years(page, model)
+            except (TypeError, ValueError, AttributeError):
+                continue
+        return pages
+    
+    def _parse_years(self, data: Dict, model: str = "") -> Tuple[List[FinancialData], int]:
+        """Convert a {"years": [...], "confidence": N} payload to FinancialData."""
         results = []
         confidence = data.get("confidence", 75)
         
@@ -172,9 +935,39 @@ Rules:
                     setattr(fd, field, ExtractionResult(
                         value=float(value),
                         confidence=confidence,
-                        raw_text=str(value)
+                        raw_text=str(value),
+                        model=model
                     ))
             
             results.append(fd)
         
         return results, confidence
+
+
+def page_priority(page_text: str) -> int:
+    """How likely a page is to hold the statement values (higher = send first)."""
+    lowered = page_text.lower()
+    score = sum(5 for title in STATEMENT_TITLES if title in lowered)
+    score += sum(1 for keywords in FIELD_KEYWORDS.values() for k in keywords if k in lowered)
+    return score
+
+
+def relevant_text(text: str, fields=FINANCIAL_FIELDS, max_chars: int = 12_000) -> str:
+    """
+    Statement lines that mention a year or a label for the given fields.
+    Keeps text prompts small while preserving the headers that date each value.
+    """
+    keywords = [k for name in fields for k in FIELD_KEYWORDS.get(name, [])]
+    lines = []
+    size = 0
+    for line in text.splitlines():
+        lowered = line.lower()
+        if any(k in lowered for k in keywords) or re.search(r'\b20\d{2}\b', line):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            size += len(stripped) + 1
+            if size > max_chars:
+                break
+            lines.append(stripped)
+    return "\n".join(lines)
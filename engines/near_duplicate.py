@@ -0,0 +1,266 @@
+# Near-Duplicate Document Index
+"""
+Re-exported accounting packages (new print date, new footer) differ in
+bytes but not in figures, so the exact-hash caches miss them. This index
+fingerprints the normalized label/amount lines of a document's text layer
+and remembers the extraction that went with it.
+
+A new document is compared against past ones in two steps:
+    1. SimHash (64-bit, over line hashes) - cheap prefilter by Hamming distance
+    2. Jaccard of the exact line sets - the reported match score
+
+At or above "near_dup_reuse_threshold" the prior extraction is reused as
+is. Between "near_dup_min_similarity" and that, it is reused only if the
+new document adds nothing: no label/amount line the prior one lacked, no
+year the prior answer doesn't cover, and every prior figure still present
+("validated"). Otherwise (e.g. a package re-sent with a new period
+appended) the document is extracted normally, where the page cache still
+saves the unchanged pages.
+"""
+
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from engines.regex_engine import FinancialData, FINANCIAL_FIELDS
+
+# Print dates, times, time zones and page markers: what changes between re-exports
+NOISE_RE = re.compile(
+    r"\b(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\b,?"
+    r"|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2},?\s+\d{4}"
+    r"|\b\d{1,4}[/.-]\d{1,2}[/.-]\d{2,4}\b"
+    r"|\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:[ap]\.?m\.?)?"
+    r"|\b(?:gmt|utc)\s*[+-]?\d{1,2}(?::?\d{2})?"
+    r"|\bpage\s+\d+(?:\s+of\s+\d+)?"
+    r"|\b\d+\s*/\s*\d+\b",
+    re.IGNORECASE
+)
+AMOUNT_RE = re.compile(r"\(?-?\$?\d[\d,]*(?:\.\d+)?\)?")
+WORD_RE = re.compile(r"[a-z]+")
+MIN_LINES = 5  # fewer label/amount lines than this is too little to call anything a duplicate
+
+
+def _amount(token: str) -> Optional[float]:
+    cleaned = token.replace("$", "").replace(",", "")
+    negative = cleaned.startswith("(") and cleaned.endswith(")")
+    try:
+        value = float(cleaned.strip("()"))
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def _is_year(token: str, value: float) -> bool:
+    return token.isdigit() and len(token) == 4 and 1900 <= value <= 2099
+
+
+@dataclass
+class Fingerprint:
+    """Normalized label/amount lines of one document."""
+    lines: FrozenSet[int]        # 64-bit hashes of "label|amount amount"
+    amounts: FrozenSet[float]    # every figure in those lines (for validation)
+    simhash: int
+
+    @property
+    def usable(self) -> bool:
+        return len(self.lines) >= MIN_LINES
+
+
+def fingerprint_text(text: str) -> Fingerprint:
+    """Fingerprint a text layer; lines without a figure (headers, footers) are ignored."""
+    lines, amounts = set(), set()
+    for raw in text.lower().splitlines():
+        line = NOISE_RE.sub(" ", raw)
+        figures = []
+        for token in AMOUNT_RE.findall(line):
+            value = _amount(token)
+            if value is not None and not _is_year(token, value):
+                figures.append(value)
+        if not figures:
+            continue
+        label = " ".join(WORD_RE.findall(AMOUNT_RE.sub(" ", line)))
+        feature = label + "|" + " ".join(f"{v:.2f}" for v in figures)
+        lines.add(int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big"))
+        amounts.update(round(v, 2) for v in figures)
+    return Fingerprint(frozenset(lines), frozenset(amounts), simhash(lines))
+
+
+def simhash(features) -> int:
+    """64-bit SimHash of pre-hashed features (each weighted 1)."""
+    counts = [0] * 64
+    for h in features:
+        for bit in range(64):
+            counts[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if counts[bit] > 0)
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def max_hamming(min_similarity: float) -> int:
+    """
+    SimHash distance beyond which Jaccard >= min_similarity is implausible.
+    For equal-size line sets the cosine similarity is 2j / (1 + j), each bit
+    flips with probability angle / pi; allow the mean plus four sigma.
+    """
+    cosine = 2 * min_similarity / (1 + min_similarity)
+    p = math.acos(min(1.0, cosine)) / math.pi
+    return math.ceil(64 * p + 4 * math.sqrt(64 * p * (1 - p)) + 2)
+
+
+def figures_present(records: List[Dict], amounts: FrozenSet[float]) -> bool:
+    """True if every extracted figure of a prior result appears in the new document."""
+    checked = 0
+    for record in records:
+        for name in FINANCIAL_FIELDS:
+            value = (record.get(name) or {}).get("value")
+            if value is None:
+                continue
+            if round(value, 2) not in amounts and round(-value, 2) not in amounts:
+                return False
+            checked += 1
+    return checked > 0
+
+
+def _new_years(records: List[Dict], years: Optional[Iterable[int]]) -> bool:
+    """True if the document mentions a year the prior answer has no record for."""
+    known = {record.get("year") for record in records}
+    return any(year not in known for year in years or [])
+
+
+@dataclass
+class NearDuplicateMatch:
+    """Best prior document for a fingerprint, with its scores."""
+    file_hash: str
+    file: str
+    simhash_similarity: float  # 1 - Hamming distance / 64
+    jaccard: float             # exact label/amount line overlap
+    records: List[Dict]        # FinancialData.to_record() per year
+    confidence: int
+    method: str
+    cost: float
+    new_lines: int = 0         # lines of the new document the prior one doesn't have
+    action: str = "none"       # "reused", "validated" or "rejected"
+
+    def results(self) -> List[FinancialData]:
+        return [FinancialData.from_record(r) for r in self.records]
+
+    def to_dict(self) -> Dict:
+        return {
+            "matched_file": self.file,
+            "matched_hash": self.file_hash,
+            "simhash_similarity": round(self.simhash_similarity, 4),
+            "jaccard": round(self.jaccard, 4),
+            "new_lines": self.new_lines,
+            "action": self.action,
+            "saved_cost": self.cost if self.action in ("reused", "validated") else 0.0,
+        }
+
+
+class NearDuplicateIndex:
+    """Fingerprints and extractions of past documents, shared by all worker processes."""
+
+    def __init__(self, db_path: Optional[Path] = None, max_entries: int = 5000):
+        if db_path is None:
+            from config import get_config_dir
+            db_path = get_config_dir() / "near_duplicates.sqlite"
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    file_hash TEXT PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    simhash TEXT NOT NULL,
+                    lines TEXT NOT NULL,
+                    records TEXT NOT NULL,
+                    confidence INTEGER NOT NULL,
+                    method TEXT NOT NULL,
+                    cost REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=30)
+
+    def find(self, fp: Fingerprint, min_similarity: float, min_confidence: int = 0) -> Optional[NearDuplicateMatch]:
+        """
+        Best match with Jaccard >= min_similarity, or None. SimHash prunes the
+        scan: documents whose Hamming distance already rules them out are
+        never decoded.
+        """
+        if not fp.usable:
+            return None
+        max_distance = max_hamming(min_similarity)
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT file_hash, simhash FROM documents WHERE confidence >= ?", (min_confidence,)
+            ).fetchall()
+            close = [(h, bin(fp.simhash ^ int(s, 16)).count("1")) for h, s in rows]
+            close = sorted((c for c in close if c[1] <= max_distance), key=lambda c: c[1])[:20]
+
+            best = None
+            for file_hash, distance in close:
+                row = db.execute(
+                    "SELECT file, lines, records, confidence, method, cost FROM documents WHERE file_hash = ?",
+                    (file_hash,)
+                ).fetchone()
+                prior_lines = frozenset(int(x, 16) for x in json.loads(row[1]))
+                score = jaccard(fp.lines, prior_lines)
+                if score >= min_similarity and (best is None or score > best.jaccard):
+                    best = NearDuplicateMatch(
+                        file_hash=file_hash, file=row[0], simhash_similarity=1 - distance / 64,
+                        jaccard=score, records=json.loads(row[2]), confidence=row[3],
+                        method=row[4], cost=row[5], new_lines=len(fp.lines - prior_lines)
+                    )
+            if best is not None:
+                db.execute("UPDATE documents SET last_used = ? WHERE file_hash = ?", (time.time(), best.file_hash))
+        return best
+
+    def add(self, file_hash: str, file: str, fp: Fingerprint, results: List[FinancialData],
+            confidence: int, method: str, cost: float):
+        """Remember a finished extraction, then drop the least recently used beyond max_entries."""
+        if not fp.usable or not results:
+            return
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_hash, file, f"{fp.simhash:016x}", json.dumps([f"{h:016x}" for h in sorted(fp.lines)]),
+                 json.dumps([r.to_record() for r in results]), confidence, method, cost, time.time())
+            )
+            db.execute(
+                "DELETE FROM documents WHERE file_hash NOT IN "
+                "(SELECT file_hash FROM documents ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+
+def match_document(index: NearDuplicateIndex, fp: Fingerprint, min_similarity: float,
+                   reuse_threshold: float, min_confidence: int = 0,
+                   years: Optional[Iterable[int]] = None) -> Optional[NearDuplicateMatch]:
+    """
+    Look up a document and decide: "reused" (near-identical lines), "validated"
+    (similar, nothing added, every prior figure still present) or "rejected".
+    `years` are the fiscal years the new document mentions; any the prior
+    answer lacks means new content, so the match is rejected.
+    """
+    match = index.find(fp, min_similarity, min_confidence)
+    if match is None:
+        return None
+    if match.jaccard >= reuse_threshold:
+        match.action = "reused"
+    elif match.new_lines == 0 and not _new_years(match.records, years) and figures_present(match.records, fp.amounts):
+        match.action = "validated"
+    else:
+        match.action = "rejected"
+    return match
@@ -0,0 +1,105 @@
+# Per-Page Extraction Cache
+"""
+Disk-backed cache of per-page work, keyed by the page's content hash
+(utils.pdf_parser.page_content_hashes) rather than the file's: the text
+layer of each page, and the final AI answer for each page under a given
+prompt version, tier list and confidence target.
+
+A package re-sent with a few new pages then reads text only for the new
+pages, and rasterizes and sends only those to the AI; the unchanged
+pages' answers are merged back in from here.
+"""
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from engines.regex_engine import FinancialData
+
+
+class PageCache:
+    """Size-bounded LRU cache of page texts and page answers, shared by all worker processes."""
+
+    def __init__(self, db_path: Optional[Path] = None, max_bytes: int = 200 * 1024 * 1024):
+        if db_path is None:
+            from config import get_config_dir
+            db_path = get_config_dir() / "page_cache.sqlite"
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    confidence INTEGER NOT NULL,
+                    cost REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_used ON pages (last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=30)
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Tuple[str, int, float]]:
+        found: Dict[str, Tuple[str, int, float]] = {}
+        with self._connect() as db:
+            for start in range(0, len(keys), 500):  # stay under SQLite's variable limit
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for key, payload, confidence, cost in db.execute(
+                    f"SELECT key, payload, confidence, cost FROM pages WHERE key IN ({marks})", chunk
+                ):
+                    found[key] = (payload, confidence, cost)
+                db.execute(f"UPDATE pages SET last_used = ? WHERE key IN ({marks})", [time.time(), *chunk])
+        return found
+
+    def _put_many(self, rows: List[Tuple[str, str, int, float]]):
+        if not rows:
+            return
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, payload, confidence, cost, len(payload), now) for key, payload, confidence, cost in rows]
+            )
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM pages ORDER BY last_used").fetchall():
+            db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    # --- Text layer ---
+
+    def get_texts(self, page_hashes: List[str]) -> Dict[str, str]:
+        """Cached text per page hash (pages not cached are absent)."""
+        found = self._get_many([f"text:{h}" for h in set(page_hashes)])
+        return {key[5:]: payload for key, (payload, _, _) in found.items()}
+
+    def put_texts(self, texts: Dict[str, str]):
+        self._put_many([(f"text:{h}", text, 0, 0.0) for h, text in texts.items()])
+
+    # --- AI answers ---
+
+    def get_answers(self, page_hashes: List[str], variant: str) -> Dict[str, Tuple[List[FinancialData], int, float]]:
+        """(results, confidence, original cost) per cached page hash for this engine variant."""
+        found = self._get_many([f"ai:{variant}:{h}" for h in set(page_hashes)])
+        return {
+            key.rsplit(":", 1)[1]: ([FinancialData.from_record(r) for r in json.loads(payload)], confidence, cost)
+            for key, (payload, confidence, cost) in found.items()
+        }
+
+    def put_answer(self, page_hash: str, variant: str, results: List[FinancialData], confidence: int, cost: float):
+        if not results:  # don't pin unparseable answers
+            return
+        payload = json.dumps([r.to_record() for r in results])
+        self._put_many([(f"ai:{variant}:{page_hash}", payload, confidence, cost)])
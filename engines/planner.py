@@ -0,0 +1,211 @@
+# Deadline- and Budget-Aware Extraction Planner
+"""
+Turns a job's latency deadline and/or AI budget into a concrete plan
+before anything is rasterized: which pages to send (most statement-like
+first), at what DPI, on which model tiers, with how much concurrency,
+and whether the cheap text-first pass fits. The AIEngine then enforces
+the same limits as hard stops, so an estimate that was too optimistic
+still ends in a best-effort partial result instead of an overrun.
+
+Estimates come from MODEL_TABLE (price, typical latency) and the vision
+token rules. Note that DPI barely moves cost: high-detail images are
+scaled to 768px on the short side, so any page rendered above ~70 DPI
+costs the same tokens. Lower DPI buys rasterization and upload time.
+"""
+
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from engines.ai_engine import (
+    AIEngine,
+    MODEL_TABLE,
+    DEFAULT_VISION_MODEL,
+    image_tokens,
+    page_priority,
+    usage_cost,
+)
+
+DPI_OPTIONS = (150, 100)           # preferred first; 100 DPI is still legible for statements
+RASTER_SECONDS_PER_PAGE = 0.35     # poppler + PNG save at 150 DPI; scales with pixel count
+EXPECTED_OUTPUT_TOKENS = 400       # typical answer for one page (max_tokens is the worst case)
+ESCALATION_RATE = 0.3              # share of pages a cascade sends on to the next tier
+TEXT_SNIPPET_TOKENS = 1500         # typical relevant_text() prompt
+REQUEST_OVERHEAD_S = 0.5           # connection, encoding, JSON parsing per request
+SAFETY = 0.9                       # plan to 90% of the deadline / budget
+
+
+@dataclass
+class Plan:
+    """What the planner chose, with its estimates (compared with actuals afterwards)."""
+    deadline_s: Optional[float]
+    budget: Optional[float]
+    total_pages: int
+    pages: List[int] = field(default_factory=list)  # 0-based, most promising first
+    dpi: int = DPI_OPTIONS[0]
+    tiers: List[str] = field(default_factory=list)
+    concurrency: int = 1
+    text_first: bool = False
+    est_seconds: float = 0.0
+    est_cost: float = 0.0
+    notes: List[str] = field(default_factory=list)  # what was cut to fit, in plain words
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.notes)
+
+    def apply(self, engine: AIEngine, started_monotonic: float):
+        """Configure an engine to run this plan under hard limits."""
+        engine.tiers = list(self.tiers) or engine.tiers
+        engine.max_concurrency = self.concurrency
+        if self.deadline_s is not None:
+            engine.deadline = started_monotonic + self.deadline_s
+        if self.budget is not None:
+            engine.budget = self.budget
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "est_seconds": round(self.est_seconds, 2), "est_cost": round(self.est_cost, 5)}
+
+
+def page_cost(model: str, dpi: int) -> float:
+    """Expected dollars for one letter-size page on one model."""
+    tokens = AIEngine.PROMPT_TOKENS + image_tokens(8.5 * dpi, 11 * dpi)
+    return usage_cost(model, tokens, EXPECTED_OUTPUT_TOKENS)
+
+
+def _latency(model: str) -> float:
+    return MODEL_TABLE.get(model, MODEL_TABLE[DEFAULT_VISION_MODEL])["latency_s"] + REQUEST_OVERHEAD_S
+
+
+def _strategies(model: str, cascade: Optional[List[str]]) -> List[List[str]]:
+    """Tier lists from most to least capable: as configured, then cheapest vision model alone."""
+    configured = [m for m in (cascade or []) if m != model and MODEL_TABLE.get(m, {}).get("vision", True)] + [model]
+    cheapest = min(
+        (m for m, spec in MODEL_TABLE.items() if spec["vision"]),
+        key=lambda m: page_cost(m, DPI_OPTIONS[0])
+    )
+    strategies = [configured]
+    if [cheapest] != configured:
+        strategies.append([cheapest])
+    return strategies
+
+
+def _tier_estimates(tiers: List[str], dpi: int):
+    """(expected cost per page, worst-case seconds per request round) for a tier list."""
+    cost, share, seconds = 0.0, 1.0, 0.0
+    for tier in tiers:
+        cost += share * page_cost(tier, dpi)
+        seconds += _latency(tier)  # a round waits for its slowest escalation
+        share *= ESCALATION_RATE
+    return cost, seconds
+
+
+def plan_extraction(
+    total_pages: int,
+    deadline_s: Optional[float] = None,
+    budget: Optional[float] = None,
+    elapsed_s: float = 0.0,
+    spent: float = 0.0,
+    model: str = DEFAULT_VISION_MODEL,
+    cascade: Optional[List[str]] = None,
+    max_concurrency: int = 4,
+    page_texts: Optional[List[str]] = None,
+    has_text: bool = False,
+    needs_vision: bool = True
+) -> Plan:
+    """
+    Pick the richest plan that fits: as many of the most promising pages as
+    possible, preferring the configured tiers and the higher DPI when they fit.
+    """
+    plan = Plan(deadline_s=deadline_s, budget=budget, total_pages=total_pages)
+    time_left = math.inf if deadline_s is None else deadline_s * SAFETY - elapsed_s
+    money_left = math.inf if budget is None else budget * SAFETY - spent
+    max_concurrency = max(1, max_concurrency)
+
+    # Page order: statement-like pages first when the text layer can tell us
+    order = list(range(total_pages))
+    relevant = total_pages
+    if page_texts and len(page_texts) == total_pages:
+        scores = [page_priority(t) for t in page_texts]
+        order.sort(key=lambda i: -scores[i])  # stable: ties keep page order
+        relevant = sum(1 for s in scores if s > 0) or total_pages
+
+    # Text-first pass: cheap, one request; skipped if even that doesn't fit
+    if has_text:
+        text_model = ([m for m in (cascade or []) if m != model] + [model])[0]
+        text_cost = usage_cost(text_model, AIEngine.PROMPT_TOKENS + TEXT_SNIPPET_TOKENS, EXPECTED_OUTPUT_TOKENS)
+        if text_cost <= money_left and _latency(text_model) <= time_left:
+            plan.text_first = True
+            plan.est_cost += text_cost
+            plan.est_seconds += _latency(text_model)
+            money_left -= text_cost
+            time_left -= _latency(text_model)
+        else:
+            plan.notes.append("skipped the text-first AI pass (doesn't fit)")
+
+    plan.tiers = _strategies(model, cascade)[0]
+    if not needs_vision or total_pages == 0:
+        plan.concurrency = max_concurrency
+        return plan
+
+    best = None
+    for rank, tiers in enumerate(_strategies(model, cascade)):
+        for dpi in DPI_OPTIONS:
+            per_page, round_seconds = _tier_estimates(tiers, dpi)
+            raster = RASTER_SECONDS_PER_PAGE * (dpi / 150) ** 2
+            for k in range(total_pages, 0, -1):
+                cost = k * per_page
+                if cost > money_left:
+                    continue
+                rounds_time = time_left - k * raster
+                if rounds_time < round_seconds:
+                    continue
+                if math.isfinite(rounds_time):
+                    # Just enough concurrency to make the deadline (less pressure on the shared rate limit)
+                    rounds = int(rounds_time // round_seconds)
+                    concurrency = min(max_concurrency, math.ceil(k / rounds))
+                    if math.ceil(k / concurrency) > rounds:
+                        continue
+                else:
+                    concurrency = max_concurrency
+                seconds = k * raster + math.ceil(k / concurrency) * round_seconds
+                # Rank: cover the statement pages, then capability, then all pages, then DPI
+                key = (min(k, relevant), -rank, k, dpi)
+                if best is None or key > best[0]:
+                    best = (key, tiers, dpi, k, concurrency, cost, seconds)
+                break  # largest k for this strategy/DPI
+
+    if best is None:
+        plan.notes.append("no page fits the deadline/budget: regex and text results only")
+        return plan
+
+    _, tiers, dpi, k, concurrency, cost, seconds = best
+    plan.tiers, plan.dpi, plan.pages, plan.concurrency = tiers, dpi, order[:k], concurrency
+    plan.est_cost += cost
+    plan.est_seconds += seconds
+    if k < total_pages:
+        plan.notes.append(f"analyzing {k} of {total_pages} pages (most statement-like first)")
+    if tiers != _strategies(model, cascade)[0]:
+        plan.notes.append(f"using {tiers[-1]} only instead of {model}")
+    if dpi != DPI_OPTIONS[0]:
+        plan.notes.append(f"rendering at {dpi} DPI")
+    return plan
+
+
+def plan_report(plan: Plan, seconds: float, cost: float, ai_stats: Optional[Dict] = None) -> Dict:
+    """Plan next to what actually happened."""
+    ai_stats = ai_stats or {}
+    analyzed = len(plan.pages) - ai_stats.get("pages_avoided", 0) - len(ai_stats.get("failed_pages", []))
+    limit_hit = ai_stats.get("limit_hit")
+    return {
+        "plan": plan.to_dict(),
+        "actual": {
+            "seconds": round(seconds, 2),
+            "cost": round(cost, 5),
+            "pages_analyzed": max(analyzed, 0),
+            "limit_hit": limit_hit,
+            "within_deadline": plan.deadline_s is None or seconds <= plan.deadline_s,
+            "within_budget": plan.budget is None or cost <= plan.budget,
+        },
+        "partial": plan.degraded or bool(limit_hit),
+    }
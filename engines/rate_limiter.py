@@ -0,0 +1,171 @@
+# Cross-Process Rate Limiting for OpenAI Calls
+"""
+Machine-wide token bucket shared by every backend subprocess through a
+locked state file, plus retry with jittered exponential backoff that
+honors Retry-After. Keeps batch throughput at the account limit instead
+of bursting into 429s.
+"""
+
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "Timeout", "ConnectionError"}
+
+
+@contextmanager
+def file_lock(lock_path: Path):
+    """Exclusive inter-process lock on a file (fcntl on POSIX, msvcrt on Windows)."""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10s; keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class TokenBucketLimiter:
+    """Requests/min and tokens/min buckets stored in a shared JSON file."""
+
+    def __init__(self, state_path: Optional[Path] = None, requests_per_min: int = 500, tokens_per_min: int = 30_000):
+        if state_path is None:
+            from config import get_temp_dir
+            state_path = get_temp_dir() / "openai_rate_limit.json"
+        self.state_path = Path(state_path)
+        self.lock_path = self.state_path.with_suffix(".lock")
+        self.requests_per_min = requests_per_min
+        self.tokens_per_min = tokens_per_min
+
+    def _read(self, now: float) -> dict:
+        try:
+            state = json.loads(self.state_path.read_text())
+        except (OSError, json.JSONDecodeError):
+            state = {}
+        return {
+            "requests": state.get("requests", float(self.requests_per_min)),
+            "tokens": state.get("tokens", float(self.tokens_per_min)),
+            "updated": state.get("updated", now),
+            "blocked_until": state.get("blocked_until", 0.0),
+        }
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(0.0, now - state["updated"])
+        state["requests"] = min(self.requests_per_min, state["requests"] + elapsed * self.requests_per_min / 60)
+        state["tokens"] = min(self.tokens_per_min, state["tokens"] + elapsed * self.tokens_per_min / 60)
+        state["updated"] = now
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until a request of `tokens` fits both buckets. Returns seconds waited."""
+        # A request bigger than the whole bucket would never fit; let it drain the bucket
+        tokens = min(tokens, self.tokens_per_min)
+        waited = 0.0
+        while True:
+            with file_lock(self.lock_path):
+                now = time.time()
+                state = self._read(now)
+                self._refill(state, now)
+                wait = state["blocked_until"] - now
+                if wait <= 0:
+                    if state["requests"] >= 1 and state["tokens"] >= tokens:
+                        state["requests"] -= 1
+                        state["tokens"] -= tokens
+                        self.state_path.write_text(json.dumps(state))
+                        return waited
+                    wait = max(
+                        (1 - state["requests"]) * 60 / self.requests_per_min,
+                        (tokens - state["tokens"]) * 60 / self.tokens_per_min
+                    )
+                self.state_path.write_text(json.dumps(state))
+            wait = max(wait, 0.05)
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        """After a 429, hold every worker back for `seconds`."""
+        with file_lock(self.lock_path):
+            now = time.time()
+            state = self._read(now)
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            self.state_path.write_text(json.dumps(state))
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After (or retry-after-ms) from an API error's response headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return _status_code(error) in RETRYABLE_STATUS
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    limiter: Optional[TokenBucketLimiter] = None,
+    on_retry: Optional[Callable[[Exception, float], None]] = None
+) -> T:
+    """
+    Call fn, retrying transient failures with full-jitter exponential backoff.
+    A Retry-After header sets the minimum delay; 429s also pause the shared limiter.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if limiter is not None and _status_code(e) == 429:
+                limiter.pause(delay)
+            if on_retry is not None:
+                on_retry(e, delay)
+            time.sleep(delay)
+            attempt += 1
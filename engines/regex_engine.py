@@ -4,9 +4,37 @@ Pattern-based extraction for digital PDFs.
 Zero-cost, instant extraction with confidence scoring.
 """
 
+import itertools
+import multiprocessing
+import os
 import re
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, field
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import asdict, dataclass, field
+
+
+# Year tokens with an optional fiscal-context prefix ("As of", "Year Ended", FY...).
+# One left-to-right scan of this pattern yields every year mention in the text.
+YEAR_MENTION_RE = re.compile(
+    r'(?=[AaYyFf2])'  # cheap first-character reject before trying the prefixes
+    r'(?:'
+    r'(?P<as_of>[Aa]s\s+of\s+(?:\w+\s+\d{1,2},?\s+)?)'
+    r'|(?P<year_ended>[Yy]ear\s+[Ee]nded\s+(?:\w+\s+\d{1,2},?\s+)?)'
+    r'|(?P<for_year>[Ff]or\s+(?:the\s+)?[Yy]ear\s+)'
+    r'|(?P<fiscal_year>[Ff]iscal\s+[Yy]ear\s+)'
+    r'|(?P<fy>FY\s*)'
+    r')?(?P<year>20\d{2})'
+)
+
+FISCAL_CONTEXTS = ("as_of", "year_ended", "for_year", "fiscal_year", "fy")
+
+# Section span limits (characters after the year token), as in the original
+# lazy `{year}[\s\S]{100,2000}?(?=20\d{2}|$)` search.
+SECTION_MIN_CHARS = 100
+SECTION_MAX_CHARS = 2000
+
+
+FINANCIAL_FIELDS = ("revenue", "net_income", "depreciation", "assets", "liabilities", "total_cpltd")
 
 
 @dataclass
@@ -16,6 +44,7 @@ class ExtractionResult:
     raw_text: str = ""
     confidence: int = 0  # 0-100
     source_line: str = ""
+    model: str = ""  # AI model (cascade tier) that produced the value, if any
 
 
 @dataclass 
@@ -50,8 +79,96 @@ class FinancialData:
             "assets": self.assets.value,
             "liabilities": self.liabilities.value,
             "total_cpltd": self.total_cpltd.value,
-            "confidence": self.overall_confidence()
+            "confidence": self.overall_confidence(),
+            "sources": {
+                name: getattr(self, name).model
+                for name in FINANCIAL_FIELDS if getattr(self, name).model
+            }
         }
+    
+    def to_record(self) -> Dict:
+        """Lossless dictionary (per-field confidence and source) for caching."""
+        return asdict(self)
+    
+    @classmethod
+    def from_record(cls, record: Dict) -> "FinancialData":
+        """Rebuild from a to_record() dictionary."""
+        data = cls(year=record.get("year", 0))
+        for name in FINANCIAL_FIELDS:
+            if record.get(name):
+                setattr(data, name, ExtractionResult(**record[name]))
+        return data
+
+
+@dataclass
+class YearMention:
+    """A single year token found in the document."""
+    year: int
+    start: int
+    context: str = "mention"  # "mention" or one of FISCAL_CONTEXTS
+    section_end: Optional[int] = None
+
+    @property
+    def is_fiscal(self) -> bool:
+        return self.context != "mention"
+
+
+class YearIndex:
+    """
+    Single-pass index of year mentions and their section spans.
+    Answers year detection and per-year slicing without re-scanning the text.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.mentions: List[YearMention] = []
+        self._sections: Dict[int, Tuple[int, int]] = {}
+        self._build()
+
+    def _build(self):
+        for match in YEAR_MENTION_RE.finditer(self.text):
+            start = match.start("year")
+            context = "mention"
+            if match.start() != start:
+                context = next(c for c in FISCAL_CONTEXTS if match.group(c) is not None)
+            self.mentions.append(YearMention(int(match.group("year")), start, context))
+
+        # Section spans: from a year token, run at least SECTION_MIN_CHARS and stop
+        # at the next year token (or end of text) within SECTION_MAX_CHARS.
+        starts = [m.start for m in self.mentions]
+        count = len(starts)
+        text_len = len(self.text)
+        # `$` also matches just before a trailing newline
+        newline_end = text_len - 1 if self.text.endswith("\n") else None
+        j = 0
+        for mention in self.mentions:
+            lo = mention.start + 4 + SECTION_MIN_CHARS
+            while j < count and starts[j] < lo:
+                j += 1
+            end = starts[j] if j < count else text_len
+            if newline_end is not None and lo <= newline_end < end:
+                end = newline_end
+            if lo <= end <= mention.start + 4 + SECTION_MAX_CHARS:
+                mention.section_end = end
+                if mention.year not in self._sections:
+                    self._sections[mention.year] = (mention.start, end)
+
+    def fiscal_years(self) -> List[int]:
+        """Years that appear in a fiscal context ("As of", "Year Ended", FY...)."""
+        return [m.year for m in self.mentions if m.is_fiscal]
+
+    def years(self) -> List[int]:
+        """Every year token in document order."""
+        return [m.year for m in self.mentions]
+
+    def section_span(self, year: int) -> Optional[Tuple[int, int]]:
+        """(start, end) of the first section belonging to `year`, if any."""
+        return self._sections.get(year)
+
+    def section(self, year: int) -> Optional[str]:
+        """Text of the first section belonging to `year`, if any."""
+        span = self.section_span(year)
+        return self.text[span[0]:span[1]] if span else None
 
 
 class RegexEngine:
@@ -99,12 +216,8 @@ class RegexEngine:
     }
     
     def __init__(self):
-        self.compiled_patterns = {}
-        for field, patterns in self.PATTERNS.items():
-            self.compiled_patterns[field] = [
-                re.compile(p, re.IGNORECASE | re.MULTILINE)
-                for p in patterns
-            ]
+        # Patterns are compiled once per process (and inherited by forked workers)
+        self.compiled_patterns = COMPILED_PATTERNS
     
     def parse_money(self, text: str) -> Optional[float]:
         """Parse a money string to float."""
@@ -123,7 +236,7 @@ class RegexEngine:
         except ValueError:
             return None
     
-    def extract_years(self, text: str, filename: str = "") -> List[int]:
+    def extract_years(self, text: str, filename: str = "", index: Optional[YearIndex] = None) -> List[int]:
         """Find fiscal years mentioned in the document (not print dates)."""
         from datetime import datetime
         current_year = datetime.now().year
@@ -134,24 +247,16 @@ class RegexEngine:
             # Use filename year as the primary year
             return [int(filename_years[0])]
         
+        if index is None:
+            index = YearIndex(text)
+        
         # Priority 1: Look for "As of [date] YYYY" or "Year Ended YYYY" patterns
-        fiscal_patterns = [
-            r'[Aa]s\s+of\s+(?:\w+\s+\d{1,2},?\s+)?(20\d{2})',
-            r'[Yy]ear\s+[Ee]nded\s+(?:\w+\s+\d{1,2},?\s+)?(20\d{2})',
-            r'[Ff]or\s+(?:the\s+)?[Yy]ear\s+(20\d{2})',
-            r'[Ff]iscal\s+[Yy]ear\s+(20\d{2})',
-            r'FY\s*(20\d{2})',
+        fiscal_years = [
+            yr for yr in index.fiscal_years()
+            # Only accept years that are not in the future
+            if 2000 <= yr <= current_year
         ]
         
-        fiscal_years = []
-        for pattern in fiscal_patterns:
-            matches = re.findall(pattern, text)
-            for y in matches:
-                yr = int(y)
-                # Only accept years that are not in the future
-                if 2000 <= yr <= current_year:
-                    fiscal_years.append(yr)
-        
         if fiscal_years:
             # Return unique fiscal years, sorted descending, max 3
             return sorted(set(fiscal_years), reverse=True)[:3]
@@ -159,12 +264,7 @@ class RegexEngine:
         # Fallback: Find all years but STRICTLY filter
         # - Exclude future years (print dates like 2025)
         # - Exclude very old years (pre-2015)
-        all_matches = re.findall(self.YEAR_PATTERN, text)
-        years = []
-        for y in all_matches:
-            yr = int(y)
-            if 2015 <= yr <= current_year:  # Only past/present years
-                years.append(yr)
+        years = [yr for yr in index.years() if 2015 <= yr <= current_year]
         
         years = sorted(set(years), reverse=True)
         return years[:3]  # Max 3 most recent years
@@ -195,7 +295,8 @@ class RegexEngine:
         Extract financial data from text.
         Returns list of FinancialData (one per year) and overall confidence.
         """
-        years = self.extract_years(text, filename)
+        index = YearIndex(text)
+        years = self.extract_years(text, filename, index=index)
         if not years:
             from datetime import datetime
             years = [datetime.now().year]  # Default to current year
@@ -207,7 +308,7 @@ class RegexEngine:
             data = FinancialData(year=year)
             
             # Try to find year-specific sections
-            year_text = self._find_year_section(text, year)
+            year_text = self._find_year_section(text, year, index=index)
             search_text = year_text if year_text else text
             
             data.revenue = self.extract_field(search_text, "revenue")
@@ -232,9 +333,100 @@ class RegexEngine:
         overall_confidence = sum(r.overall_confidence() for r in results) // max(len(results), 1)
         return results, overall_confidence
     
-    def _find_year_section(self, text: str, year: int) -> Optional[str]:
+    def extract_many(
+        self,
+        docs: Iterable[Tuple[str, str]],
+        processes: Optional[int] = None,
+        chunksize: int = 16,
+        stats: Optional["BatchStats"] = None
+    ) -> Iterator[Tuple[str, List[FinancialData], int]]:
+        """
+        Extract from many (text, filename) pairs, streaming results in input order.
+        Yields (filename, results, confidence) per document.
+        
+        Args:
+            docs: Iterable of (text, filename) pairs; consumed lazily
+            processes: Worker processes (default: all cores, 1 = in-process)
+            chunksize: Documents handed to a worker per dispatch
+            stats: Optional BatchStats, updated as documents complete
+        """
+        if stats is None:
+            stats = BatchStats()
+        stats.start()
+        processes = processes or os.cpu_count() or 1
+        
+        if processes <= 1:
+            for text, filename in docs:
+                results, confidence = self.extract(text, filename)
+                stats.add(text)
+                yield filename, results, confidence
+            return
+        
+        # Fork shares the already-compiled patterns with workers; spawn recompiles on import
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+        
+        # Feed the pool in bounded windows so huge corpora are never fully materialized
+        window = processes * chunksize * 4
+        docs = iter(docs)
+        with ctx.Pool(processes) as pool:
+            while True:
+                batch = list(itertools.islice(docs, window))
+                if not batch:
+                    break
+                for (text, _), (filename, results, confidence) in zip(
+                    batch, pool.imap(_extract_worker, batch, chunksize)
+                ):
+                    stats.add(text)
+                    yield filename, results, confidence
+    
+    def _find_year_section(self, text: str, year: int, index: Optional[YearIndex] = None) -> Optional[str]:
         """Try to isolate text specific to a year."""
-        # Look for sections starting with the year
-        pattern = rf'{year}[\s\S]{{100,2000}}?(?=20\d{{2}}|$)'
-        match = re.search(pattern, text)
-        return match.group(0) if match else None
+        # Sections start at the year token; spans come from the precomputed index
+        if index is None:
+            index = YearIndex(text)
+        return index.section(year)
+
+
+COMPILED_PATTERNS = {
+    field: [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in patterns]
+    for field, patterns in RegexEngine.PATTERNS.items()
+}
+
+
+@dataclass
+class BatchStats:
+    """Throughput counters for RegexEngine.extract_many."""
+    docs: int = 0
+    chars: int = 0
+    started_at: float = 0.0
+    elapsed: float = 0.0
+    
+    def start(self):
+        self.started_at = time.perf_counter()
+    
+    def add(self, text: str):
+        self.docs += 1
+        self.chars += len(text)
+        self.elapsed = time.perf_counter() - self.started_at
+    
+    @property
+    def docs_per_sec(self) -> float:
+        return self.docs / self.elapsed if self.elapsed > 0 else 0.0
+    
+    @property
+    def mb_per_sec(self) -> float:
+        return self.chars / 1_000_000 / self.elapsed if self.elapsed > 0 else 0.0
+
+
+_worker_engine: Optional[RegexEngine] = None
+
+
+def _extract_worker(doc: Tuple[str, str]) -> Tuple[str, List[FinancialData], int]:
+    """Pool worker: one engine per process, reused across chunks."""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = RegexEngine()
+    text, filename = doc
+    results, confidence = _worker_engine.extract(text, filename)
+    return filename, results, confidence
@@ -0,0 +1,481 @@
+# Tax Return Template Engine
+"""
+Reads IRS business returns (Form 1120, 1120-S and 1065) by line number
+instead of by pattern or AI. Within a tax year the forms are fixed: gross
+receipts are line 1c, total assets are Schedule L line 14/15 column (d),
+and so on. Templates cover only the years they were checked against.
+
+Tax software prints its values as a separate text layer positioned over
+the form, so the flat text reads as a list of labels followed by a list
+of numbers. Instead, each page is read as positioned text runs: line
+numbers ("16", "a", "16a") are grouped into rows, and each value goes to
+the line-number segment it sits to the right of on the nearest row.
+Values typed into a fillable PDF's form fields join in at their field
+positions, so both kinds of return take the same path.
+
+Zero AI calls; a return is read in well under a second once its text
+layer is known.
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from engines.regex_engine import ExtractionResult, FinancialData, FINANCIAL_FIELDS
+
+LINE_RE = re.compile(r"^(\d{1,2})([a-h])?$")
+LETTER_RE = re.compile(r"^[a-h]$")
+AMOUNT_RE = re.compile(r"^\(?-?\$?\d[\d,]*(?:\.\d*)?\)?-?$")
+HEADING_RE = re.compile(r"^(?:Schedule [A-Z][\w-]*|Analysis of )")
+REFERENCE_RE = re.compile(r"^(?:STATEMENT|STMT|SEE|Form|line|lines)$", re.IGNORECASE)
+ROW_TOLERANCE = 1.0    # line-number tokens within this many points share a row
+VALUE_TOLERANCE = 6.0  # values sit up to this far above/below their row's baseline
+LETTER_GAP = 14.0      # "16" followed by "a" within this gap is one label, "16a"
+LANE_GAP = 20.0        # a lone "b" continues the line number printed just left of it
+
+
+@dataclass
+class Run:
+    """One positioned piece of text (or a form field value)."""
+    x: float
+    y: float
+    text: str
+    width: float
+
+    @property
+    def center(self) -> float:
+        return self.x + self.width / 2
+
+
+@dataclass(frozen=True)
+class Section:
+    """Where to look: a page (all `page` strings present) and, optionally, the heading that starts the section."""
+    page: Tuple[str, ...]
+    heading: Optional[str] = None
+    columns: bool = False  # Schedule L style (a)-(d); values are read from column (d), end of year
+
+
+@dataclass(frozen=True)
+class LineRef:
+    """One or more lines of a section (summed when several)."""
+    section: str
+    lines: Tuple[str, ...]
+
+    def describe(self, form: str) -> str:
+        where = "" if self.section == "main" else f"{SECTION_NAMES.get(self.section, self.section)} "
+        return f"Form {form} {where}line{'s' if len(self.lines) > 1 else ''} {', '.join(self.lines)}"
+
+
+def L(section: str, *lines: str) -> LineRef:
+    return LineRef(section, lines)
+
+
+@dataclass
+class FormTemplate:
+    form: str
+    title: str                          # case-sensitive text on the form's first page
+    sections: Dict[str, Section]
+    fields: Dict[str, List[LineRef]]    # alternatives, most authoritative first
+    balance_check: Tuple[LineRef, LineRef]  # Schedule L total assets = total liabilities and capital
+    # A farm partnership reports its P&L on Schedule F (gross receipts lines left blank)
+    farm_fields: Dict[str, List[LineRef]] = field(default_factory=dict)
+
+
+SECTION_NAMES = {
+    "sch_l": "Schedule L",
+    "sch_m1": "Schedule M-1",
+    "sch_k": "Schedule K",
+    "sch_f": "Schedule F",
+    "analysis": "Analysis of Net Income",
+}
+
+# Field mapping follows the TMA sheet ("Sample Correct Output.png" for the sample 1065):
+#   net income   - the business's tax-basis operating result (ordinary business income, or
+#                  Schedule F net farm profit), not book income; Schedule M-1 line 1 is a fallback
+#   liabilities  - Schedule L current liabilities: accounts payable, mortgages/notes due in
+#                  under a year, other current liabilities (not long-term mortgages or owner loans)
+#   total CPLTD  - Schedule L mortgages/notes due in under a year
+_CORPORATE_SCHEDULE_L = {
+    "assets": [L("sch_l", "15")],
+    "liabilities": [L("sch_l", "16", "17", "18")],
+    "total_cpltd": [L("sch_l", "17")],
+}
+
+# Keyed by (form, first tax year, last tax year): the line numbers move between
+# revisions (the 2023 1065 and 1120-S add a Form 7205 deduction line and renumber
+# the rest of page 1), so a template is only used for the years it was checked on.
+# A return from any other year is left to the regular pipeline.
+TEMPLATES: Dict[Tuple[str, int, int], FormTemplate] = {
+    ("1065", 2022, 2022): FormTemplate(
+        form="1065",
+        title="Return of Partnership Income",
+        sections={
+            "main": Section(("Return of Partnership Income", "Gross receipts")),
+            "analysis": Section(("Form 1065 (", "Analysis of Net Income"), heading="Analysis of Net Income"),
+            "sch_l": Section(("Form 1065 (", "Balance Sheets per Books"), heading="Schedule L", columns=True),
+            "sch_m1": Section(("Form 1065 (", "Schedule M-1"), heading="Schedule M-1"),
+            "sch_f": Section(("Profit or Loss From Farming",)),
+        },
+        fields={
+            "revenue": [L("main", "1c"), L("main", "1a")],
+            "net_income": [L("main", "22"), L("analysis", "1"), L("sch_m1", "1")],
+            "depreciation": [L("main", "16a")],
+            "assets": [L("sch_l", "14")],
+            "liabilities": [L("sch_l", "15", "16", "17")],
+            "total_cpltd": [L("sch_l", "16")],
+        },
+        balance_check=(L("sch_l", "14"), L("sch_l", "22")),
+        farm_fields={
+            "revenue": [L("sch_f", "9")],
+            "net_income": [L("sch_f", "34"), L("main", "5")],
+            "depreciation": [L("sch_f", "14"), L("main", "16a")],
+        },
+    ),
+    ("1120-S", 2022, 2022): FormTemplate(
+        form="1120-S",
+        title="Income Tax Return for an S Corporation",
+        sections={
+            "main": Section(("Income Tax Return for an S Corporation", "Gross receipts")),
+            "sch_k": Section(("Form 1120-S (", "Income (loss) reconciliation"), heading="Schedule K"),
+            "sch_l": Section(("Form 1120-S (", "Balance Sheets per Books"), heading="Schedule L", columns=True),
+            "sch_m1": Section(("Form 1120-S (", "Schedule M-1"), heading="Schedule M-1"),
+        },
+        fields={
+            "revenue": [L("main", "1c"), L("main", "1a")],
+            "net_income": [L("main", "21"), L("sch_k", "18"), L("sch_m1", "1")],
+            "depreciation": [L("main", "14")],
+            **_CORPORATE_SCHEDULE_L,
+        },
+        balance_check=(L("sch_l", "15"), L("sch_l", "27")),
+    ),
+    ("1120", 2022, 2022): FormTemplate(
+        form="1120",
+        title="Corporation Income Tax Return",
+        sections={
+            "main": Section(("Corporation Income Tax Return", "Gross receipts")),
+            "sch_l": Section(("Form 1120 (", "Balance Sheets per Books"), heading="Schedule L", columns=True),
+            "sch_m1": Section(("Form 1120 (", "Schedule M-1"), heading="Schedule M-1"),
+        },
+        fields={
+            "revenue": [L("main", "1c"), L("main", "1a")],
+            "net_income": [L("main", "28"), L("sch_m1", "1")],
+            "depreciation": [L("main", "20")],
+            **_CORPORATE_SCHEDULE_L,
+        },
+        balance_check=(L("sch_l", "15"), L("sch_l", "28")),
+    ),
+}
+
+PRIMARY_CONFIDENCE = 95   # the line the form defines for the figure
+FALLBACK_CONFIDENCE = 90  # a related line, used when the primary one is blank
+UNBALANCED_CONFIDENCE = 70  # Schedule L figures when its totals don't tie (misread layout): leave to AI
+
+
+def looks_like_tax_return(text: str) -> bool:
+    """Cheap check on the whole text layer before reading it page by page."""
+    return any(all(marker in text for marker in t.sections["main"].page) for t in TEMPLATES.values())
+
+
+def detect_form(page_texts: List[str]) -> Optional[Tuple[FormTemplate, int]]:
+    """
+    (template, index of the form's first page) for the earliest return in the
+    document, or None if there is none or its tax year has no template.
+    """
+    found: Dict[str, int] = {}
+    for template in TEMPLATES.values():
+        main = template.sections["main"]
+        for index, page_text in enumerate(page_texts):
+            if all(marker in page_text for marker in main.page):
+                found.setdefault(template.form, index)
+                break
+    if not found:
+        return None
+    form, index = min(found.items(), key=lambda item: item[1])
+    year = tax_year(page_texts[index], form)
+    template = template_for(form, year)
+    if template is None:
+        print(f"Form {form} ({year or 'year unknown'}): no template checked for that year, skipping line reading")
+        return None
+    return template, index
+
+
+def template_for(form: str, year: int) -> Optional[FormTemplate]:
+    """The template whose line numbers were checked for this form and tax year."""
+    for (name, first, last), template in TEMPLATES.items():
+        if name == form and first <= year <= last:
+            return template
+    return None
+
+
+def tax_year(page_text: str, form: str) -> int:
+    """Form year from "For calendar year 2022" or the "Form 1065 (2022)" footer."""
+    match = re.search(r"calendar year (\d{4})", page_text) or re.search(
+        rf"Form\s*{re.escape(form)}\s*\((\d{{4}})\)", page_text
+    )
+    return int(match.group(1)) if match else 0
+
+
+def positioned_runs(page) -> List[Run]:
+    """Text runs with their page position, plus filled-in form field values."""
+    runs: List[Run] = []
+    font_size = [10.0]
+
+    def before(operator, operands, cm, tm):
+        if operator == b"Tf" and len(operands) > 1:
+            font_size[0] = float(operands[1])
+            return
+        if operator not in (b"Tj", b"TJ", b"'", b'"'):
+            return
+        if operator == b"TJ":
+            text = "".join(_as_text(part) for part in operands[0] if not isinstance(part, (int, float)))
+        else:
+            text = _as_text(operands[-1])
+        text = text.strip()
+        if not text:
+            return
+        scale = abs(tm[0] * cm[0]) or 1.0
+        x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        runs.append(Run(x, y, text, len(text) * font_size[0] * 0.55 * scale))
+
+    page.extract_text(visitor_operand_before=before)
+    runs.extend(_field_runs(page))
+    return runs
+
+
+def _as_text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode("latin-1")
+    return str(value)
+
+
+def _field_runs(page) -> List[Run]:
+    """Values of filled-in widgets, positioned at their field rectangles."""
+    runs = []
+    for annot in page.get("/Annots") or []:
+        annot = annot.get_object()
+        if annot.get("/Subtype") != "/Widget" or "/Rect" not in annot:
+            continue
+        value = annot.get("/V")
+        if value is None and "/Parent" in annot:
+            value = annot["/Parent"].get_object().get("/V")
+        text = _as_text(value).strip() if value is not None else ""
+        if not text or not AMOUNT_RE.match(text):
+            continue
+        x0, y0, x1, y1 = (float(v) for v in annot["/Rect"])
+        runs.append(Run(min(x0, x1), min(y0, y1) + 2, text, abs(x1 - x0)))
+    return runs
+
+
+def _is_amount(run: Run) -> bool:
+    """Printed values carry a comma or a period ("5,000." / "724."); bare "6" is a line number."""
+    return bool(AMOUNT_RE.match(run.text)) and ("," in run.text or "." in run.text or len(run.text.strip("-()$")) >= 3)
+
+
+def _parse_amount(text: str) -> Optional[float]:
+    cleaned = text.replace("$", "").replace(",", "")
+    negative = cleaned.startswith("(") or cleaned.startswith("-") or cleaned.endswith("-")
+    try:
+        value = float(cleaned.strip("()-").rstrip("."))
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+@dataclass
+class SectionLines:
+    """Line id -> values read on that line (left to right), for one section."""
+    values: Dict[str, List[Run]] = field(default_factory=dict)
+    end_of_year: Optional[float] = None  # x boundary of column (d) for Schedule L style sections
+
+    def has(self, line: str) -> bool:
+        return line in self.values
+
+    def value(self, line: str) -> Optional[Run]:
+        runs = self.values.get(line) or []
+        if self.end_of_year is not None:
+            runs = [r for r in runs if r.center > self.end_of_year]
+        return runs[-1] if runs else None  # rightmost: the total column of the line
+
+    @property
+    def filled(self) -> bool:
+        """A columnar section with any end-of-year value (so its blank lines are zero)."""
+        return self.end_of_year is not None and any(
+            run.center > self.end_of_year for runs in self.values.values() for run in runs
+        )
+
+
+def read_section(runs: List[Run], page_width: float, heading: Optional[str], columns: bool) -> Optional[SectionLines]:
+    """Group a section's line numbers into rows and hand each value to its line."""
+    top, bottom = float("inf"), float("-inf")
+    if heading:
+        starts = [r for r in runs if r.text.startswith(heading) and r.x < page_width * 0.2]
+        if not starts:
+            return None
+        top = max(r.y for r in starts) + ROW_TOLERANCE
+        below = [r.y for r in runs if r.y < top - 2 * ROW_TOLERANCE and r.x < page_width * 0.2
+                 and HEADING_RE.match(r.text) and not r.text.startswith(heading)]
+        bottom = max(below) if below else bottom
+    inside = [r for r in runs if bottom < r.y < top]
+
+    # Line-number tokens ("12", "a", "16a"), minus references such as "STATEMENT 6"
+    labels = []
+    for run in inside:
+        if not (LINE_RE.match(run.text) or LETTER_RE.match(run.text)):
+            continue
+        if any(REFERENCE_RE.match(other.text) and abs(other.y - run.y) < ROW_TOLERANCE and 0 < run.x - other.x < 90
+               for other in inside):
+            continue
+        labels.append(run)
+    labels.sort(key=lambda r: (-r.y, r.x))
+
+    rows: List[List[Run]] = []
+    for run in labels:
+        if rows and abs(rows[-1][0].y - run.y) <= ROW_TOLERANCE:
+            rows[-1].append(run)
+        else:
+            rows.append([run])
+
+    # Segments: (row y, start x, line id); a lone letter continues the number in its lane
+    segments: List[Tuple[float, float, str]] = []
+    lanes: Dict[float, Tuple[int, str]] = {}  # x -> (order, number)
+    order = 0
+    for row in rows:
+        row.sort(key=lambda r: r.x)
+        previous: Optional[Tuple[float, float, str]] = None
+        for run in row:
+            order += 1
+            match = LINE_RE.match(run.text)
+            if match and not LETTER_RE.match(run.text):
+                previous = (run.y, run.x, run.text)
+                segments.append(previous)
+                lanes[run.x] = (order, match.group(1))
+                continue
+            # A letter: part of "16 a" printed as two tokens, or a continuation line ("b")
+            if previous is not None and previous[2].isdigit() and run.x - previous[1] < LETTER_GAP + 10:
+                segments[-1] = (previous[0], previous[1], previous[2] + run.text)
+                previous = None
+                continue
+            nearby = [(o, number) for x, (o, number) in lanes.items() if 0 <= run.x - x + 2 < LANE_GAP]
+            if nearby:
+                previous = None
+                segments.append((run.y, run.x, max(nearby)[1] + run.text))
+
+    lines = SectionLines()
+    if columns:
+        headers = {r.text: r for r in inside if r.text in ("(a)", "(b)", "(c)", "(d)")}
+        if "(c)" in headers and "(d)" in headers:
+            lines.end_of_year = (headers["(c)"].center + headers["(d)"].center) / 2
+        else:
+            lines.end_of_year = page_width * 0.75
+    for _, _, line in segments:
+        lines.values.setdefault(line, [])
+    for run in sorted((r for r in inside if _is_amount(r)), key=lambda r: r.x):
+        candidates = [s for s in segments if abs(s[0] - run.y) <= VALUE_TOLERANCE and s[1] < run.x]
+        if not candidates:
+            continue
+        nearest_y = min(abs(s[0] - run.y) for s in candidates)
+        row = [s for s in candidates if abs(s[0] - run.y) - nearest_y < ROW_TOLERANCE]
+        owner = max(row, key=lambda s: s[1])
+        lines.values[owner[2]].append(run)
+    return lines
+
+
+class TaxFormEngine:
+    """Zero-AI extraction for Forms 1120, 1120-S and 1065."""
+
+    def extract(
+        self,
+        pdf_path: Path,
+        page_texts: List[str]
+    ) -> Optional[Tuple[List[FinancialData], int, Dict]]:
+        """
+        (results, confidence, report) for a recognized return, or None.
+        The report names the form, year, and the line each figure came from.
+        """
+        detected = detect_form(page_texts)
+        if detected is None:
+            return None
+        template, first_page = detected
+
+        try:
+            import pypdf
+        except ImportError:
+            raise ImportError("pypdf not installed. Run: pip install pypdf")
+        reader = pypdf.PdfReader(str(pdf_path))
+
+        # Each section is looked for from the form's first page on (attachments follow the form)
+        sections: Dict[str, SectionLines] = {}
+        pages: Dict[str, int] = {}
+        for name, section in template.sections.items():
+            for index in range(first_page, len(page_texts)):
+                if not all(marker in page_texts[index] for marker in section.page):
+                    continue
+                page = reader.pages[index]
+                lines = read_section(positioned_runs(page), float(page.mediabox.width), section.heading, section.columns)
+                if lines is not None:
+                    sections[name] = lines
+                    pages[name] = index + 1
+                    break
+
+        # Farm partnership: no gross receipts on the form itself, the P&L is Schedule F
+        fields = dict(template.fields)
+        main = sections.get("main")
+        farm = bool(template.farm_fields) and "sch_f" in sections and (
+            main is None or (main.value("1a") is None and main.value("1c") is None)
+        )
+        if farm:
+            fields.update(template.farm_fields)
+
+        data = FinancialData(year=tax_year(page_texts[first_page], template.form))
+        sources = {}
+        for name in FINANCIAL_FIELDS:
+            for rank, ref in enumerate(fields.get(name, [])):
+                result = self._read(ref, sections.get(ref.section), template.form)
+                if result is not None:
+                    result.confidence = PRIMARY_CONFIDENCE if rank == 0 else FALLBACK_CONFIDENCE
+                    setattr(data, name, result)
+                    sources[name] = result.source_line
+                    break
+
+        if not sources:
+            return None
+
+        # Total assets must equal total liabilities and capital; if not, the columns were misread
+        assets, total = (self._read(ref, sections.get(ref.section), template.form) for ref in template.balance_check)
+        balanced = None
+        if assets is not None and total is not None:
+            balanced = abs(assets.value - total.value) <= 1
+            if not balanced:
+                for name in FINANCIAL_FIELDS:
+                    result = getattr(data, name)
+                    if result.value is not None and "Schedule L" in result.source_line:
+                        result.confidence = min(result.confidence, UNBALANCED_CONFIDENCE)
+
+        report = {
+            "form": template.form, "year": data.year, "farm": farm,
+            "pages": pages, "lines": sources, "balance_sheet_ties": balanced,
+        }
+        return [data], data.overall_confidence(), report
+
+    def _read(self, ref: LineRef, lines: Optional[SectionLines], form: str) -> Optional[ExtractionResult]:
+        """
+        A line's value. On Schedule L a present but blank line reads as 0
+        (the balance sheet was filled in; that line just has nothing), as does
+        a blank part of a sum; elsewhere a blank line is left to the next
+        alternative.
+        """
+        if lines is None or not any(lines.has(line) for line in ref.lines):
+            return None
+        found = [run for run in (lines.value(line) for line in ref.lines) if run is not None]
+        if not found and not lines.filled:
+            return None
+        values = [_parse_amount(run.text) for run in found]
+        if any(v is None for v in values):
+            return None
+        return ExtractionResult(
+            value=sum(values, 0.0),
+            raw_text=" + ".join(run.text for run in found),
+            source_line=ref.describe(form),
+        )
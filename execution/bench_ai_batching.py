@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+AI Page Batching Comparison
+===========================
+Runs the AI vision path over the same PDF in single-page mode and in
+multi-page (packed) mode, and compares cost and latency per document.
+
+By default it runs against the local fake server (execution/fake_ai_server.py):
+no key, no spend, and without a PDF it uses stub pages. Costs are then what
+the fake server's token counts would have cost. --live sends the pages to the
+OpenAI API instead (needs a key in config or OPENAI_API_KEY - this spends money).
+
+Usage:
+    python execution/bench_ai_batching.py --pages 6
+    python execution/bench_ai_batching.py file.pdf --pages-per-request 2 4 --runs 3
+    python execution/bench_ai_batching.py "Sample Data/2024 YE BS and PnL.pdf" --live
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import get_config
+from engines.ai_backends import get_backend
+from engines.ai_engine import AIEngine
+from utils.pdf_parser import convert_pdf_to_images
+
+
+def run_mode(api_key: str, image_paths, pages_per_request: int, runs: int, base_url: str = ""):
+    # A fresh backend per mode; the fake server answers packed requests page by page too
+    backend = get_backend("openai_compatible", "fake", base_url) if base_url else None
+    engine = AIEngine(api_key, pages_per_request=pages_per_request, backend=backend)
+    batches = engine.plan_page_batches(image_paths)
+    costs, latencies, confidence = [], [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        _, confidence, cost = engine.extract_from_pdf_pages(image_paths)
+        latencies.append(time.perf_counter() - start)
+        costs.append(cost)
+    return {
+        "pages_per_request": pages_per_request,
+        "requests": len(batches),
+        "cost": sum(costs) / runs,
+        "latency": sum(latencies) / runs,
+        "confidence": confidence,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-page vs packed AI requests")
+    parser.add_argument("pdf", nargs="?", help="PDF to analyze (fake mode: optional, stub pages otherwise)")
+    parser.add_argument("--pages-per-request", type=int, nargs="+", default=[2])
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--pages", type=int, default=4, help="Stub pages when no PDF is given (fake mode)")
+    parser.add_argument("--latency", default="lognormal:0.3,0.4", help="Fake server latency model")
+    parser.add_argument("--live", action="store_true", help="Use the OpenAI API (spends money)")
+    args = parser.parse_args()
+
+    server, base_url = None, ""
+    if args.live:
+        api_key = os.environ.get("OPENAI_API_KEY") or get_config().openai_api_key
+        if not api_key:
+            print("❌ No OpenAI API key configured.")
+            sys.exit(1)
+        if not args.pdf:
+            print("❌ --live needs a PDF.")
+            sys.exit(1)
+    else:
+        from fake_ai_server import start_in_thread
+        from load_test_ai import write_fake_pages
+        server, base_url = start_in_thread(latency=args.latency)
+        api_key = "fake"
+
+    with tempfile.TemporaryDirectory(prefix="tma_bench_") as work_dir:
+        if args.pdf:
+            image_paths = convert_pdf_to_images(Path(args.pdf), output_dir=Path(work_dir))
+        else:
+            image_paths = write_fake_pages(Path(work_dir), 1, args.pages)[0]
+        print(f"⏳ {len(image_paths)} page(s), {args.runs} run(s) per mode -> {'OpenAI API' if args.live else base_url}")
+
+        rows = [run_mode(api_key, image_paths, n, args.runs, base_url) for n in [1] + args.pages_per_request]
+    if server is not None:
+        server.shutdown()
+    baseline = rows[0]
+    print(f"\n{'pages/req':>10}{'requests':>10}{'cost/doc':>12}{'latency/doc':>14}{'conf':>6}  vs single-page")
+    for row in rows:
+        cost_delta = (row["cost"] / baseline["cost"] - 1) if baseline["cost"] else 0.0
+        latency_delta = (row["latency"] / baseline["latency"] - 1) if baseline["latency"] else 0.0
+        print(f"{row['pages_per_request']:>10}{row['requests']:>10}{row['cost']:>12.5f}"
+              f"{row['latency']:>13.2f}s{row['confidence']:>6}"
+              f"  cost {cost_delta:+.0%}, latency {latency_delta:+.0%}")
+
+
+if __name__ == "__main__":
+    main()
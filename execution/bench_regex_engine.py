@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Regex Engine Scaling Benchmark
+==============================
+Builds synthetic QuickBooks-style statement texts (1KB to 50MB), including
+adversarial inputs, and measures RegexEngine throughput and worst-case time
+per pattern. Exits non-zero if any pattern scales superlinearly.
+
+Corpus kinds:
+    statement   - realistic Balance Sheet / P&L lines
+    digits      - labels followed by very long digit/comma runs
+    years       - dense repeated year tokens ("2024 2023 FY2022 ...")
+    whitespace  - labels followed by huge whitespace blocks
+
+Usage:
+    python execution/bench_regex_engine.py
+    python execution/bench_regex_engine.py --max-size 5MB --json bench.json
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engines.regex_engine import RegexEngine, YearIndex, COMPILED_PATTERNS
+
+KB = 1024
+MB = 1024 * KB
+DEFAULT_SIZES = [1 * KB, 16 * KB, 256 * KB, 1 * MB, 8 * MB, 50 * MB]
+KINDS = ["statement", "digits", "years", "whitespace"]
+NOISE_FLOOR_S = 0.005  # timings below this are too noisy to fit a slope
+
+# Pre-index implementation of _find_year_section, kept for comparison only
+LEGACY_YEAR_SECTION = r'{year}[\s\S]{{100,2000}}?(?=20\d{{2}}|$)'
+
+STATEMENT_LINES = [
+    "Bank Accounts {amt}",
+    "Accounts Receivable {amt}",
+    "Total Current Assets ${amt}",
+    "Fixed Assets {amt}",
+    "TOTAL ASSETS ${amt}",
+    "Accounts Payable {amt}",
+    "Long-Term Liabilities {amt}",
+    "Total Liabilities ${amt}",
+    "4000 Services {amt}",
+    "Total Income ${amt}",
+    "GROSS PROFIT ${amt}",
+    "5415 Interest Paid {amt}",
+    "Depreciation Expense {amt}",
+    "Net Income ${amt}",
+    "Notes Payable {amt}",
+]
+
+LABELS = ["Total Income $", "net income ", "depreciation ", "total assets ",
+          "assets, total ", "total liabilities ", "long-term debt ", "notes payable "]
+
+
+def parse_size(value: str) -> int:
+    """Parse '512KB' / '5MB' / '1024' into bytes."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*(KB|MB)?', value.strip(), re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Bad size: {value}")
+    unit = {"KB": KB, "MB": MB}.get((match.group(2) or "").upper(), 1)
+    return int(float(match.group(1)) * unit)
+
+
+def _amount(rng: random.Random) -> str:
+    return f"{rng.randint(0, 20_000_000):,}.{rng.randint(0, 99):02d}"
+
+
+def generate_text(kind: str, size: int, seed: int = 0) -> str:
+    """Build a synthetic statement text of roughly `size` characters."""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        if kind == "statement":
+            year = rng.choice([2022, 2023, 2024])
+            block = [
+                "KerTec, LLC",
+                "Balance Sheet Summary" if rng.random() < 0.5 else "Profit and Loss",
+                f"As of December 31, {year}",
+                "Accrual Basis  Monday, June 16, 2025 04:03 PM GMT-05:00   1/1",
+            ]
+            block += [rng.choice(STATEMENT_LINES).format(amt=_amount(rng)) for _ in range(30)]
+            chunk = "\n".join(block) + "\n"
+        elif kind == "digits":
+            run = "".join(rng.choice("0123456789,") for _ in range(rng.randint(1_000, 20_000)))
+            chunk = rng.choice(LABELS) + run + "\n"
+        elif kind == "years":
+            chunk = " ".join(rng.choice(["2024", "2023", "FY2022", "As of 2021", "Year Ended 2020"])
+                             for _ in range(200)) + "\n"
+        elif kind == "whitespace":
+            chunk = rng.choice(LABELS).strip() + " " * rng.randint(1_000, 50_000) + "x\n"
+        else:
+            raise ValueError(f"Unknown corpus kind: {kind}")
+        parts.append(chunk)
+        total += len(chunk)
+    return "".join(parts)[:size]
+
+
+def _best_time(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _exhaust(pattern):
+    # finditer visits every start position: the worst case for a pattern
+    return lambda text: sum(1 for _ in pattern.finditer(text))
+
+
+def scaling_exponent(points):
+    """Least-squares slope of log(time) vs log(size); ~1.0 means linear."""
+    points = [(s, t) for s, t in points if t > NOISE_FLOOR_S]
+    if len(points) < 2:
+        return None
+    xs = [math.log(s) for s, _ in points]
+    ys = [math.log(t) for _, t in points]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mx) ** 2 for x in xs)
+    if var == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+
+
+def run_benchmark(sizes, kinds, repeats=3, max_exponent=1.5):
+    engine = RegexEngine()
+    probes = {
+        f"{field}[{i}]": _exhaust(p)
+        for field, patterns in COMPILED_PATTERNS.items()
+        for i, p in enumerate(patterns)
+    }
+    probes["year_index"] = lambda text: YearIndex(text)
+    legacy = re.compile(LEGACY_YEAR_SECTION.format(year=2024))
+
+    report = {"sizes": sizes, "kinds": {}, "failures": []}
+    for kind in kinds:
+        timings = {name: [] for name in probes}
+        timings["legacy_year_section"] = []
+        throughput = []
+        for size in sizes:
+            text = generate_text(kind, size)
+            extract_s = _best_time(lambda: engine.extract(text), repeats)
+            throughput.append({"size": size, "seconds": extract_s, "mb_per_sec": size / MB / extract_s})
+            for name, probe in probes.items():
+                timings[name].append((size, _best_time(lambda: probe(text), repeats)))
+            timings["legacy_year_section"].append((size, _best_time(lambda: _exhaust(legacy)(text), 1)))
+            print(f"  {kind:<11} {size / KB:>10.0f}KB  extract {extract_s * 1000:9.1f}ms  "
+                  f"{size / MB / extract_s:8.1f} MB/s", flush=True)
+
+        patterns = {}
+        for name, points in timings.items():
+            exponent = scaling_exponent(points)
+            worst_size, worst_s = max(points, key=lambda p: p[1])
+            patterns[name] = {"worst_seconds": worst_s, "worst_size": worst_size, "exponent": exponent}
+            # The legacy pattern is reported for comparison but no longer gates
+            if name != "legacy_year_section" and exponent is not None and exponent > max_exponent:
+                report["failures"].append(f"{kind}/{name}: exponent {exponent:.2f}")
+        extract_exp = scaling_exponent([(t["size"], t["seconds"]) for t in throughput])
+        if extract_exp is not None and extract_exp > max_exponent:
+            report["failures"].append(f"{kind}/extract: exponent {extract_exp:.2f}")
+        report["kinds"][kind] = {"extract": throughput, "extract_exponent": extract_exp, "patterns": patterns}
+    return report
+
+
+def print_summary(report):
+    for kind, data in report["kinds"].items():
+        print(f"\n=== {kind} ===")
+        exp = data["extract_exponent"]
+        print(f"{'extract':<24} exponent {exp if exp is None else round(exp, 2)}")
+        worst = sorted(data["patterns"].items(), key=lambda kv: kv[1]["worst_seconds"], reverse=True)
+        for name, p in worst:
+            exp = p["exponent"]
+            print(f"{name:<24} worst {p['worst_seconds'] * 1000:9.1f}ms @ {p['worst_size'] / KB:>8.0f}KB  "
+                  f"exponent {'n/a' if exp is None else f'{exp:.2f}'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RegexEngine scaling benchmark")
+    parser.add_argument("--max-size", type=parse_size, default=50 * MB, help="Largest corpus size (default 50MB)")
+    parser.add_argument("--kinds", nargs="+", default=KINDS, choices=KINDS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-exponent", type=float, default=1.5,
+                        help="Fail if time grows faster than size**N (default 1.5; backtracking blowups show >= 2)")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    sizes = [s for s in DEFAULT_SIZES if s <= args.max_size]
+    print(f"⏳ Benchmarking sizes: {', '.join(f'{s / KB:.0f}KB' for s in sizes)}")
+    report = run_benchmark(sizes, args.kinds, args.repeats, args.max_exponent)
+    print_summary(report)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+    if report["failures"]:
+        print("\n❌ Superlinear scaling detected:")
+        for failure in report["failures"]:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n✅ All patterns scale linearly.")
+
+
+if __name__ == "__main__":
+    main()
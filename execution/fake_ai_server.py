@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI-Compatible Vision Server
+====================================
+Local stand-in for the chat completions API so the AI path can be
+benchmarked and load-tested offline, without a key or spend. Returns
+canned (or fixture) extraction JSON shaped like the real responses, with
+configurable latency, error rate and 429s. Also implements the files and
+batches endpoints, so bulk (Batch API) runs can be tested end to end.
+
+Point the app at it with config `ai_backend: "fake"` (default URL
+http://127.0.0.1:8765/v1) or `ai_backend: "openai_compatible"` + `ai_base_url`.
+
+Latency specs:
+    fixed:0.5            - always 0.5s
+    uniform:0.2,1.5      - uniform between 0.2s and 1.5s
+    lognormal:1.0,0.5    - median 1.0s, sigma 0.5 (long right tail, like the real API)
+
+Usage:
+    python execution/fake_ai_server.py
+    python execution/fake_ai_server.py --latency lognormal:2,0.6 --error-rate 0.02 --rate-429 0.05
+    python execution/fake_ai_server.py --fixtures responses.json --max-inflight 8
+    python execution/fake_ai_server.py --batch-delay 30     # batches finish after ~30s
+"""
+
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engines.regex_engine import FINANCIAL_FIELDS
+
+DEFAULT_PORT = 8765
+IMAGE_TOKENS = 765  # high-detail letter page, after resizing to 768px short side
+
+
+def parse_latency(spec: str):
+    """Turn a latency spec into a zero-argument sampler (seconds)."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        median, sigma = values
+        return lambda: random.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+    raise ValueError(f"Bad latency spec: {spec} (fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA)")
+
+
+def canned_years(fields: List[str], years=(2024, 2023, 2022)) -> List[Dict]:
+    """Plausible, deterministic values for every requested field."""
+    base = {"revenue": 1_250_000, "net_income": 98_000, "depreciation": 21_500,
+            "assets": 840_000, "liabilities": 415_000, "total_cpltd": 36_000}
+    rows = []
+    for offset, year in enumerate(years):
+        row = {"year": year}
+        for name in fields:
+            row[name] = round(base.get(name, 10_000) * (1 - 0.08 * offset), 2)
+        rows.append(row)
+    return rows
+
+
+class FakeAIState:
+    """Behaviour knobs plus counters shared by all handler threads."""
+
+    def __init__(
+        self,
+        latency: str = "lognormal:1.0,0.4",
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: float = 1.0,
+        max_inflight: int = 0,
+        fixtures: Optional[List] = None,
+        confidence: int = 92,
+        seed: Optional[int] = None,
+        batch_delay: float = 2.0
+    ):
+        if seed is not None:
+            random.seed(seed)
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.max_inflight = max_inflight  # 0 = unlimited; above it requests get 429
+        self.fixtures = itertools.cycle(fixtures) if fixtures else None
+        self.confidence = confidence
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0,
+                      "peak_inflight": 0, "images": 0, "batches": 0}
+        # Batch API: uploaded files and batches, in memory only
+        self.batch_delay = batch_delay  # seconds a batch spends "in_progress"
+        self.files: Dict[str, Dict] = {}
+        self.batches: Dict[str, Dict] = {}
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.stats[key] += n
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> str:
+        file_id = f"file-fake-{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.files[file_id] = {"content": content, "meta": {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed",
+            }}
+        return file_id
+
+    def start_batch(self, input_file_id: str, body: Dict) -> Dict:
+        batch_id = f"batch_fake_{uuid.uuid4().hex[:12]}"
+        now = int(time.time())
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint", "/v1/chat/completions"),
+            "errors": None, "input_file_id": input_file_id,
+            "completion_window": body.get("completion_window", "24h"), "status": "validating",
+            "output_file_id": None, "error_file_id": None, "created_at": now,
+            "in_progress_at": None, "expires_at": now + 86400, "completed_at": None,
+            "failed_at": None, "expired_at": None, "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": body.get("metadata"),
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+            self.stats["batches"] += 1
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return dict(batch)
+
+    def _run_batch(self, batch_id: str):
+        """Answer every line of the input file, then publish output/error files."""
+        batch = self.batches[batch_id]
+        lines = [json.loads(l) for l in self.files[batch["input_file_id"]]["content"].splitlines() if l.strip()]
+        with self.lock:
+            batch["status"] = "in_progress"
+            batch["in_progress_at"] = int(time.time())
+            batch["request_counts"]["total"] = len(lines)
+
+        outputs, errors = [], []
+        for i, request in enumerate(lines):
+            time.sleep(self.batch_delay / max(len(lines), 1))
+            if batch["status"] == "cancelling":
+                break
+            if random.random() < self.error_rate:
+                errors.append({"id": f"batch_req_{i}", "custom_id": request["custom_id"], "response": {
+                    "status_code": 500, "request_id": "", "body": {"error": {"message": "Simulated server error"}}
+                }, "error": None})
+                with self.lock:
+                    batch["request_counts"]["failed"] += 1
+                continue
+            outputs.append({"id": f"batch_req_{i}", "custom_id": request["custom_id"], "response": {
+                "status_code": 200, "request_id": "", "body": completion_body(self, request.get("body", {}))
+            }, "error": None})
+            with self.lock:
+                batch["request_counts"]["completed"] += 1
+
+        def publish(records: List[Dict], suffix: str) -> Optional[str]:
+            if not records:
+                return None
+            content = "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+            return self.add_file(content, f"{batch_id}_{suffix}.jsonl", "batch_output")
+
+        output_file_id, error_file_id = publish(outputs, "output"), publish(errors, "error")
+        with self.lock:
+            batch["output_file_id"] = output_file_id
+            batch["error_file_id"] = error_file_id
+            if batch["status"] == "cancelling":
+                batch["status"], batch["cancelled_at"] = "cancelled", int(time.time())
+            else:
+                batch["status"], batch["completed_at"] = "completed", int(time.time())
+
+    def next_fixture(self) -> Optional[Dict]:
+        if self.fixtures is None:
+            return None
+        with self.lock:
+            return next(self.fixtures)
+
+
+def _schema_shape(body: Dict):
+    """(multi_page, fields) requested by the response_format schema, if any."""
+    schema = (body.get("response_format") or {}).get("json_schema", {}).get("schema", {})
+    properties = schema.get("properties", {})
+    multi_page = "pages" in properties
+    if multi_page:
+        properties = properties["pages"]["items"]["properties"]
+    year_properties = properties.get("years", {}).get("items", {}).get("properties", {})
+    fields = [name for name in year_properties if name != "year"] or list(FINANCIAL_FIELDS)
+    return multi_page, fields
+
+
+def count_inputs(body: Dict):
+    """(text characters, image parts) across the request messages."""
+    text_chars, images = 0, 0
+    for message in body.get("messages", []):
+        parts = message.get("content")
+        if isinstance(parts, str):
+            text_chars += len(parts)
+            continue
+        for part in parts or []:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                text_chars += len(part.get("text", ""))
+    return text_chars, images
+
+
+def completion_body(state: FakeAIState, body: Dict) -> Dict:
+    """A chat.completion response for a request body."""
+    text_chars, images = count_inputs(body)
+    state.count("images", images)
+    content = build_content(state, body, images)
+    prompt_tokens = text_chars // 4 + images * IMAGE_TOKENS
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-fake-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def build_content(state: FakeAIState, body: Dict, images: int) -> str:
+    multi_page, fields = _schema_shape(body)
+    page = state.next_fixture() or {
+        "years": canned_years(fields),
+        "confidence": state.confidence,
+        "notes": "fake server",
+    }
+    if multi_page or images > 1:
+        return json.dumps({"pages": [dict(page, page=i + 1) for i in range(max(images, 1))]})
+    return json.dumps(page)
+
+
+class FakeAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeAI/1.0"
+    state: FakeAIState = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass  # keep load-test output readable
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str, kind: str, headers: Optional[Dict] = None):
+        self._send_json(status, {"error": {"message": message, "type": kind, "code": None}}, headers)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _route(self) -> List[str]:
+        """Path segments after the /v1 prefix, e.g. ["batches", "batch_abc"]."""
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        return parts[1:] if parts and parts[0] == "v1" else parts
+
+    def do_GET(self):
+        route = self._route()
+        state = self.state
+        if route == ["stats"]:
+            with state.lock:
+                self._send_json(200, dict(state.stats, inflight=state.inflight))
+        elif len(route) >= 2 and route[0] == "files" and route[1] in state.files:
+            stored = state.files[route[1]]
+            if route[2:] == ["content"]:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(stored["content"])))
+                self.end_headers()
+                self.wfile.write(stored["content"])
+            else:
+                self._send_json(200, stored["meta"])
+        elif route == ["batches"]:
+            with state.lock:
+                batches = sorted(state.batches.values(), key=lambda b: b["created_at"], reverse=True)
+                self._send_json(200, {"object": "list", "data": [dict(b) for b in batches], "has_more": False})
+        elif len(route) == 2 and route[0] == "batches" and route[1] in state.batches:
+            with state.lock:
+                self._send_json(200, dict(state.batches[route[1]]))
+        else:
+            self._error(404, f"Unknown path: {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        route = self._route()
+        if route == ["chat", "completions"]:
+            self.chat_completion()
+        elif route == ["files"]:
+            self.upload_file()
+        elif route == ["batches"]:
+            self.create_batch()
+        elif len(route) == 3 and route[0] == "batches" and route[2] == "cancel" and route[1] in self.state.batches:
+            with self.state.lock:
+                batch = self.state.batches[route[1]]
+                if batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+                    batch["status"] = "cancelling"
+                self._send_json(200, dict(batch))
+        else:
+            self._error(404, f"Unknown path: {self.path}", "invalid_request_error")
+
+    def upload_file(self):
+        """multipart/form-data upload with `file` and `purpose` fields."""
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode() + raw
+        )
+        fields, filename, content = {}, "upload.jsonl", b""
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                filename = part.get_filename() or filename
+                content = part.get_payload(decode=True) or b""
+            elif name:
+                fields[name] = part.get_content().strip()
+        file_id = self.state.add_file(content, filename, fields.get("purpose", "batch"))
+        self._send_json(200, self.state.files[file_id]["meta"])
+
+    def create_batch(self):
+        body = self._read_json()
+        input_file_id = body.get("input_file_id")
+        if input_file_id not in self.state.files:
+            self._error(404, f"No such file: {input_file_id}", "invalid_request_error")
+            return
+        self._send_json(200, self.state.start_batch(input_file_id, body))
+
+    def chat_completion(self):
+        state = self.state
+        state.count("requests")
+        try:
+            body = self._read_json()
+        except json.JSONDecodeError:
+            self._error(400, "Body is not valid JSON", "invalid_request_error")
+            return
+
+        with state.lock:
+            state.inflight += 1
+            state.stats["peak_inflight"] = max(state.stats["peak_inflight"], state.inflight)
+            over_limit = state.max_inflight and state.inflight > state.max_inflight
+        try:
+            if over_limit or random.random() < state.rate_429:
+                state.count("throttled")
+                self._error(429, "Rate limit reached (fake server)", "rate_limit_exceeded",
+                            {"retry-after": f"{state.retry_after:g}"})
+                return
+
+            time.sleep(state.sample_latency())
+            if random.random() < state.error_rate:
+                state.count("errors")
+                self._error(500, "Simulated server error", "server_error")
+                return
+
+            response = completion_body(state, body)
+            state.count("ok")
+            self._send_json(200, response)
+        finally:
+            with state.lock:
+                state.inflight -= 1
+
+
+def make_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, **options) -> ThreadingHTTPServer:
+    """Build (but don't start) a server; port 0 picks a free port."""
+    handler = type("BoundFakeAIHandler", (FakeAIHandler,), {"state": FakeAIState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0, **options):
+    """Run a server in a background thread. Returns (server, base_url)."""
+    server = make_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def load_fixtures(path: str) -> List[Dict]:
+    """A JSON list of page responses ({"years": [...], "confidence": N}), used round-robin."""
+    data = json.loads(Path(path).read_text())
+    return data if isinstance(data, list) else [data]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible vision server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", default="lognormal:1.0,0.4", help="fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--max-inflight", type=int, default=0, help="429 above this many concurrent requests (0 = off)")
+    parser.add_argument("--fixtures", help="JSON file of canned page responses")
+    parser.add_argument("--confidence", type=int, default=92)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="Seconds each Batch API job takes")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        max_inflight=args.max_inflight,
+        fixtures=load_fixtures(args.fixtures) if args.fixtures else None,
+        confidence=args.confidence,
+        seed=args.seed,
+        batch_delay=args.batch_delay
+    )
+    print(f"🧪 Fake AI server on http://{args.host}:{server.server_address[1]}/v1 (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
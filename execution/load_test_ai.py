@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+AI Path Load Test
+=================
+Drives AIEngine end to end (concurrency, rate limiter, retries, packing)
+against the fake vision server and reports throughput and latency. Runs
+on a laptop with no key and no network; by default it starts its own
+server in-process.
+
+Usage:
+    python execution/load_test_ai.py
+    python execution/load_test_ai.py --docs 200 --pages 6 --jobs 8 --latency lognormal:2,0.6 --rate-429 0.05
+    python execution/load_test_ai.py --base-url http://127.0.0.1:8765/v1   # external server
+"""
+
+import argparse
+import json
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engines.ai_backends import get_backend
+from engines.ai_engine import AIEngine
+from engines.rate_limiter import TokenBucketLimiter
+from fake_ai_server import start_in_thread
+
+
+def write_fake_pages(directory: Path, docs: int, pages: int):
+    """Tiny PNG stubs with letter-page dimensions in the header (all the engine reads)."""
+    header = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 1275, 1650) + b"\x08\x02\x00\x00\x00"
+    documents = []
+    for d in range(docs):
+        paths = []
+        for p in range(pages):
+            path = directory / f"doc{d}_page{p}.png"
+            path.write_bytes(header + f"{d}/{p}".encode())
+            paths.append(path)
+        documents.append(paths)
+    return documents
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_load_test(args, base_url: str, work_dir: Path) -> dict:
+    documents = write_fake_pages(work_dir, args.docs, args.pages)
+    limiter = TokenBucketLimiter(
+        state_path=work_dir / "rate_limit.json",
+        requests_per_min=args.requests_per_min,
+        tokens_per_min=args.tokens_per_min
+    )
+
+    def one_document(image_paths):
+        engine = AIEngine(
+            "fake",
+            max_concurrency=args.page_concurrency,
+            pages_per_request=args.pages_per_request,
+            rate_limiter=limiter,
+            max_retries=args.max_retries,
+            model=args.model,
+            backend=get_backend("openai_compatible", "fake", base_url)
+        )
+        start = time.perf_counter()
+        _, confidence, cost = engine.extract_from_pdf_pages(image_paths)
+        return time.perf_counter() - start, cost, engine.stats
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        outcomes = list(pool.map(one_document, documents))
+    wall = time.perf_counter() - start
+
+    latencies = [latency for latency, _, _ in outcomes]
+    return {
+        "docs": args.docs,
+        "pages": args.docs * args.pages,
+        "wall_seconds": wall,
+        "docs_per_sec": args.docs / wall,
+        "pages_per_sec": args.docs * args.pages / wall,
+        "doc_latency_p50": statistics.median(latencies),
+        "doc_latency_p95": percentile(latencies, 95),
+        "doc_latency_max": max(latencies),
+        "calls": sum(stats["calls"] for _, _, stats in outcomes),
+        "retries": sum(stats["retries"] for _, _, stats in outcomes),
+        "failed_pages": sum(len(stats["failed_pages"]) for _, _, stats in outcomes),
+        "cost_if_real": sum(cost for _, cost, _ in outcomes),
+    }
+
+
+def server_stats(base_url: str) -> dict:
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/stats", timeout=5) as response:
+            return json.loads(response.read())
+    except OSError:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the AI path against the fake server")
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=4, help="Pages per document")
+    parser.add_argument("--jobs", type=int, default=4, help="Documents processed concurrently")
+    parser.add_argument("--page-concurrency", type=int, default=4, help="AIEngine max_concurrency per document")
+    parser.add_argument("--pages-per-request", type=int, default=1)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--requests-per-min", type=int, default=5000)
+    parser.add_argument("--tokens-per-min", type=int, default=2_000_000)
+    parser.add_argument("--base-url", help="Use an already-running server instead of starting one")
+    parser.add_argument("--latency", default="lognormal:0.3,0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--max-inflight", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = start_in_thread(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            rate_429=args.rate_429,
+            retry_after=args.retry_after,
+            max_inflight=args.max_inflight
+        )
+
+    print(f"⏳ {args.docs} docs x {args.pages} pages, {args.jobs} concurrent docs -> {base_url}")
+    with tempfile.TemporaryDirectory(prefix="tma_load_") as work_dir:
+        report = run_load_test(args, base_url, Path(work_dir))
+    report["server"] = server_stats(base_url)
+    if server is not None:
+        server.shutdown()
+
+    print(f"\nWall time        {report['wall_seconds']:.2f}s")
+    print(f"Throughput       {report['docs_per_sec']:.2f} docs/s, {report['pages_per_sec']:.2f} pages/s")
+    print(f"Doc latency      p50 {report['doc_latency_p50']:.2f}s  p95 {report['doc_latency_p95']:.2f}s  "
+          f"max {report['doc_latency_max']:.2f}s")
+    print(f"Requests         {report['calls']} ok, {report['retries']} retries, {report['failed_pages']} failed pages")
+    print(f"Cost if real     ${report['cost_if_real']:.4f}")
+    if report["server"]:
+        s = report["server"]
+        print(f"Server           {s['requests']} requests, {s['throttled']} throttled, {s['errors']} errors, "
+              f"peak in-flight {s['peak_inflight']}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if report["failed_pages"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
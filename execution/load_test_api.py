@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+HTTP API Load Test
+==================
+Starts api_server.py on a private port with an isolated config and temp
+dir (regex-only, so no AI spend), then runs two phases:
+
+    jobs    - C clients loop: upload a sample file, long-poll until done,
+              fetch the result. Reports jobs/sec end to end and HTTP req/sec.
+    status  - C clients hammer GET /v1/jobs/{id} on a finished job.
+              Reports the API's own sustained req/sec and latency.
+
+Jobs run on the real queue and backend_processor workers, so the jobs
+phase is bounded by --workers; the status phase measures the server alone.
+
+Requires: pip install aiohttp
+
+Usage:
+    python execution/load_test_api.py --clients 16 --seconds 20 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+try:
+    import aiohttp
+except ImportError:
+    raise ImportError("aiohttp not installed. Run: pip install aiohttp")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/healthz", timeout=2) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("API server did not become healthy")
+
+
+def isolated_env(workers: int) -> dict:
+    """HOME and TMPDIR of our own: separate config, queue and status files."""
+    base = Path(tempfile.mkdtemp(prefix="tma_api_load_"))
+    home, tmp = base / "home", base / "tmp"
+    tmp.mkdir(parents=True)
+    for config_dir in (home / ".config" / "tma_magic", home / ".tma_magic",
+                       home / "AppData" / "Roaming" / "TMA Magic"):
+        config_dir.mkdir(parents=True, exist_ok=True)
+        (config_dir / "config.json").write_text(json.dumps({
+            "extraction_mode": "regex_only",
+            "queue_max_concurrent": workers,
+            "result_store_enabled": False,
+        }))
+    return dict(os.environ, HOME=str(home), TMPDIR=str(tmp), TEMP=str(tmp), TMP=str(tmp),
+                APPDATA=str(home / "AppData" / "Roaming"))
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_job(session: aiohttp.ClientSession, base_url: str, sample: Path, stats: dict):
+    start = time.perf_counter()
+    form = aiohttp.FormData()
+    form.add_field("file", sample.read_bytes(), filename=sample.name)
+    async with session.post(f"{base_url}/v1/jobs", data=form) as r:
+        body = await r.json()
+    stats["requests"] += 1
+    stats["submit_latency"].append(time.perf_counter() - start)
+    job_id = body["job_id"]
+
+    version = ""
+    while True:
+        async with session.get(f"{base_url}/v1/jobs/{job_id}", params={"wait": "30", "version": version}) as r:
+            status = await r.json()
+        stats["requests"] += 1
+        if status["state"] in ("complete", "error"):
+            break
+        version = str(status["version"] or "")
+
+    async with session.get(f"{base_url}/v1/jobs/{job_id}/result") as r:
+        await r.read()
+        ok = r.status == 200
+    stats["requests"] += 1
+    stats["jobs" if ok else "failed"] += 1
+    stats["job_latency"].append(time.perf_counter() - start)
+    return job_id
+
+
+async def phase_jobs(base_url: str, sample: Path, clients: int, seconds: float) -> dict:
+    stats = {"requests": 0, "jobs": 0, "failed": 0, "submit_latency": [], "job_latency": [], "last_job": None}
+    deadline = time.perf_counter() + seconds
+
+    async def client(session):
+        while time.perf_counter() < deadline:
+            stats["last_job"] = await run_job(session, base_url, sample, stats)
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+async def phase_status(base_url: str, job_id: str, clients: int, seconds: float) -> dict:
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def client(session):
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            async with session.get(f"{base_url}/v1/jobs/{job_id}") as r:
+                await r.read()
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+    return {"requests": len(latencies), "elapsed": time.perf_counter() - start, "latency": latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the headless HTTP API")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20.0, help="Duration of each phase")
+    parser.add_argument("--workers", type=int, default=4, help="queue_max_concurrent for the test")
+    parser.add_argument("--file", help="Sample file to upload (default: first Sample Data PDF)")
+    parser.add_argument("--json", help="Write the result to this file")
+    args = parser.parse_args()
+
+    sample = Path(args.file) if args.file else sorted((ROOT / "Sample Data 2").glob("*.pdf"))[0]
+    env = isolated_env(args.workers)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "api_server.py"), "--port", str(port)],
+        cwd=str(ROOT), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_healthy(base_url)
+        print(f"⏳ jobs phase: {args.clients} client(s), {args.workers} worker(s), {args.seconds:.0f}s, {sample.name}")
+        jobs = asyncio.run(phase_jobs(base_url, sample, args.clients, args.seconds))
+        print(f"⏳ status phase: {args.clients} client(s), {args.seconds:.0f}s")
+        status = asyncio.run(phase_status(base_url, jobs["last_job"], args.clients, args.seconds))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        shutil.rmtree(Path(env["HOME"]).parent, ignore_errors=True)
+
+    result = {
+        "jobs_per_sec": jobs["jobs"] / jobs["elapsed"],
+        "jobs_completed": jobs["jobs"],
+        "jobs_failed": jobs["failed"],
+        "job_requests_per_sec": jobs["requests"] / jobs["elapsed"],
+        "submit_p50_ms": 1000 * statistics.median(jobs["submit_latency"]),
+        "submit_p95_ms": 1000 * percentile(jobs["submit_latency"], 95),
+        "job_p50_s": statistics.median(jobs["job_latency"]),
+        "job_p95_s": percentile(jobs["job_latency"], 95),
+        "status_requests_per_sec": status["requests"] / status["elapsed"],
+        "status_p50_ms": 1000 * statistics.median(status["latency"]),
+        "status_p95_ms": 1000 * percentile(status["latency"], 95),
+    }
+    print(f"Jobs            {result['jobs_completed']} done, {result['jobs_failed']} failed, "
+          f"{result['jobs_per_sec']:.2f} jobs/sec (p50 {result['job_p50_s']:.2f}s, p95 {result['job_p95_s']:.2f}s)")
+    print(f"Submit latency  p50 {result['submit_p50_ms']:.1f}ms, p95 {result['submit_p95_ms']:.1f}ms")
+    print(f"Status          {result['status_requests_per_sec']:.0f} req/sec "
+          f"(p50 {result['status_p50_ms']:.1f}ms, p95 {result['status_p95_ms']:.1f}ms)")
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
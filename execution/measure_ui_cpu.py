@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Streamlit Server CPU per Active Session
+=======================================
+Starts the app on a private port with an isolated config (AI pointed at the
+fake server, slowed down so jobs stay in flight), opens N sessions that each
+run the same sample files, and samples the Streamlit server's CPU time while
+the jobs run. Backend workers are separate processes and are not counted.
+
+Two clients:
+  browser    headless Chromium tabs that upload the files (the real thing)
+  websocket  no browser: the files are queued up front and each session
+             reattaches to them through ?jobs=..., then speaks Streamlit's
+             websocket protocol the way the frontend does (the first run,
+             then every fragment timer the app asks for)
+
+Compare two versions of the UI by passing the older app file:
+    git show <rev>:app.py > /tmp/app_before.py
+    python execution/measure_ui_cpu.py --app /tmp/app_before.py
+    python execution/measure_ui_cpu.py
+
+Requires: pip install psutil, plus for the browser client
+pip install playwright && playwright install chromium
+
+Usage:
+    python execution/measure_ui_cpu.py --sessions 4 --seconds 60
+    python execution/measure_ui_cpu.py --client websocket --mode hybrid --latency 25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_ai_server import start_in_thread
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(port: int, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError("Streamlit server did not become healthy")
+
+
+def isolated_home(base_url: str) -> Path:
+    """HOME with a config that routes AI to the fake server (the real config is untouched)."""
+    home = Path(tempfile.mkdtemp(prefix="tma_ui_cpu_"))
+    for config_dir in (home / ".config" / "tma_magic", home / ".tma_magic",
+                       home / "AppData" / "Roaming" / "TMA Magic"):
+        config_dir.mkdir(parents=True, exist_ok=True)
+        (config_dir / "config.json").write_text(json.dumps({
+            "openai_api_key": "fake",
+            "extraction_mode": "ai_only",
+            "ai_backend": "openai_compatible",
+            "ai_base_url": base_url,
+            "ai_cache_enabled": False,
+        }))
+    return home
+
+
+def queue_session_jobs(files, sessions: int, mode: str, env: Dict) -> List[List[str]]:
+    """Queue every session's files as its own user, in the app's isolated environment."""
+    script = (
+        "import json, sys\n"
+        "from utils.job_queue import create_job\n"
+        "mode, sessions, files = sys.argv[1], int(sys.argv[2]), sys.argv[3:]\n"
+        "print(json.dumps([[create_job(f, mode, f'session{s}', api_key='fake') for f in files]"
+        " for s in range(sessions)]))"
+    )
+    out = subprocess.check_output([sys.executable, "-c", script, mode, str(sessions)] + [str(f) for f in files],
+                                  cwd=str(ROOT), env=env)
+    return json.loads(out)
+
+
+async def protocol_session(port: int, job_ids: List[str], ready: asyncio.Event, stop: asyncio.Event,
+                           runs: Dict[str, int]):
+    """One browser tab's traffic: the first run with ?jobs=..., then the fragment timers the app asks for."""
+    import aiohttp
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    query = "jobs=" + ",".join(job_ids)
+    page_hash = ""
+    timers: Dict[str, asyncio.Task] = {}
+
+    async with aiohttp.ClientSession() as http:
+        async with http.ws_connect(f"ws://127.0.0.1:{port}/_stcore/stream",
+                                   protocols=("streamlit",), max_msg_size=0) as ws:
+            async def rerun(fragment_id: str = ""):
+                msg = BackMsg()
+                msg.rerun_script.query_string = query
+                msg.rerun_script.page_script_hash = page_hash
+                if fragment_id:
+                    msg.rerun_script.fragment_id = fragment_id
+                    msg.rerun_script.is_auto_rerun = True
+                await ws.send_bytes(msg.SerializeToString())
+
+            async def tick(fragment_id: str, interval: float):
+                while True:
+                    await asyncio.sleep(interval)
+                    await rerun(fragment_id)
+
+            def stop_timers(fragment_ids):
+                for fragment_id in list(fragment_ids):
+                    if fragment_id in timers:
+                        timers.pop(fragment_id).cancel()
+
+            await rerun()
+            while not stop.is_set():
+                try:
+                    raw = await ws.receive(timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                if raw.type != aiohttp.WSMsgType.BINARY:
+                    break
+                msg = ForwardMsg()
+                msg.ParseFromString(raw.data)
+                kind = msg.WhichOneof("type")
+                if kind == "new_session":
+                    page_hash = msg.new_session.page_script_hash or page_hash
+                    if msg.new_session.fragment_ids_this_run:
+                        runs["fragment"] += 1
+                    else:
+                        # A full run redraws every fragment; their timers come back with it
+                        runs["full"] += 1
+                        stop_timers(timers)
+                elif kind == "auto_rerun":
+                    stop_timers([msg.auto_rerun.fragment_id])
+                    timers[msg.auto_rerun.fragment_id] = asyncio.create_task(
+                        tick(msg.auto_rerun.fragment_id, msg.auto_rerun.interval))
+                elif kind == "stop_auto_rerun":
+                    stop_timers(msg.stop_auto_rerun.fragment_ids)
+                elif kind == "script_finished":
+                    ready.set()
+            stop_timers(timers)
+
+
+def websocket_window(port: int, job_ids: List[List[str]], server_proc, seconds: float, sample_every: float):
+    runs = {"full": 0, "fragment": 0}
+
+    async def run():
+        stop = asyncio.Event()
+        ready = [asyncio.Event() for _ in job_ids]
+        tasks = [asyncio.create_task(protocol_session(port, ids, r, stop, runs)) for ids, r in zip(job_ids, ready)]
+        await asyncio.wait_for(asyncio.gather(*(r.wait() for r in ready)), 120)
+        await asyncio.sleep(3)  # let every session's first run settle
+        runs.update(full=0, fragment=0)
+        start_cpu = sum(server_proc.cpu_times()[:2])
+        start = time.time()
+        samples = []
+        while time.time() - start < seconds:
+            await asyncio.sleep(sample_every)
+            samples.append(server_proc.cpu_percent(interval=None))
+        cpu_seconds = sum(server_proc.cpu_times()[:2]) - start_cpu
+        wall = time.time() - start
+        stop.set()
+        await asyncio.gather(*tasks)
+        return cpu_seconds, wall, samples
+
+    cpu_seconds, wall, samples = asyncio.run(run())
+    return cpu_seconds, wall, samples, runs
+
+
+def browser_window(port: int, files, sessions: int, server_proc, seconds: float, sample_every: float):
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise ImportError("playwright not installed. Run: pip install playwright && playwright install chromium")
+
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch()
+        pages = []
+        for _ in range(sessions):
+            page = browser.new_page()
+            page.goto(f"http://127.0.0.1:{port}/")
+            page.wait_for_selector('input[type="file"]', state="attached", timeout=60_000)
+            page.set_input_files('input[type="file"]', [str(f) for f in files])
+            pages.append(page)
+
+        time.sleep(3)  # let uploads land and workers start
+        start_cpu = sum(server_proc.cpu_times()[:2])
+        start = time.time()
+        samples = []
+        while time.time() - start < seconds:
+            for page in pages:
+                page.wait_for_timeout(sample_every * 1000 / len(pages))  # keep each browser's timers serviced
+            samples.append(server_proc.cpu_percent(interval=None))
+        cpu_seconds = sum(server_proc.cpu_times()[:2]) - start_cpu
+        wall = time.time() - start
+        browser.close()
+    return cpu_seconds, wall, samples, None
+
+
+def measure(app_path: Path, files, sessions: int, seconds: float, sample_every: float,
+            client: str = "browser", mode: str = "ai_only", latency: float = 0.0) -> dict:
+    try:
+        import psutil
+    except ImportError:
+        raise ImportError("psutil not installed. Run: pip install psutil")
+
+    # Slow fake AI: every page takes ~seconds/2 by default, so jobs stay pending for the whole window
+    server, base_url = start_in_thread(latency=f"fixed:{latency or seconds / 2:g}")
+    home = isolated_home(base_url)
+    # Private temp dir too: job files and the shared queue live there
+    (home / "tmp").mkdir()
+    env = dict(os.environ, HOME=str(home), APPDATA=str(home / "AppData" / "Roaming"), TMPDIR=str(home / "tmp"))
+
+    # The app imports its siblings, so run a copy from the repo root
+    app_copy = ROOT / f".measure_app_{os.getpid()}.py"
+    shutil.copy(app_path, app_copy)
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(app_copy),
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        cwd=str(ROOT), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_healthy(port)
+        server_proc = psutil.Process(proc.pid)
+        if client == "websocket":
+            job_ids = queue_session_jobs(files, sessions, mode, env)
+            cpu_seconds, wall, samples, runs = websocket_window(port, job_ids, server_proc, seconds, sample_every)
+        else:
+            cpu_seconds, wall, samples, runs = browser_window(port, files, sessions, server_proc, seconds, sample_every)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        app_copy.unlink(missing_ok=True)
+        server.shutdown()
+        shutil.rmtree(home, ignore_errors=True)
+
+    result = {
+        "app": str(app_path),
+        "client": client,
+        "sessions": sessions,
+        "wall_seconds": wall,
+        "server_cpu_seconds": cpu_seconds,
+        "cpu_percent": 100 * cpu_seconds / wall,
+        "cpu_percent_per_session": 100 * cpu_seconds / wall / sessions,
+        "peak_sample_percent": max(samples, default=0.0),
+    }
+    if runs is not None:
+        result["script_runs"] = runs
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Streamlit server CPU per active session")
+    parser.add_argument("--app", default=str(ROOT / "app.py"), help="App file to measure (e.g. an older app.py)")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=60.0, help="Measurement window while jobs are running")
+    parser.add_argument("--sample-every", type=float, default=1.0)
+    parser.add_argument("--files", nargs="+", help="Files each session uploads (default: Sample Data PDFs)")
+    parser.add_argument("--client", choices=["browser", "websocket"], default="browser")
+    parser.add_argument("--mode", default="ai_only", help="Extraction mode of the queued jobs (websocket client)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake AI seconds per request (default: seconds/2)")
+    parser.add_argument("--json", help="Write the result to this file")
+    args = parser.parse_args()
+
+    files = [Path(f) for f in args.files] if args.files else sorted((ROOT / "Sample Data").glob("*.pdf"))[:4]
+    if not files:
+        print("❌ No files to upload.")
+        sys.exit(1)
+
+    print(f"⏳ {args.sessions} session(s) x {len(files)} file(s), {args.seconds:.0f}s window: {args.app}")
+    result = measure(Path(args.app), files, args.sessions, args.seconds, args.sample_every,
+                     client=args.client, mode=args.mode, latency=args.latency)
+    print(f"Server CPU      {result['server_cpu_seconds']:.2f}s over {result['wall_seconds']:.0f}s "
+          f"({result['cpu_percent']:.1f}% of a core)")
+    print(f"Per session     {result['cpu_percent_per_session']:.2f}% of a core")
+    if "script_runs" in result:
+        print(f"Script runs     {result['script_runs']['full']} full, {result['script_runs']['fragment']} fragment")
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
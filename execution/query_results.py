@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Query / Export the Columnar Result Store
+========================================
+Portfolio-level reads over every extraction recorded in the Parquet store
+(see utils/result_store.py). Only the requested columns and year
+partitions are read.
+
+Usage:
+    python execution/query_results.py --years 2023 --columns company revenue
+    python execution/query_results.py --export portfolio.parquet
+    python execution/query_results.py --export portfolio.csv --years 2022 2023
+    python execution/query_results.py --compact
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.result_store import ResultStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or export extracted financials")
+    parser.add_argument("--columns", nargs="+", help="Columns to load (default: all)")
+    parser.add_argument("--years", nargs="+", type=int, help="Only these fiscal years")
+    parser.add_argument("--companies", nargs="+", help="Only these companies")
+    parser.add_argument("--min-confidence", type=int, help="Drop rows below this confidence")
+    parser.add_argument("--all-versions", action="store_true", help="Keep every re-extraction, not just the latest")
+    parser.add_argument("--limit", type=int, default=50, help="Rows to print (query mode)")
+    parser.add_argument("--export", help="Write rows to a .parquet or .csv file instead of printing")
+    parser.add_argument("--compact", action="store_true", help="Merge small part files per year")
+    parser.add_argument("--store", help="Store directory (default: <config dir>/results)")
+    args = parser.parse_args()
+
+    store = ResultStore(Path(args.store) if args.store else None)
+
+    if args.compact:
+        print(f"Compacted {store.compact()} year partition(s)")
+        return
+
+    start = time.perf_counter()
+    if args.export:
+        dest = Path(args.export)
+        fmt = "csv" if dest.suffix.lower() == ".csv" else "parquet"
+        rows = store.export(dest, fmt, columns=args.columns, years=args.years)
+        elapsed = time.perf_counter() - start
+        size_mb = dest.stat().st_size / (1024 * 1024)
+        print(f"Exported {rows} row(s) to {dest} in {elapsed:.2f}s ({size_mb / max(elapsed, 1e-9):.1f} MB/s)")
+        return
+
+    table = store.query(
+        columns=args.columns,
+        years=args.years,
+        companies=args.companies,
+        min_confidence=args.min_confidence,
+        latest=not args.all_versions
+    )
+    elapsed = time.perf_counter() - start
+    for row in table.slice(0, args.limit).to_pylist():
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+    print(f"{table.num_rows} row(s) in {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
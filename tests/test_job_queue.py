@@ -0,0 +1,105 @@
+# Fair-share job queue tests
+"""
+Start order across users, the per-user cap (held only while others wait),
+snapshot estimates that follow the same caps, and daily budget reservations.
+Workers are not spawned: _spawn is replaced with one that records the order.
+
+Run: python -m pytest tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_config
+from utils.job_queue import JobQueue
+
+
+class RecordingQueue(JobQueue):
+    """Starts nothing; every "worker" is this (live) test process."""
+
+    def __init__(self, state_path: Path):
+        super().__init__(state_path)
+        self.started = []
+
+    def _spawn(self, job):
+        self.started.append(job["job_id"])
+        return os.getpid()
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))  # metrics file
+    config = get_config()._config
+    for key, value in {"queue_max_concurrent": 2, "queue_max_jobs_per_user": 1, "queue_user_weights": {},
+                       "queue_user_budgets": {}, "queue_daily_ai_budget": 0.0,
+                       "queue_job_ai_reserve": 1.0}.items():
+        monkeypatch.setitem(config, key, value)
+    return RecordingQueue(tmp_path / "queue.json")
+
+
+def _enqueue(queue, tmp_path, job_id, user, **job):
+    job_file = tmp_path / f"{job_id}.json"
+    job_file.write_text(json.dumps({"mode": "hybrid", **job}))
+    queue.enqueue(job_id, user, job_file)
+    return job_file
+
+
+def test_cap_holds_slot_for_other_users(queue, tmp_path):
+    for i in range(3):
+        _enqueue(queue, tmp_path, f"a{i}", "alice")
+    # Alone in the queue, alice may use both slots
+    assert queue.started == ["a0", "a1"]
+
+    _enqueue(queue, tmp_path, "b0", "bob")
+    queue.finish("a0")
+    # bob is under his cap and alice is over hers: bob gets the freed slot
+    assert queue.started == ["a0", "a1", "b0"]
+
+    queue.finish("a1")
+    assert queue.started[-1] == "a2"
+
+
+def test_round_robin_between_users(queue, tmp_path, monkeypatch):
+    monkeypatch.setitem(get_config()._config, "queue_max_concurrent", 1)
+    for i in range(3):
+        _enqueue(queue, tmp_path, f"a{i}", "alice")
+    for i in range(2):
+        _enqueue(queue, tmp_path, f"b{i}", "bob")
+    while len(queue.started) < 5:
+        queue.finish(queue.started[-1])
+    # Equal credit goes to the earlier submission, then the users alternate
+    assert queue.started == ["a0", "a1", "b0", "a2", "b1"]
+
+
+def test_snapshot_follows_caps(queue, tmp_path):
+    for i in range(3):
+        _enqueue(queue, tmp_path, f"a{i}", "alice")
+    _enqueue(queue, tmp_path, "b0", "bob")
+    assert queue.started == ["a0", "a1"]
+
+    # Uncapped, a2 would win the tie for the next slot; capped, bob's b0 starts
+    # when the first of alice's jobs finishes and a2 waits for the second
+    snapshot = queue.snapshot()
+    assert [snapshot[j]["position"] for j in ("b0", "a2")] == [1, 2]
+    assert 0 < snapshot["b0"]["expected_wait"] <= snapshot["a2"]["expected_wait"]
+
+
+def test_running_jobs_count_against_daily_budget(queue, tmp_path, monkeypatch):
+    monkeypatch.setitem(get_config()._config, "queue_daily_ai_budget", 1.5)
+    first = _enqueue(queue, tmp_path, "a0", "alice")
+    second = _enqueue(queue, tmp_path, "a1", "alice")
+    # Nothing is booked until a job finishes, but a0 holds $1 of the $1.50
+    assert json.loads(first.read_text())["budget"] == 1.0
+    assert json.loads(second.read_text())["budget"] == pytest.approx(0.5)
+
+    queue.finish("a0", cost=1.5)
+    third = _enqueue(queue, tmp_path, "a2", "alice")
+    data = json.loads(third.read_text())
+    assert data["mode"] == "regex_only" and data["ai_budget_exhausted"]
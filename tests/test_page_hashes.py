@@ -0,0 +1,142 @@
+# Page content hash tests
+"""
+The per-page cache keys AI answers by page_content_hashes: two copies of
+one blank fillable form, filled with different values, must not share a key,
+and neither may two pages whose shared content stream is drawn with fonts
+that map its codes to different characters.
+
+Run: python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pypdf import PdfWriter
+from pypdf.generic import (
+    ArrayObject, ByteStringObject, DecodedStreamObject, DictionaryObject, FloatObject, NameObject, NumberObject,
+    TextStringObject
+)
+
+from utils.pdf_parser import page_content_hashes
+
+
+def _filled_form(path: Path, value: str, appearance: bool = True) -> Path:
+    """One-page PDF with a single text field holding `value` (as /V and, optionally, its appearance)."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(612, 792)
+    widget = DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"),
+        NameObject("/Subtype"): NameObject("/Widget"),
+        NameObject("/FT"): NameObject("/Tx"),
+        NameObject("/T"): TextStringObject("revenue"),
+        NameObject("/V"): TextStringObject(value),
+        NameObject("/Rect"): ArrayObject([FloatObject(x) for x in (400, 500, 500, 514)]),
+    })
+    if appearance:
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /Helv 10 Tf 2 3 Td ({value}) Tj ET".encode())
+        stream.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): ArrayObject([FloatObject(x) for x in (0, 0, 100, 14)]),
+        })
+        widget[NameObject("/AP")] = DictionaryObject({NameObject("/N"): writer._add_object(stream)})
+    page[NameObject("/Annots")] = ArrayObject([writer._add_object(widget)])
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def _text_page(path: Path, differences=None, to_unicode: bytes = b"") -> Path:
+    """One-page PDF showing the codes "(12)" in /F1, re-encoded by `differences` or a ToUnicode map."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(612, 792)
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    if differences is not None:
+        font[NameObject("/Encoding")] = DictionaryObject({
+            NameObject("/Type"): NameObject("/Encoding"),
+            NameObject("/Differences"): ArrayObject([NumberObject(49)] + [NameObject(n) for n in differences]),
+        })
+    if to_unicode:
+        cmap = DecodedStreamObject()
+        cmap.set_data(to_unicode)
+        font[NameObject("/ToUnicode")] = writer._add_object(cmap)
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+    })
+    contents = DecodedStreamObject()
+    contents.set_data(b"BT /F1 12 Tf 72 700 Td (12) Tj ET")
+    page[NameObject("/Contents")] = writer._add_object(contents)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def _signed_form(path: Path, signature: bytes) -> Path:
+    """One-page PDF with a signature field whose /V is an indirect signature dictionary."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(612, 792)
+    value = DictionaryObject({
+        NameObject("/Type"): NameObject("/Sig"),
+        NameObject("/Contents"): ByteStringObject(signature),
+    })
+    widget = DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"),
+        NameObject("/Subtype"): NameObject("/Widget"),
+        NameObject("/FT"): NameObject("/Sig"),
+        NameObject("/V"): writer._add_object(value),
+        NameObject("/Rect"): ArrayObject([FloatObject(x) for x in (50, 360, 150, 410)]),
+    })
+    page[NameObject("/Annots")] = ArrayObject([writer._add_object(widget)])
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def _cmap(first: str, second: str) -> bytes:
+    return f"beginbfchar\n<31> <{first}>\n<32> <{second}>\nendbfchar".encode()
+
+
+def test_different_fill_values_hash_differently(tmp_path):
+    first = page_content_hashes(_filled_form(tmp_path / "a.pdf", "1,000,000"))
+    second = page_content_hashes(_filled_form(tmp_path / "b.pdf", "9,999,999"))
+    assert len(first) == len(second) == 1
+    assert first != second
+
+
+def test_value_without_appearance_still_counts(tmp_path):
+    # Viewers regenerate appearances from /V when NeedAppearances is set
+    first = page_content_hashes(_filled_form(tmp_path / "a.pdf", "1,000,000", appearance=False))
+    second = page_content_hashes(_filled_form(tmp_path / "b.pdf", "9,999,999", appearance=False))
+    assert first != second
+
+
+def test_same_fill_hashes_the_same(tmp_path):
+    first = page_content_hashes(_filled_form(tmp_path / "a.pdf", "1,000,000"))
+    second = page_content_hashes(_filled_form(tmp_path / "b.pdf", "1,000,000"))
+    assert first == second
+
+
+def test_font_differences_count(tmp_path):
+    first = page_content_hashes(_text_page(tmp_path / "a.pdf", ["/one", "/two"]))
+    second = page_content_hashes(_text_page(tmp_path / "b.pdf", ["/seven", "/eight"]))
+    assert first != second
+    assert first == page_content_hashes(_text_page(tmp_path / "c.pdf", ["/one", "/two"]))
+
+
+def test_font_to_unicode_counts(tmp_path):
+    first = page_content_hashes(_text_page(tmp_path / "a.pdf", to_unicode=_cmap("0031", "0032")))
+    second = page_content_hashes(_text_page(tmp_path / "b.pdf", to_unicode=_cmap("0037", "0038")))
+    assert first != second
+
+
+def test_signature_hashes_the_same_across_reads(tmp_path):
+    path = _signed_form(tmp_path / "a.pdf", b"\x30\x82\x01")
+    assert page_content_hashes(path) == page_content_hashes(path)
+    assert page_content_hashes(path) != page_content_hashes(_signed_form(tmp_path / "b.pdf", b"\x30\x82\x02"))
@@ -0,0 +1,56 @@
+# Tax return template tests
+"""
+Form line templates apply only to the tax years they were checked against,
+and the sample 2022 Form 1065 (a farm partnership) reads to the figures on
+the TMA sheet ("Sample Correct Output.png").
+
+Run: python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from engines.tax_form_engine import TaxFormEngine, detect_form
+from utils.pdf_parser import extract_page_texts
+
+SAMPLE = Path(__file__).parent.parent / "Sample Data" / "2022 tax return.pdf"
+
+
+def _partnership_page(year: int) -> str:
+    return f"Form 1065 U.S. Return of Partnership Income For calendar year {year}\n1a Gross receipts or sales"
+
+
+def test_template_used_for_checked_year():
+    template, index = detect_form(["Cover letter", _partnership_page(2022)])
+    assert (template.form, index) == ("1065", 1)
+
+
+@pytest.mark.parametrize("year", [2021, 2023, 0])
+def test_unchecked_year_is_not_read(year):
+    # 2023 adds a Form 7205 line and renumbers page 1; year 0 = no year found
+    page = _partnership_page(year) if year else "Form 1065 U.S. Return of Partnership Income\n1a Gross receipts"
+    assert detect_form([page]) is None
+
+
+@pytest.mark.skipif(not SAMPLE.exists(), reason="sample return not present")
+def test_sample_2022_return():
+    found = TaxFormEngine().extract(SAMPLE, extract_page_texts(SAMPLE))
+    assert found is not None
+    results, _, report = found
+    assert (report["form"], report["year"], report["farm"]) == ("1065", 2022, True)
+    assert report["balance_sheet_ties"] is True
+    data = results[0]
+    assert {name: getattr(data, name).value for name in (
+        "revenue", "net_income", "depreciation", "assets", "liabilities", "total_cpltd"
+    )} == {
+        "revenue": 4_164_347,
+        "net_income": -122_390,
+        "depreciation": 111_348,
+        "assets": 5_198_418,
+        "liabilities": 4_070_849,
+        "total_cpltd": 3_772_000,
+    }
@@ -1,14 +1,25 @@
 # utils package
 from .pdf_parser import (
     extract_text_from_pdf,
+    extract_page_texts,
+    page_content_hashes,
+    count_pdf_pages,
     convert_pdf_to_images,
     extract_text_from_excel,
     detect_file_type
 )
+from .upload_store import spool_upload, hash_file
+from .result_store import ResultStore
 
 __all__ = [
     "extract_text_from_pdf",
+    "extract_page_texts",
+    "page_content_hashes",
+    "count_pdf_pages",
     "convert_pdf_to_images",
     "extract_text_from_excel",
-    "detect_file_type"
+    "detect_file_type",
+    "spool_upload",
+    "hash_file",
+    "ResultStore"
 ]
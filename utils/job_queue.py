@@ -0,0 +1,318 @@
+# Shared Fair-Share Job Queue
+"""
+One queue for every session on the machine. Jobs are started with smooth
+weighted round-robin across users, so a 200-file batch can't starve
+someone's single file. Per-user caps limit concurrent jobs while others
+wait (a lone user may fill every free slot) and daily AI spend. State is a
+JSON file guarded by the same inter-process lock as the rate limiter; the
+UI enqueues, workers report back when they finish, and either side
+dispatches whatever can start next.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_config, get_temp_dir
+from engines.rate_limiter import file_lock
+from utils.metrics import get_metrics
+
+DEFAULT_JOB_SECONDS = 30.0  # expected duration until we've seen real jobs finish
+DURATION_WINDOW = 50        # recent durations kept for wait estimates
+STALE_JOB_SECONDS = 3600    # a "running" job older than this with no live worker is dropped
+
+
+def _empty_state() -> Dict:
+    return {"queued": [], "running": {}, "current": {}, "spend": {}, "durations": []}
+
+
+class JobQueue:
+    """File-backed fair-share queue; every method takes the lock."""
+
+    def __init__(self, state_path: Optional[Path] = None):
+        self.state_path = Path(state_path or get_temp_dir() / "tma_queue.json")
+        self.lock_path = self.state_path.with_suffix(".lock")
+
+    # --- Settings (read per call so changes apply without restarts) ---
+
+    @property
+    def max_concurrent(self) -> int:
+        return max(1, int(get_config().get("queue_max_concurrent", 4)))
+
+    @property
+    def max_per_user(self) -> int:
+        return max(1, int(get_config().get("queue_max_jobs_per_user", 2)))
+
+    def weight(self, user: str) -> int:
+        weights = get_config().get("queue_user_weights", {}) or {}
+        return max(1, int(weights.get(user, 1)))
+
+    def daily_budget(self, user: str) -> float:
+        """Per-user AI spend cap in $/day (0 = unlimited)."""
+        budgets = get_config().get("queue_user_budgets", {}) or {}
+        return float(budgets.get(user, get_config().get("queue_daily_ai_budget", 0.0)))
+
+    # --- State ---
+
+    def _read(self) -> Dict:
+        try:
+            state = json.loads(self.state_path.read_text())
+        except (OSError, json.JSONDecodeError):
+            state = {}
+        return {**_empty_state(), **state}
+
+    def _write(self, state: Dict):
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        tmp.replace(self.state_path)
+
+    def _spent_today(self, state: Dict, user: str) -> float:
+        spend = state["spend"].get(user) or {}
+        return spend.get("cost", 0.0) if spend.get("date") == date.today().isoformat() else 0.0
+
+    # --- Public API ---
+
+    def enqueue(self, job_id: str, user: str, job_file: Path) -> int:
+        """Add a job; returns its queue position (1 = next to start, 0 = already started)."""
+        with file_lock(self.lock_path):
+            state = self._read()
+            state["queued"].append({
+                "job_id": job_id, "user": user, "job_file": str(job_file), "submitted_at": time.time()
+            })
+            self._write(state)
+        self.dispatch()
+        return self.position(job_id)
+
+    def finish(self, job_id: str, cost: float = 0.0):
+        """Worker is done: record spend and duration, then start the next job(s)."""
+        with file_lock(self.lock_path):
+            state = self._read()
+            running = state["running"].pop(job_id, None)
+            if running:
+                user = running["user"]
+                today = date.today().isoformat()
+                spend = state["spend"].get(user) or {}
+                if spend.get("date") != today:
+                    spend = {"date": today, "cost": 0.0}
+                spend["cost"] += cost
+                state["spend"][user] = spend
+                state["durations"] = (state["durations"] + [time.time() - running["started_at"]])[-DURATION_WINDOW:]
+            self._write(state)
+        self.dispatch()
+
+    def cancel_user(self, user: str) -> int:
+        """Drop a user's queued (not yet running) jobs. Returns how many."""
+        with file_lock(self.lock_path):
+            state = self._read()
+            before = len(state["queued"])
+            state["queued"] = [j for j in state["queued"] if j["user"] != user]
+            self._write(state)
+        return before - len(state["queued"])
+
+    def dispatch(self) -> List[str]:
+        """Start queued jobs while there are free slots. Returns the started job ids."""
+        started = []
+        metrics = get_metrics()
+        with file_lock(self.lock_path):
+            state = self._read()
+            self._reap(state)
+            while len(state["running"]) < self.max_concurrent:
+                job = self._pick(state, state["running"])
+                if job is None:
+                    break
+                state["queued"].remove(job)
+                reserved = self._apply_budget(state, job)
+                pid = self._spawn(job)
+                state["running"][job["job_id"]] = {
+                    "user": job["user"], "pid": pid, "started_at": time.time(), "reserved": reserved
+                }
+                started.append(job["job_id"])
+                metrics.observe("tma_stage_seconds", time.time() - job["submitted_at"], stage="queue_wait")
+            self._write(state)
+        metrics.flush()
+        return started
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """{job_id: {"position", "expected_wait"}} for every queued job, in start order."""
+        with file_lock(self.lock_path):
+            state = self._read()
+        durations = state["durations"]
+        avg = sum(durations) / len(durations) if durations else DEFAULT_JOB_SECONDS
+        slots = self.max_concurrent
+
+        # Replay the scheduler on a copy, caps included: every job takes `avg`
+        # seconds, so a slot frees up when the oldest job in it is due to finish
+        sim = json.loads(json.dumps(state))
+        now = time.time()
+        running = {
+            job_id: dict(info, ends=max(info["started_at"] + avg - now, 0.0))
+            for job_id, info in sim["running"].items()
+        }
+        clock = 0.0
+        order = []
+        while sim["queued"]:
+            if len(running) >= slots:
+                done = min(running, key=lambda j: running[j]["ends"])
+                clock = max(clock, running.pop(done)["ends"])
+                continue
+            job = self._pick(sim, running)
+            sim["queued"].remove(job)
+            running[job["job_id"]] = {"user": job["user"], "ends": clock + avg}
+            order.append((job["job_id"], clock))
+
+        return {
+            job_id: {"position": i + 1, "expected_wait": wait}
+            for i, (job_id, wait) in enumerate(order)
+        }
+
+    def depth(self) -> Dict[str, int]:
+        """{"queued": n, "running": n} for metrics."""
+        with file_lock(self.lock_path):
+            state = self._read()
+        return {"queued": len(state["queued"]), "running": len(state["running"])}
+
+    def position(self, job_id: str) -> int:
+        return self.snapshot().get(job_id, {}).get("position", 0)
+
+    # --- Scheduling internals ---
+
+    def _pick(self, state: Dict, running: Dict) -> Optional[Dict]:
+        """
+        Smooth weighted round-robin over users with queued jobs, below their
+        concurrency cap. The cap only holds a free slot for other users' jobs:
+        if every queued job belongs to capped users, they share the slot.
+        Jobs within a user stay FIFO.
+        """
+        per_user_running: Dict[str, int] = {}
+        for info in running.values():
+            per_user_running[info["user"]] = per_user_running.get(info["user"], 0) + 1
+
+        first_jobs: Dict[str, Dict] = {}
+        for job in state["queued"]:
+            first_jobs.setdefault(job["user"], job)
+        if not first_jobs:
+            return None
+        candidates = {
+            user: job for user, job in first_jobs.items()
+            if per_user_running.get(user, 0) < self.max_per_user
+        } or first_jobs
+
+        current = state["current"]
+        waiting = {job["user"] for job in state["queued"]}
+        for user in list(current):
+            if user not in waiting:
+                del current[user]  # credit doesn't carry over between batches
+        total = 0
+        for user in candidates:
+            weight = self.weight(user)
+            current[user] = current.get(user, 0) + weight
+            total += weight
+        chosen = max(candidates, key=lambda u: (current[u], -candidates[u]["submitted_at"]))
+        current[chosen] -= total
+        return candidates[chosen]
+
+    def _apply_budget(self, state: Dict, job: Dict) -> float:
+        """
+        Hold a job to what's left of its user's daily AI budget. Spend is only
+        booked when a job finishes, so each running job counts at its cap: the
+        job's own budget, or queue_job_ai_reserve, whichever is lower. Over the
+        daily budget the job still runs, but regex-only. Returns the dollars
+        reserved for the job (0 = nothing to hold).
+        """
+        user = job["user"]
+        budget = self.daily_budget(user)
+        if budget <= 0:
+            return 0.0
+        reserved = sum(info.get("reserved", 0.0) for info in state["running"].values() if info["user"] == user)
+        left = budget - self._spent_today(state, user) - reserved
+        job_file = Path(job["job_file"])
+        try:
+            data = json.loads(job_file.read_text())
+        except (OSError, json.JSONDecodeError):
+            return 0.0
+        if data.get("mode") == "regex_only":
+            return 0.0
+        if left <= 0:
+            data["mode"] = "regex_only"
+            data["ai_budget_exhausted"] = True
+            job_file.write_text(json.dumps(data))
+            return 0.0
+        cap = min(data.get("budget") or float("inf"), float(get_config().get("queue_job_ai_reserve", 1.0)), left)
+        data["budget"] = cap
+        job_file.write_text(json.dumps(data))
+        return cap
+
+    def _spawn(self, job: Dict) -> int:
+        backend_script = Path(__file__).parent.parent / "backend_processor.py"
+        log_file = get_temp_dir() / f"tma_log_{job['job_id']}.txt"
+        with open(log_file, "w") as log:
+            proc = subprocess.Popen(
+                [sys.executable, str(backend_script), job["job_file"]],
+                start_new_session=True,
+                stdout=log,
+                stderr=subprocess.STDOUT
+            )
+        return proc.pid
+
+    def _reap(self, state: Dict):
+        """Free slots held by workers that died without calling finish()."""
+        now = time.time()
+        for job_id, info in list(state["running"].items()):
+            if not _pid_alive(info.get("pid")) or now - info["started_at"] > STALE_JOB_SECONDS:
+                state["running"].pop(job_id)
+
+
+def create_job(
+    file_path: Path,
+    mode: str,
+    user: str,
+    api_key: str = "",
+    file_hash: str = "",
+    **extra
+) -> str:
+    """Write a job file and queue it. Shared by the UI and the HTTP API."""
+    job_id = str(uuid.uuid4())[:8]
+    job_file = get_temp_dir() / f"tma_job_{job_id}.json"
+    job_data = {
+        "job_id": job_id,
+        "file_path": str(file_path),
+        "file_name": Path(file_path).name,
+        "file_hash": file_hash,
+        "mode": mode,
+        "api_key": api_key,
+        "ai_model": get_config().get("ai_model", "gpt-4o"),
+        "user": user,
+        "queued": True,
+        **extra
+    }
+    job_file.write_text(json.dumps(job_data))
+    # Worker subprocesses are spawned by the queue (logs go to tma_log_<job_id>.txt)
+    JobQueue().enqueue(job_id, user, job_file)
+    return job_id
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if os.name == "nt":
+        return True  # no cheap liveness probe; rely on STALE_JOB_SECONDS
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # Finished children we spawned linger as zombies until reaped
+    try:
+        reaped, _ = os.waitpid(pid, os.WNOHANG)
+        return reaped == 0
+    except ChildProcessError:
+        return True  # not our child (spawned by another process): it's alive
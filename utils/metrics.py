@@ -0,0 +1,215 @@
+# Cross-Process Metrics
+"""
+Counters and latency histograms recorded in whichever process did the work
+(backend workers, the queue, the bulk runner) and merged into one shared
+JSON file under a lock when that process flushes. Anything can then
+render the totals as Prometheus text: the HTTP API's /metrics endpoint,
+`backend_processor.py --metrics`, or a textfile written on every flush
+for node_exporter (config "metrics_textfile").
+
+Queue gauges (jobs queued / running) are read live at render time.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import get_config, get_temp_dir
+
+# Seconds; covers a cached page (~ms) to a 100-page vision run
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+HELP = {
+    "tma_jobs_total": ("counter", "Finished extraction jobs by final state"),
+    "tma_jobs": ("gauge", "Jobs in the shared queue by state"),
+    "tma_queue_depth": ("gauge", "Jobs waiting for a worker"),
+    "tma_stage_seconds": ("histogram", "Time spent per processing stage"),
+    "tma_pages_rasterized_total": ("counter", "PDF pages rendered to images"),
+    "tma_pages_reused_total": ("counter", "PDF pages answered from the per-page cache (not rendered)"),
+    "tma_ai_calls_total": ("counter", "AI requests by model"),
+    "tma_ai_tokens_total": ("counter", "AI tokens by model and kind"),
+    "tma_ai_cost_dollars_total": ("counter", "AI spend in dollars by model"),
+    "tma_ai_cache_total": ("counter", "AI page cache lookups by result"),
+    "tma_ai_cache_hit_ratio": ("gauge", "AI page cache hits / lookups"),
+    "tma_resolved_total": ("counter", "Finished files by the method that produced the answer"),
+    "tma_regex_resolution_ratio": ("gauge", "Share of finished files resolved by regex alone"),
+}
+
+
+def get_metrics_path() -> Path:
+    return get_temp_dir() / "tma_metrics.json"
+
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    """Canonical "name|k=v,k=v" key (labels sorted) for the JSON file."""
+    return name + "|" + ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+
+
+def _split(key: str) -> Tuple[str, Dict[str, str]]:
+    name, _, raw = key.partition("|")
+    labels = dict(pair.split("=", 1) for pair in raw.split(",")) if raw else {}
+    return name, labels
+
+
+def _empty() -> Dict:
+    return {"counters": {}, "histograms": {}}
+
+
+class Metrics:
+    """In-process registry; flush() folds it into the shared file and starts over."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.data = _empty()
+        self.stages: Dict[str, float] = {}  # this process's stage totals (not reset by flush)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        self.data["counters"][key] = self.data["counters"].get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        hist = self.data["histograms"].setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Observe tma_stage_seconds{stage=...} for the block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("tma_stage_seconds", seconds, stage=stage)
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def record_ai_stats(self, stats: Dict):
+        """Fold an AIEngine's counters in (call once per engine, at the end of its run)."""
+        for model, usage in stats.get("models", {}).items():
+            self.inc("tma_ai_calls_total", usage["calls"], model=model)
+            self.inc("tma_ai_tokens_total", usage["prompt_tokens"], model=model, kind="prompt")
+            self.inc("tma_ai_tokens_total", usage["completion_tokens"], model=model, kind="completion")
+            self.inc("tma_ai_cost_dollars_total", usage["cost"], model=model)
+        self.inc("tma_ai_cache_total", stats.get("cache_hits", 0), result="hit")
+        self.inc("tma_ai_cache_total", stats.get("cache_misses", 0), result="miss")
+
+    def flush(self):
+        """Merge into the shared file (all processes add to the same totals)."""
+        if not self.data["counters"] and not self.data["histograms"]:
+            return
+        from engines.rate_limiter import file_lock
+
+        path = self.path or get_metrics_path()
+        with file_lock(path.with_suffix(".lock")):
+            shared = read_metrics(path)
+            for key, value in self.data["counters"].items():
+                shared["counters"][key] = shared["counters"].get(key, 0) + value
+            for key, hist in self.data["histograms"].items():
+                target = shared["histograms"].setdefault(
+                    key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+                )
+                target["buckets"] = [a + b for a, b in zip(target["buckets"], hist["buckets"])]
+                target["sum"] += hist["sum"]
+                target["count"] += hist["count"]
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(shared))
+            tmp.replace(path)
+        self.data = _empty()
+
+        textfile = get_config().get("metrics_textfile", "")
+        if textfile:
+            from utils.job_queue import JobQueue
+            target = Path(textfile)
+            tmp = target.with_suffix(".tmp")
+            tmp.write_text(render_prometheus(read_metrics(path), JobQueue().depth()))
+            tmp.replace(target)  # node_exporter must never see a half-written file
+
+
+def read_metrics(path: Optional[Path] = None) -> Dict:
+    try:
+        return {**_empty(), **json.loads((path or get_metrics_path()).read_text())}
+    except (OSError, json.JSONDecodeError):
+        return _empty()
+
+
+def _escape(value) -> str:
+    """Label value escaping per the exposition format: backslash, double quote, newline."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _number(value) -> str:
+    """Exact sample value: whole numbers as integers, anything else at full float precision."""
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53):
+        return str(int(value))
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def render_prometheus(data: Optional[Dict] = None, queue_depth: Optional[Dict[str, int]] = None) -> str:
+    """Prometheus text exposition format (v0.0.4) for the merged totals plus live queue gauges."""
+    data = data if data is not None else read_metrics()
+    lines: Dict[str, list] = {}
+
+    for key, value in sorted(data["counters"].items()):
+        name, labels = _split(key)
+        lines.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+
+    for key, hist in sorted(data["histograms"].items()):
+        name, labels = _split(key)
+        out = lines.setdefault(name, [])
+        for bound, count in zip(BUCKETS, hist["buckets"]):
+            out.append(f"{name}_bucket{_labels({**labels, 'le': f'{bound:g}'})} {count}")
+        out.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {hist['count']}")
+        out.append(f"{name}_sum{_labels(labels)} {hist['sum']:.6f}")
+        out.append(f"{name}_count{_labels(labels)} {hist['count']}")
+
+    # Ratios, for consumers that read the textfile rather than running PromQL
+    counters = data["counters"]
+    hits = counters.get(_key("tma_ai_cache_total", {"result": "hit"}), 0)
+    misses = counters.get(_key("tma_ai_cache_total", {"result": "miss"}), 0)
+    if hits + misses:
+        lines["tma_ai_cache_hit_ratio"] = [f"tma_ai_cache_hit_ratio {hits / (hits + misses):.4f}"]
+    resolved = {_split(k)[1].get("method"): v for k, v in counters.items() if k.startswith("tma_resolved_total|")}
+    if sum(resolved.values()):
+        lines["tma_regex_resolution_ratio"] = [
+            f"tma_regex_resolution_ratio {resolved.get('regex', 0) / sum(resolved.values()):.4f}"
+        ]
+
+    if queue_depth is not None:
+        lines["tma_jobs"] = [f'tma_jobs{{state="{state}"}} {n}' for state, n in sorted(queue_depth.items())]
+        lines["tma_queue_depth"] = [f"tma_queue_depth {queue_depth.get('queued', 0)}"]
+
+    text = []
+    for name in sorted(lines):
+        kind, help_text = HELP.get(name, ("untyped", name))
+        text.append(f"# HELP {name} {help_text}")
+        text.append(f"# TYPE {name} {kind}")
+        text.extend(lines[name])
+    return "\n".join(text) + "\n"
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """This process's registry."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
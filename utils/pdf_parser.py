@@ -4,6 +4,7 @@ Extract text and images from PDFs for processing.
 Handles both digital (text-based) and scanned (image-based) PDFs.
 """
 
+import hashlib
 import io
 from pathlib import Path
 from typing import List, Optional, Tuple
@@ -26,9 +27,7 @@ def extract_text_from_pdf(pdf_path: Path) -> Tuple[str, bool]:
             text_parts.append(page_text)
         
         full_text = "\n".join(text_parts)
-        
-        # Consider it digital if we got meaningful text
-        is_digital = len(full_text.strip()) > 100
+        is_digital = has_text_layer(full_text)
         
         return full_text, is_digital
         
@@ -38,9 +37,186 @@ def extract_text_from_pdf(pdf_path: Path) -> Tuple[str, bool]:
         return f"Error extracting text: {e}", False
 
 
-def convert_pdf_to_images(pdf_path: Path, output_dir: Optional[Path] = None) -> List[Path]:
+def has_text_layer(text: str) -> bool:
+    """Consider a PDF digital if we got meaningful text."""
+    return len(text.strip()) > 100
+
+
+def extract_page_texts(pdf_path: Path, pages: Optional[List[int]] = None) -> List[str]:
+    """
+    Text layer of each page, in page order (empty strings for image-only pages).
+    `pages` (1-based) extracts only those pages, in the order given.
+    """
+    try:
+        import pypdf
+        
+        reader = pypdf.PdfReader(str(pdf_path))
+        if pages is not None:
+            return [reader.pages[number - 1].extract_text() or "" for number in pages]
+        return [page.extract_text() or "" for page in reader.pages]
+        
+    except ImportError:
+        raise ImportError("pypdf not installed. Run: pip install pypdf")
+    except Exception:
+        return []
+
+
+def count_pdf_pages(pdf_path: Path) -> int:
+    """Page count from the PDF structure (no rendering)."""
+    try:
+        import pypdf
+        
+        return len(pypdf.PdfReader(str(pdf_path)).pages)
+        
+    except ImportError:
+        raise ImportError("pypdf not installed. Run: pip install pypdf")
+    except Exception:
+        return 0
+
+
+def _hash_resources(resources, digest, seen: set):
+    """Fold fonts, images and form XObjects (recursively) into a page digest."""
+    if resources is None:
+        return
+    resources = resources.get_object()
+    fonts = resources.get("/Font")
+    if fonts is not None:
+        fonts = fonts.get_object()
+        for name in sorted(fonts):
+            digest.update(str(name).encode())
+            # Same content stream, different /Differences, /ToUnicode or embedded
+            # glyphs: the page shows different characters
+            _hash_object(fonts.raw_get(name), digest, seen)
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in sorted(xobjects):
+        ref = xobjects.raw_get(name)
+        key = (ref.idnum, ref.generation) if hasattr(ref, "idnum") else None
+        digest.update(str(name).encode())
+        if key is not None and key in seen:
+            continue
+        seen.add(key)
+        obj = ref.get_object()
+        # Raw (still encoded) stream bytes: hashing must not pay for decoding images
+        digest.update(getattr(obj, "_data", b"") or b"")
+        if obj.get("/Subtype") == "/Form":
+            _hash_resources(obj.get("/Resources"), digest, seen)
+
+
+def _hash_object(obj, digest, seen: set):
+    """
+    Fold a PDF object into a digest: dictionaries by sorted key, arrays in
+    order, streams by their raw bytes. Indirect objects are followed once per
+    page (object numbers aren't hashed; they change when a package is re-sent).
+    """
+    if hasattr(obj, "idnum"):
+        key = (obj.idnum, obj.generation)
+        if key in seen:
+            digest.update(b"R")
+            return
+        seen.add(key)
+        obj = obj.get_object()
+    if hasattr(obj, "keys"):
+        digest.update(b"<<")
+        for key in sorted(obj.keys()):
+            digest.update(str(key).encode())
+            _hash_object(obj.raw_get(key), digest, seen)
+        digest.update(b">>")
+        digest.update(getattr(obj, "_data", b"") or b"")
+    elif isinstance(obj, list):
+        digest.update(b"[")
+        for item in obj:
+            _hash_object(item, digest, seen)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode())
+
+
+def _hash_annotations(page, digest, seen: set):
+    """
+    Fold annotations into a page digest: form field values (/V, inherited
+    from the parent field too), checkbox states and appearance streams.
+    Two copies of one blank form filled differently must not hash the same.
+    """
+    for annot in page.get("/Annots") or []:
+        annot = annot.get_object()
+        value = annot.get("/V")
+        if value is None and "/Parent" in annot:
+            value = annot["/Parent"].get_object().get("/V")
+        if value is not None:
+            value = value.get_object()
+        if hasattr(value, "keys"):
+            # A signature: its bytes, not the reference (whose repr varies per read)
+            # or the document it may point back to
+            value = value.get("/Contents")
+        rect = [float(v) for v in annot.get("/Rect", [])]
+        digest.update(repr((annot.get("/Subtype"), rect, value, annot.get("/AS"))).encode())
+        appearance = annot.get("/AP")
+        normal = appearance.get_object().get("/N") if appearance is not None else None
+        if normal is None:
+            continue
+        normal = normal.get_object()
+        # A checkbox has one appearance per state, a text field a single stream
+        streams = [normal] if hasattr(normal, "get_data") else [normal[state].get_object() for state in sorted(normal)]
+        for stream in streams:
+            digest.update(getattr(stream, "_data", b"") or b"")
+            _hash_resources(stream.get("/Resources"), digest, seen)
+
+
+def page_content_hashes(pdf_path: Path) -> List[str]:
+    """
+    SHA-256 per page of what gets rendered: content streams, page box and
+    rotation, fonts (encodings, ToUnicode maps, embedded glyphs), image/form
+    data, and annotations (filled-in form fields).
+    Unchanged pages of a re-sent package hash the same even when pages were
+    added, removed or reordered around them.
+    Empty list if the PDF can't be read.
+    """
+    try:
+        import pypdf
+        
+        reader = pypdf.PdfReader(str(pdf_path))
+        hashes = []
+        for page in reader.pages:
+            digest = hashlib.sha256()
+            digest.update(repr((list(page.mediabox), page.get("/Rotate", 0))).encode())
+            contents = page.get_contents()
+            if contents is not None:
+                digest.update(contents.get_data())
+            seen = set()
+            _hash_resources(page.get("/Resources"), digest, seen)
+            _hash_annotations(page, digest, seen)
+            hashes.append(digest.hexdigest())
+        return hashes
+        
+    except ImportError:
+        raise ImportError("pypdf not installed. Run: pip install pypdf")
+    except Exception:
+        return []
+
+
+def _runs(pages: List[int]) -> List[Tuple[int, int]]:
+    """Consecutive page numbers as (first, last) ranges, in the order given."""
+    runs: List[Tuple[int, int]] = []
+    for number in pages:
+        if runs and number == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], number)
+        else:
+            runs.append((number, number))
+    return runs
+
+
+def convert_pdf_to_images(
+    pdf_path: Path,
+    output_dir: Optional[Path] = None,
+    dpi: int = 150,
+    pages: Optional[List[int]] = None
+) -> List[Path]:
     """
     Convert PDF pages to images for AI processing.
+    `pages` (1-based) renders only those pages, in the order given.
     Returns list of image paths.
     """
     if output_dir is None:
@@ -51,15 +227,25 @@ def convert_pdf_to_images(pdf_path: Path, output_dir: Optional[Path] = None) ->
     try:
         import pdf2image
         
-        images = pdf2image.convert_from_path(
-            str(pdf_path),
-            dpi=150,  # Balance quality vs size
-            fmt="png"
-        )
+        if pages is None:
+            numbered = enumerate(pdf2image.convert_from_path(
+                str(pdf_path),
+                dpi=dpi,  # 150 balances quality vs size
+                fmt="png"
+            ), start=1)
+        else:
+            # One poppler run per consecutive range rather than per page
+            numbered = (
+                (first + offset, image)
+                for first, last in _runs(pages)
+                for offset, image in enumerate(pdf2image.convert_from_path(
+                    str(pdf_path), dpi=dpi, fmt="png", first_page=first, last_page=last
+                ))
+            )
         
         paths = []
-        for i, image in enumerate(images):
-            path = output_dir / f"page_{i+1:03d}.png"
+        for number, image in numbered:
+            path = output_dir / f"page_{number:03d}.png"
             image.save(str(path), "PNG")
             paths.append(path)
         
@@ -0,0 +1,198 @@
+# Outlier Job Profiling
+"""
+Every worker runs a low-rate wall-clock sampler (a daemon thread reading
+sys._current_frames(), ~100 samples/sec) for the length of its job. At
+the end the job's stage timings are compared with rolling percentiles
+shared by all workers; only when the job is an outlier (total time above
+the configured percentile) is the profile written, together with a stage
+breakdown, and referenced from the job result. The N newest profiles are
+kept.
+
+Profiles are collapsed stacks ("thread;outer;inner count"), which
+speedscope (https://www.speedscope.app), flamegraph.pl and inferno open
+directly.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import get_config, get_config_dir, get_temp_dir
+
+HISTORY_WINDOW = 200  # recent samples kept per stage for the rolling percentiles
+
+
+def get_profile_dir() -> Path:
+    """Persistent (unlike temp) so an overnight outlier is still there in the morning."""
+    profile_dir = get_config_dir() / "profiles"
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    return profile_dir
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler for every thread in this process except its own."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="tma-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def write_collapsed(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+
+class StageHistory:
+    """Rolling per-stage durations of recent jobs, shared by all workers."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or get_temp_dir() / "tma_stage_history.json")
+
+    def record(self, stages: Dict[str, float]) -> Dict[str, List[float]]:
+        """Add one job's stage times. Returns the history as it stood *before* this job."""
+        from engines.rate_limiter import file_lock
+
+        with file_lock(self.path.with_suffix(".lock")):
+            try:
+                history = json.loads(self.path.read_text())
+            except (OSError, json.JSONDecodeError):
+                history = {}
+            before = {stage: list(values) for stage, values in history.items()}
+            for stage, seconds in stages.items():
+                history[stage] = (history.get(stage, []) + [round(seconds, 4)])[-HISTORY_WINDOW:]
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(history))
+            tmp.replace(self.path)
+        return before
+
+
+class OutlierProfiler:
+    """Sample the whole job; keep the profile only if the job turns out slow."""
+
+    def __init__(self):
+        config = get_config()
+        self.enabled = config.get("profile_outliers", True)
+        self.pct = float(config.get("profile_percentile", 95))
+        self.min_samples = int(config.get("profile_min_samples", 20))
+        self.min_seconds = float(config.get("profile_min_seconds", 5.0))
+        self.keep = int(config.get("profile_keep", 20))
+        self.sampler = SamplingProfiler(config.get("profile_interval_ms", 10) / 1000)
+        self.started = time.perf_counter()
+
+    def start(self) -> "OutlierProfiler":
+        self.started = time.perf_counter()
+        if self.enabled:
+            self.sampler.start()
+        return self
+
+    def finish(self, job_id: str, file_name: str, stages: Dict[str, float]) -> Optional[Dict]:
+        """
+        Stop sampling and update the rolling percentiles. For an outlier, write
+        <job_id>.folded plus a <job_id>.json breakdown and return the report
+        to attach to the job record; otherwise return None.
+        """
+        if not self.enabled:
+            return None
+        self.sampler.stop()
+        stages = {**stages, "total": time.perf_counter() - self.started}
+        before = StageHistory().record(stages)
+
+        if len(before.get("total", [])) < self.min_samples:
+            return None  # not enough history to call anything an outlier yet
+        threshold = max(percentile(before["total"], self.pct), self.min_seconds)
+        if stages["total"] <= threshold:
+            return None
+        label = f"p{self.pct:g}"
+
+        profile_dir = get_profile_dir()
+        profile_path = profile_dir / f"{job_id}.folded"
+        self.sampler.write_collapsed(profile_path)
+        report = {
+            "job_id": job_id,
+            "file": file_name,
+            "captured_at": datetime.now().isoformat(),
+            "total_seconds": round(stages["total"], 3),
+            "threshold_seconds": round(threshold, 3),
+            "percentile": label,
+            "samples": self.sampler.samples,
+            "profile_path": str(profile_path),
+            "stages": {
+                stage: self._stage_report(seconds, before.get(stage, []), label)
+                for stage, seconds in stages.items()
+            },
+        }
+        (profile_dir / f"{job_id}.json").write_text(json.dumps(report, indent=2))
+        self._prune(profile_dir)
+        return report
+
+    def _stage_report(self, seconds: float, history: List[float], label: str) -> Dict:
+        """This job's time for a stage next to that stage's rolling p50 / threshold percentile."""
+        if not history:
+            return {"seconds": round(seconds, 3)}
+        typical = percentile(history, self.pct)
+        return {
+            "seconds": round(seconds, 3),
+            "p50": round(percentile(history, 50), 3),
+            label: round(typical, 3),
+            "slow": seconds > typical,
+        }
+
+    def _prune(self, profile_dir: Path):
+        reports = sorted(profile_dir.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in reports[self.keep:]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".folded").unlink(missing_ok=True)
+
+
+def list_profiles() -> List[Dict]:
+    """Saved outlier reports, newest first."""
+    reports = []
+    for path in sorted(get_profile_dir().glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            reports.append(json.loads(path.read_text()))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return reports
@@ -0,0 +1,239 @@
+# Columnar Result Store (Parquet, partitioned by year)
+"""
+Every finished extraction appends its per-year rows to a Parquet dataset
+under the config dir, laid out as year=<YYYY>/part-*.parquet. Portfolio
+questions ("all 2023 revenue") then read one partition and only the
+columns asked for, instead of re-opening thousands of status files.
+
+Appends never rewrite existing files (one small part per file processed),
+so concurrent workers need no coordination; compact() merges the small
+parts per year under a lock when they pile up.
+
+Requires: pip install pyarrow
+"""
+
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from engines.regex_engine import FINANCIAL_FIELDS
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow not installed. Run: pip install pyarrow")
+    return pyarrow
+
+
+def get_result_store_dir() -> Path:
+    """Persistent like bulk jobs: results outlive the temp dir."""
+    from config import get_config_dir
+    store_dir = get_config_dir() / "results"
+    store_dir.mkdir(parents=True, exist_ok=True)
+    return store_dir
+
+
+def result_rows(result: Dict, company: str = "", job_id: str = "") -> List[Dict]:
+    """
+    Flatten one process_file output into one row per year.
+    Company defaults to the file name without extension.
+    The cost is that of the whole file, split evenly over its years so sums stay right.
+    """
+    years = [y for y in result.get("years") or [] if y.get("year")]
+    if not result.get("success") or not years:
+        return []
+    file_name = result.get("file", "")
+    processed_at = result.get("processed_at") or datetime.now().isoformat()
+    cost = result.get("total_cost", 0.0) / len(years)
+    rows = []
+    for year in years:
+        row = {
+            "year": int(year["year"]),
+            "file_hash": result.get("file_hash", ""),
+            "file": file_name,
+            "company": company or Path(file_name).stem,
+            "job_id": job_id,
+            "method": result.get("extraction_method", ""),
+            "confidence": int(year.get("confidence", result.get("confidence", 0))),
+            "cost": cost,
+            "processed_at": datetime.fromisoformat(processed_at),
+        }
+        for name in FINANCIAL_FIELDS:
+            value = year.get(name)
+            row[name] = float(value) if value is not None else None
+        rows.append(row)
+    return rows
+
+
+class ResultStore:
+    """Append-only Parquet dataset of extracted FinancialData rows."""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.pa = _pyarrow()
+        self.root = Path(root or get_result_store_dir())
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def schema(self):
+        pa = self.pa
+        return pa.schema(
+            [("year", pa.int32()),
+             ("file_hash", pa.string()),
+             ("file", pa.string()),
+             ("company", pa.string()),
+             ("job_id", pa.string()),
+             ("method", pa.string()),
+             ("confidence", pa.int32()),
+             ("cost", pa.float64()),
+             ("processed_at", pa.timestamp("us"))]
+            + [(name, pa.float64()) for name in FINANCIAL_FIELDS]
+        )
+
+    def _file_schema(self):
+        """Schema inside each part file: the year lives in the directory name."""
+        return self.schema.remove(self.schema.get_field_index("year"))
+
+    def _dataset(self):
+        pa = self.pa
+        return pa.dataset.dataset(
+            self.root,
+            schema=self.schema,
+            format="parquet",
+            partitioning=pa.dataset.partitioning(pa.schema([("year", pa.int32())]), flavor="hive"),
+        )
+
+    # --- Writing ---
+
+    def append_rows(self, rows: Iterable[Dict]) -> int:
+        """Write rows as one new part file per year. Returns the row count."""
+        by_year: Dict[int, List[Dict]] = {}
+        for row in rows:
+            by_year.setdefault(int(row["year"]), []).append(row)
+        file_schema = self._file_schema()
+        for year, year_rows in by_year.items():
+            table = self.pa.Table.from_pylist(year_rows, schema=file_schema)
+            partition = self.root / f"year={year}"
+            partition.mkdir(exist_ok=True)
+            # Written under a dot-name (ignored by readers), then renamed into place
+            tmp = partition / f".part-{uuid.uuid4().hex}.tmp"
+            self.pa.parquet.write_table(table, tmp)
+            tmp.replace(partition / f"part-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+        return sum(len(r) for r in by_year.values())
+
+    def append_result(self, result: Dict, company: str = "", job_id: str = "") -> int:
+        return self.append_rows(result_rows(result, company, job_id))
+
+    # --- Reading ---
+
+    def query(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        years: Optional[Sequence[int]] = None,
+        companies: Optional[Sequence[str]] = None,
+        min_confidence: Optional[int] = None,
+        latest: bool = True
+    ):
+        """
+        Load a pyarrow Table with just `columns` (default: all).
+        Year filters prune whole partitions; only the requested columns are read.
+        latest keeps the newest row per (file_hash, year) when a file was extracted more than once.
+        """
+        ds = self.pa.dataset
+        expr = None
+        for condition in (
+            ds.field("year").isin(list(years)) if years else None,
+            ds.field("company").isin(list(companies)) if companies else None,
+            ds.field("confidence") >= min_confidence if min_confidence is not None else None,
+        ):
+            if condition is not None:
+                expr = condition if expr is None else expr & condition
+
+        wanted = list(columns) if columns else self.schema.names
+        unknown = [c for c in wanted if c not in self.schema.names]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        read = list(wanted)
+        if latest:
+            read += [c for c in ("file_hash", "year", "processed_at") if c not in read]
+
+        table = self._dataset().to_table(columns=read, filter=expr)
+        if latest and table.num_rows:
+            table = self._latest(table)
+        return table.select(wanted)
+
+    def _latest(self, table):
+        """Newest processed_at per (file_hash, year); rows without a hash are kept as-is."""
+        hashes = table.column("file_hash").to_pylist()
+        years = table.column("year").to_pylist()
+        stamps = table.column("processed_at").to_pylist()
+        best: Dict[tuple, int] = {}
+        keep = []
+        for i, (file_hash, year, stamp) in enumerate(zip(hashes, years, stamps)):
+            if not file_hash:
+                keep.append(i)
+                continue
+            key = (file_hash, year)
+            if key not in best or stamp > stamps[best[key]]:
+                best[key] = i
+        keep.extend(best.values())
+        return table.take(sorted(keep))
+
+    def export(
+        self,
+        dest: Path,
+        fmt: str = "parquet",
+        columns: Optional[Sequence[str]] = None,
+        years: Optional[Sequence[int]] = None
+    ) -> int:
+        """
+        Bulk export streamed batch by batch (memory stays flat).
+        Every row is exported, including re-extractions: use query() for the latest view.
+        Returns the row count.
+        """
+        pa = self.pa
+        ds = pa.dataset
+        expr = ds.field("year").isin(list(years)) if years else None
+        scanner = self._dataset().scanner(columns=list(columns) if columns else None, filter=expr)
+        dest = Path(dest)
+        rows = 0
+        if fmt == "parquet":
+            with pa.parquet.ParquetWriter(dest, scanner.projected_schema) as writer:
+                for batch in scanner.to_batches():
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        elif fmt == "csv":
+            with pa.csv.CSVWriter(dest, scanner.projected_schema) as writer:
+                for batch in scanner.to_batches():
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        else:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        return rows
+
+    # --- Maintenance ---
+
+    def compact(self, min_parts: int = 16) -> int:
+        """Merge each year's small part files into one. Returns the partitions compacted."""
+        from engines.rate_limiter import file_lock
+
+        compacted = 0
+        with file_lock(self.root / ".compact.lock"):
+            for partition in sorted(self.root.glob("year=*")):
+                parts = sorted(partition.glob("part-*.parquet"))
+                if len(parts) < min_parts:
+                    continue
+                table = self.pa.concat_tables(
+                    [self.pa.parquet.read_table(p, schema=self._file_schema()) for p in parts]
+                )
+                tmp = partition / f".part-{uuid.uuid4().hex}.tmp"
+                self.pa.parquet.write_table(table, tmp)
+                tmp.replace(partition / f"part-{datetime.now():%Y%m%d%H%M%S}-compacted-{uuid.uuid4().hex[:8]}.parquet")
+                for p in parts:
+                    p.unlink()
+                compacted += 1
+        return compacted
@@ -0,0 +1,121 @@
+# Content-Addressed Upload Storage
+"""
+Uploads are streamed to disk in chunks while their SHA-256 is computed,
+stored once per content under blobs/, and exposed to jobs under their
+original filename via a hardlink in a per-hash directory. Identical
+uploads share one blob; different files with the same name never collide.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024  # 1MB: flat memory regardless of upload size
+
+
+def get_upload_dir() -> Path:
+    from config import get_temp_dir
+    upload_dir = get_temp_dir() / "uploads"
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    return upload_dir
+
+
+def blob_path(file_hash: str, suffix: str = "", upload_dir: Optional[Path] = None) -> Path:
+    return (upload_dir or get_upload_dir()) / "blobs" / file_hash[:2] / f"{file_hash}{suffix.lower()}"
+
+
+def _link_or_copy(source: Path, target: Path):
+    """Hardlink when the filesystem allows it, otherwise fall back to a copy."""
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        raise  # a concurrent upload of the same content got there first; callers keep theirs
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class UploadSpool:
+    """
+    Incremental form of spool_upload for callers that receive chunks
+    (e.g. an async HTTP handler): write() each chunk, then commit().
+    """
+
+    def __init__(self, filename: str, upload_dir: Optional[Path] = None):
+        self.upload_dir = upload_dir or get_upload_dir()
+        self.name = Path(filename).name or "upload"  # never trust client-supplied directories
+        self.suffix = Path(self.name).suffix
+        (self.upload_dir / "incoming").mkdir(parents=True, exist_ok=True)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.upload_dir / "incoming", suffix=self.suffix)
+        self.tmp_path = Path(tmp_name)
+        self.out = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.digest.update(chunk)
+        self.out.write(chunk)
+        self.size += len(chunk)
+
+    def abort(self):
+        self.out.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+    def commit(self) -> Tuple[Path, str]:
+        """Store the blob (deduped) and return (path to give the job, sha256 hex)."""
+        try:
+            self.out.close()
+            file_hash = self.digest.hexdigest()
+            blob = blob_path(file_hash, self.suffix, self.upload_dir)
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            if blob.exists():
+                self.tmp_path.unlink()  # already stored: dedupe
+            else:
+                os.replace(self.tmp_path, blob)
+        except BaseException:
+            self.tmp_path.unlink(missing_ok=True)
+            raise
+
+        named = self.upload_dir / "by_hash" / file_hash / self.name
+        if not named.exists():
+            named.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                _link_or_copy(blob, named)
+            except FileExistsError:
+                pass  # a concurrent upload of the same file won the race
+        return named, file_hash
+
+
+def spool_upload(
+    stream: BinaryIO,
+    filename: str,
+    upload_dir: Optional[Path] = None,
+    chunk_size: int = CHUNK_SIZE
+) -> Tuple[Path, str]:
+    """
+    Stream an upload to content-addressed storage.
+    Returns (path to give the job, sha256 hex). The path keeps the original
+    filename, which the extractors use (e.g. the year in "2024 YE BS.pdf").
+    """
+    spool = UploadSpool(filename, upload_dir)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+    except BaseException:
+        spool.abort()
+        raise
+    return spool.commit()
+
+
+def hash_file(path: Path, chunk_size: int = CHUNK_SIZE) -> str:
+    """SHA-256 of a file on disk, read in chunks (for files that weren't spooled)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()